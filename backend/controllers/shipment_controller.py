@@ -4,78 +4,88 @@
 1. 全部发货：删除open表记录，插入closed表
 2. 部分发货：更新open表qty，插入closed表
 3. 记录操作日志到po_records表
+批量发货（process_shipment_batch）在一个事务中锁定、插入、更新/删除并记录整批明细
+批量退货（return_shipment_batch）同样在一个事务中处理，整批只重新设置一次运费
 """
 
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from backend.utils.config import get_db_config
+from backend.utils.db_pool import get_connection as get_pooled_connection
+from backend.models.schema_cache import schema_cache
 from backend.operation_logger import operation_logger
+from backend.utils.logging_utils import get_logger
 import json
 import uuid
 from datetime import datetime
 
+logger = get_logger(__name__)
+
+# 在open/closed表之间复制记录时不复制的列（由数据库默认值和触发器维护）
+ROW_SYSTEM_COLUMNS = ('update_at', 'row_version')
+
 class ShipmentController:
     def __init__(self):
         self.db_config = get_db_config()
-        # 自动检查并修复数据库表结构
-        self._ensure_closed_tables_structure()
     
-    def _ensure_closed_tables_structure(self):
+    def get_connection(self):
+        """从共享连接池获取数据库连接（close() 即归还连接池）"""
+        return get_pooled_connection()
+    
+    @staticmethod
+    def _generate_batch_no():
+        """生成发货批次号 (格式: SHIP-YYYYMMDD-UUID缩写)"""
+        return f"SHIP-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+    
+    @staticmethod
+    def _build_closed_record(source_table, open_record, shipment_qty, closed_columns, tracking_no=None, shipping_mode=None, shipping_cost=None, shipment_batch_no=None):
         """
-        确保closed表存在必要的列，如果不存在则自动添加
+        根据open表记录生成要插入closed表的记录
+        
+        复制open表数据，修改qty、total_price以及发货字段，只保留closed表中存在的列，
+        且排除 update_at 和 row_version 字段，让 PostgreSQL 使用默认值
         """
-        try:
-            conn = self.get_connection()
-            if not conn:
-                print(f"[WARNING] Cannot connect to DB for structure check")
-                return
-            
-            cursor = conn.cursor()
-            
-            for table_name in ['wf_closed', 'non_wf_closed']:
-                # 检查shipment_batch_no列是否存在
-                check_query = """
-                    SELECT COUNT(*) FROM information_schema.columns 
-                    WHERE table_schema = 'purchase_orders' 
-                    AND table_name = %s 
-                    AND column_name = 'shipment_batch_no'
-                """
-                cursor.execute(check_query, (table_name,))
-                
-                if cursor.fetchone()[0] == 0:
-                    # 列不存在，添加它
-                    print(f"[INFO] Missing shipment_batch_no in {table_name}, adding...")
-                    add_column_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN shipment_batch_no VARCHAR(50)"
-                    cursor.execute(add_column_query)
-                    conn.commit()
-                    print(f"[SUCCESS] Added shipment_batch_no to {table_name}")
-                else:
-                    print(f"[INFO] shipment_batch_no already exists in {table_name}")
-            
-            cursor.close()
-            conn.close()
-        except Exception as e:
-            print(f"[ERROR] Failed to ensure closed tables structure: {e}")
-    
-    def get_connection(self):
-        """获取数据库连接"""
-        try:
-            connection = psycopg2.connect(**self.db_config)
-            return connection
-        except Exception as error:
-            print(f"数据库连接失败: {error}")
-            return None
+        closed_record = open_record.copy()
+        closed_record['qty'] = shipment_qty
+        
+        # 设置发货相关字段
+        if tracking_no:
+            closed_record['tracking_no'] = tracking_no
+        if shipping_mode:
+            closed_record['shipping_mode'] = shipping_mode
+            if source_table == 'wf_open':
+                closed_record['wfsz_shipping_mode'] = shipping_mode
+        if shipping_cost is not None:
+            # 运费处理：永远只存储数值，不在数据库中存储shared:前缀
+            # shared:前缀只作为UI显示标记，后端只需存储数字值
+            closed_record['shipping_cost'] = shipping_cost
+        
+        # 计算total_price（qty * net_price）
+        net_price = float(closed_record.get('net_price') or 0)
+        if net_price > 0:
+            closed_record['total_price'] = round(shipment_qty * net_price, 2)
+        
+        closed_record['shipment_batch_no'] = shipment_batch_no
+        
+        return {
+            key: value for key, value in closed_record.items()
+            if key in closed_columns and key not in ROW_SYSTEM_COLUMNS
+        }
     
     def process_shipment(self, source_table, po, pn, shipment_qty, max_qty, user_email, po_line=None, tracking_no=None, shipping_mode=None, shipping_cost=None, is_shared=False, shipment_batch_no=None):
         """
         处理发货
         
+        可发货数量以数据库中的当前数量为准：一条 UPDATE ... SET qty = qty - %s WHERE qty >= %s RETURNING *
+        原子地扣减并锁定open表记录，并发发货同一行时不会超发。
+        
         Args:
             source_table: 源表 (wf_open 或 non_wf_open)
             po: PO号
             pn: PN号
             shipment_qty: 发货数量
-            max_qty: 最大可发货数量
+            max_qty: 客户端看到的可发货数量（仅记录在日志中，不参与计算）
             user_email: 用户邮箱
             po_line: PO/行号
             tracking_no: 追踪号
@@ -87,6 +97,30 @@ class ShipmentController:
         Returns:
             dict: 处理结果
         """
+        # 验证参数
+        if not source_table or source_table not in ['wf_open', 'non_wf_open']:
+            return {'success': False, 'message': '无效的源表'}
+        
+        try:
+            shipment_qty = float(shipment_qty)
+        except (TypeError, ValueError):
+            return {'success': False, 'message': '发货数量无效'}
+        if shipment_qty <= 0:
+            return {'success': False, 'message': '发货数量必须大于0'}
+        
+        # 确定源表和目标表
+        target_table = 'wf_closed' if source_table == 'wf_open' else 'non_wf_closed'
+        
+        # 没有 po_line 时按 (po, pn) 定位记录
+        if po_line:
+            key_condition = sql.SQL("po_line = %(po_line)s")
+        else:
+            key_condition = sql.SQL(
+                "po_line = (SELECT po_line FROM purchase_orders.{} WHERE po = %(po)s AND pn = %(pn)s "
+                "ORDER BY po_line LIMIT 1)"
+            ).format(sql.Identifier(source_table))
+        params = {'po_line': po_line, 'po': po, 'pn': pn, 'shipment_qty': shipment_qty}
+        
         conn = self.get_connection()
         if not conn:
             return {'success': False, 'message': '数据库连接失败'}
@@ -94,104 +128,61 @@ class ShipmentController:
         try:
             cursor = conn.cursor()
             
-            # 验证参数
-            if not source_table or source_table not in ['wf_open', 'non_wf_open']:
-                return {'success': False, 'message': '无效的源表'}
-            
-            if shipment_qty <= 0 or shipment_qty > max_qty:
-                return {'success': False, 'message': f'发货数量必须在1到{max_qty}之间'}
-            
-            # 确定源表和目标表
-            target_table = 'wf_closed' if source_table == 'wf_open' else 'non_wf_closed'
-            primary_key_field = 'po_line'
-            
-            # 不流量霉 po_line 是否传递
-            # 获取open表中的完整记录
-            if po_line:
-                get_record_query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE po_line = %s").format(
-                    sql.Identifier(source_table)
-                )
-                cursor.execute(get_record_query, (po_line,))
-            else:
-                get_record_query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE po = %s AND pn = %s").format(
-                    sql.Identifier(source_table)
-                )
-                cursor.execute(get_record_query, (po, pn))
+            # 原子扣减：只有当前数量足够时才更新，行锁保持到事务结束
+            decrement_query = sql.SQL(
+                "UPDATE purchase_orders.{table} SET qty = qty - %(shipment_qty)s, "
+                "total_price = CASE WHEN net_price > 0 THEN ROUND((qty - %(shipment_qty)s) * net_price, 2) ELSE 0 END, "
+                "update_at = CURRENT_TIMESTAMP "
+                "WHERE {key} AND qty >= %(shipment_qty)s RETURNING *"
+            ).format(table=sql.Identifier(source_table), key=key_condition)
+            cursor.execute(decrement_query, params)
             record = cursor.fetchone()
             
             if not record:
+                # 区分记录不存在和数量不足（只在失败时多查询一次）
+                check_query = sql.SQL("SELECT qty FROM purchase_orders.{} WHERE {}").format(
+                    sql.Identifier(source_table), key_condition
+                )
+                cursor.execute(check_query, params)
+                current = cursor.fetchone()
+                conn.rollback()
+                cursor.close()
                 conn.close()
-                return {'success': False, 'message': '未找到指定的记录'}
+                if not current:
+                    return {'success': False, 'message': '未找到指定的记录'}
+                return {'success': False, 'message': f'发货数量必须在1到{float(current[0] or 0)}之间'}
             
-            # 获取列名
+            # 获取列名（RETURNING 返回扣减后的记录）
             colnames = [desc[0] for desc in cursor.description]
             open_record = dict(zip(colnames, record))
+            remaining_qty = float(open_record.get('qty') or 0)
             
             # 检查是否是全部发货
-            is_full_shipment = (shipment_qty >= max_qty)
-            
-            # 准备closed表的数据（复制open表数据，修改qty、total_price以及新字段）
-            closed_record = open_record.copy()
-            closed_record['qty'] = shipment_qty
-            
-            # 设置发货相关字段
-            if tracking_no:
-                closed_record['tracking_no'] = tracking_no
-            if shipping_mode:
-                closed_record['shipping_mode'] = shipping_mode if source_table == 'non_wf_open' else shipping_mode
-                if source_table == 'wf_open':
-                    closed_record['wfsz_shipping_mode'] = shipping_mode
-            if shipping_cost is not None:
-                # 运费处理：永远只存储数值，不在数据库中存储shared:前缀
-                # shared:前缀只作为UI显示标记，后端只需存储数字值
-                closed_record['shipping_cost'] = shipping_cost
-            
-            # 计算total_price（qty * net_price）
-            net_price = float(closed_record.get('net_price') or 0)
-            if net_price > 0:
-                closed_record['total_price'] = round(shipment_qty * net_price, 2)
+            is_full_shipment = (remaining_qty <= 0)
+            if is_full_shipment:
+                # 全部发货：删除open表记录（已被本事务锁定）
+                delete_open_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE po_line = %s").format(
+                    sql.Identifier(source_table)
+                )
+                cursor.execute(delete_open_query, (open_record['po_line'],))
+                operation_type = 'full_shipment'
+            else:
+                operation_type = 'partial_shipment'
             
             # 生成或使用传入的shipment_batch_no (格式: SHIP-YYYYMMDD-UUID缩写)
             # 优先使用前端传来的批次号，实现批量发货的一致性
             if not shipment_batch_no:
                 # 如果没有提供则自动生成
-                shipment_batch_no = f"SHIP-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-            closed_record['shipment_batch_no'] = shipment_batch_no
-            
-            print(f"[DEBUG] ===== SHIPMENT PROCESS START =====")
-            print(f"[DEBUG] Generated shipment_batch_no: {shipment_batch_no}")
-            print(f"[DEBUG] Inserting closed record with shipment_batch_no for PO={po}, PN={pn}")
-            print(f"[DEBUG] closed_record keys: {list(closed_record.keys())}")
-            print(f"[DEBUG] closed_record['shipment_batch_no']: {closed_record.get('shipment_batch_no')}")
-            
-            # 处理po_line字段（避免主键冲突）
-            if 'po_line' in closed_record and closed_record['po_line']:
-                # closed表的po_line不作为主键，可以保持相同值
-                pass
+                shipment_batch_no = self._generate_batch_no()
             
             # 获取closed表的列
-            get_closed_columns_query = """
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_schema = 'purchase_orders' 
-                AND table_name = %s
-                ORDER BY ordinal_position
-            """
-            cursor.execute(get_closed_columns_query, (target_table,))
-            closed_columns = set(row[0] for row in cursor.fetchall())
-            
-            print(f"[DEBUG] {target_table} columns: {sorted(closed_columns)}")
-            print(f"[DEBUG] 'shipment_batch_no' in closed_columns: {'shipment_batch_no' in closed_columns}")
-            
-            # 过滤closed_record，只保留closed表中存在的列
-            # 且排除 update_at 字段，让 PostgreSQL 使用 DEFAULT CURRENT_TIMESTAMP
-            filtered_closed_record = {}
-            for key, value in closed_record.items():
-                if key in closed_columns and key != 'update_at':  # 排除 update_at
-                    filtered_closed_record[key] = value
-            
-            print(f"[DEBUG] filtered_closed_record keys: {list(filtered_closed_record.keys())}")
-            print(f"[DEBUG] filtered_closed_record['shipment_batch_no']: {filtered_closed_record.get('shipment_batch_no')}")
+            closed_columns = schema_cache.get_column_names(target_table, cursor)
+            
+            # 准备closed表的数据（复制open表数据，修改qty、total_price以及新字段）
+            filtered_closed_record = self._build_closed_record(
+                source_table, open_record, shipment_qty, closed_columns,
+                tracking_no, shipping_mode, shipping_cost, shipment_batch_no
+            )
             
             # 插入数据到closed表
             columns = list(filtered_closed_record.keys())
@@ -205,98 +196,235 @@ class ShipmentController:
                 placeholders
             )
             
-            print(f"[DEBUG] Inserting into {target_table}")
-            print(f"[DEBUG] Columns: {columns}")
-            print(f"[DEBUG] Values: {values}")
-            print(f"[DEBUG] shipment_batch_no in columns: {'shipment_batch_no' in columns}")
-            print(f"[DEBUG] shipment_batch_no value in values: {values[columns.index('shipment_batch_no')] if 'shipment_batch_no' in columns else 'NOT FOUND'}")
+            logger.debug("发货: PO=%s, PN=%s, 批次号=%s, 插入 %s 列: %s",
+                         po, pn, shipment_batch_no, target_table, columns)
             
             cursor.execute(insert_closed_query, values)
             
-            # 验证插入是否成功
-            inserted_rows = cursor.rowcount
-            print(f"[DEBUG] Rows inserted: {inserted_rows}")
+            # 记录操作日志（与发货在同一事务中写入，日志写入失败时发货一并回滚）
+            shipment_record = {
+                'operation': operation_type,
+                'source_table': source_table,
+                'target_table': target_table,
+                'po': open_record.get('po'),
+                'pn': open_record.get('pn'),
+                'shipment_qty': shipment_qty,
+                'max_qty': remaining_qty + shipment_qty,
+                'client_max_qty': max_qty,
+                'remaining_qty': remaining_qty,
+                'record_data': filtered_closed_record
+            }
+            operation_logger.log_operation(
+                user_email=user_email,
+                table_name=source_table,
+                operation=f'shipment_{operation_type}',
+                record_data=shipment_record,
+                cursor=cursor
+            )
             
-            if inserted_rows == 0:
-                print(f"[ERROR] Failed to insert record into {target_table}")
-                return {'success': False, 'message': f'失败：无法插入{target_table}表'}
+            conn.commit()
             
-            print(f"[DEBUG] ===== SHIPMENT PROCESS END =====")
+            cursor.close()
+            conn.close()
             
-            # 处理open表的记录
-            if is_full_shipment:
-                # 全部发货：删除open表记录
-                if po_line:
-                    delete_open_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE po_line = %s").format(
-                        sql.Identifier(source_table)
-                    )
-                    cursor.execute(delete_open_query, (po_line,))
-                else:
-                    delete_open_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE po = %s AND pn = %s").format(
-                        sql.Identifier(source_table)
-                    )
-                    cursor.execute(delete_open_query, (po, pn))
-                operation_type = 'full_shipment'
-            else:
-                # 部分发货：更新open表qty和total_price
-                # 同时更新 update_at 时间戳
-                new_qty = max_qty - shipment_qty
-                net_price = float(open_record.get('net_price') or 0)
-                new_total_price = round(new_qty * net_price, 2) if net_price > 0 else 0
-                
-                if po_line:
-                    update_open_query = sql.SQL(
-                        "UPDATE purchase_orders.{} SET qty = %s, total_price = %s, update_at = CURRENT_TIMESTAMP WHERE po_line = %s"
-                    ).format(
-                        sql.Identifier(source_table)
-                    )
-                    cursor.execute(update_open_query, (new_qty, new_total_price, po_line))
-                else:
-                    update_open_query = sql.SQL(
-                        "UPDATE purchase_orders.{} SET qty = %s, total_price = %s, update_at = CURRENT_TIMESTAMP WHERE po = %s AND pn = %s"
-                    ).format(
-                        sql.Identifier(source_table)
-                    )
-                    cursor.execute(update_open_query, (new_qty, new_total_price, po, pn))
-                operation_type = 'partial_shipment'
+            # 返回成功结果
+            result_message = f"{'全部' if is_full_shipment else '部分'}发货成功，发货数量: {shipment_qty}"
+            return {
+                'success': True,
+                'message': result_message,
+                'shipment_type': '全部发货' if is_full_shipment else '部分发货',
+                'shipment_qty': shipment_qty,
+                'remaining_qty': remaining_qty,
+                'shipment_batch_no': shipment_batch_no
+            }
             
-            conn.commit()
+        except Exception as error:
+            if conn:
+                try:
+                    conn.rollback()
+                    cursor.close()
+                    conn.close()
+                except:
+                    pass
+            return {'success': False, 'message': f'发货处理失败: {error}'}
+    
+    def process_shipment_batch(self, source_table, lines, user_email, tracking_no=None, shipping_mode=None, shipping_cost=None, shipment_batch_no=None):
+        """
+        批量发货：整批在一个事务中处理，任一行失败时整批回滚
+        
+        用 SELECT ... FOR UPDATE 锁定本批所有open表记录，按锁定后的当前数量校验发货数量，
+        然后一条多行 INSERT 写入closed表，
+        一条 DELETE（全部发货）和一条 UPDATE ... FROM (VALUES ...)（部分发货）处理open表，
+        最后一条多行 INSERT 写入操作日志。
+        
+        Args:
+            source_table: 源表 (wf_open 或 non_wf_open)
+            lines: 发货明细 [{'po_line', 'shipment_qty'}, ...]（max_qty 可省略，不参与计算）
+            user_email: 用户邮箱
+            tracking_no: 追踪号（整批共用）
+            shipping_mode: 运输方式（整批共用）
+            shipping_cost: 运费（整批共用）
+            shipment_batch_no: 发货批次号 (可选，如果不提供则自动生成)
             
-            # 记录操作日志
+        Returns:
+            dict: 处理结果，results 中为每行的发货类型和剩余数量
+        """
+        # 验证参数
+        if not source_table or source_table not in ['wf_open', 'non_wf_open']:
+            return {'success': False, 'message': '无效的源表'}
+        if not isinstance(lines, list) or not lines:
+            return {'success': False, 'message': '发货明细不能为空'}
+        
+        po_lines = []
+        for line in lines:
+            po_line = line.get('po_line') if isinstance(line, dict) else None
+            if not po_line:
+                return {'success': False, 'message': '每行发货明细都需要 po_line'}
+            if po_line in po_lines:
+                return {'success': False, 'message': f'{po_line}: 同一批次中重复的 PO/Line'}
             try:
-                shipment_record = {
+                shipment_qty = float(line.get('shipment_qty'))
+            except (TypeError, ValueError):
+                return {'success': False, 'message': f'{po_line}: 发货数量无效'}
+            if shipment_qty <= 0:
+                return {'success': False, 'message': f'{po_line}: 发货数量必须大于0'}
+            po_lines.append(po_line)
+        
+        target_table = 'wf_closed' if source_table == 'wf_open' else 'non_wf_closed'
+        if not shipment_batch_no:
+            shipment_batch_no = self._generate_batch_no()
+        
+        conn = self.get_connection()
+        if not conn:
+            return {'success': False, 'message': '数据库连接失败'}
+        
+        try:
+            cursor = conn.cursor()
+            
+            # 按 po_line 顺序锁定本批所有open表记录，避免并发批次互相死锁
+            lock_query = sql.SQL(
+                "SELECT * FROM purchase_orders.{} WHERE po_line = ANY(%s) ORDER BY po_line FOR UPDATE"
+            ).format(sql.Identifier(source_table))
+            cursor.execute(lock_query, (po_lines,))
+            colnames = [desc[0] for desc in cursor.description]
+            open_records = {}
+            for record in cursor.fetchall():
+                open_record = dict(zip(colnames, record))
+                open_records[open_record['po_line']] = open_record
+            
+            error_message = None
+            missing = [po_line for po_line in po_lines if po_line not in open_records]
+            if missing:
+                error_message = f"未找到指定的记录: {', '.join(missing)}"
+            else:
+                # 以锁定后的当前数量为准，拒绝超发
+                for line in lines:
+                    current_qty = float(open_records[line['po_line']].get('qty') or 0)
+                    if float(line['shipment_qty']) > current_qty:
+                        error_message = f"{line['po_line']}: 发货数量必须在1到{current_qty}之间"
+                        break
+            if error_message:
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                return {'success': False, 'message': error_message}
+            
+            closed_columns = schema_cache.get_column_names(target_table, cursor)
+            
+            closed_records = []
+            full_po_lines = []
+            partial_updates = []
+            operations = []
+            results = []
+            for line in lines:
+                po_line = line['po_line']
+                shipment_qty = float(line['shipment_qty'])
+                open_record = open_records[po_line]
+                max_qty = float(open_record.get('qty') or 0)
+                is_full_shipment = (shipment_qty >= max_qty)
+                remaining_qty = 0 if is_full_shipment else max_qty - shipment_qty
+                
+                closed_record = self._build_closed_record(
+                    source_table, open_record, shipment_qty, closed_columns,
+                    tracking_no, shipping_mode, shipping_cost, shipment_batch_no
+                )
+                closed_records.append(closed_record)
+                
+                if is_full_shipment:
+                    full_po_lines.append(po_line)
+                    operation_type = 'full_shipment'
+                else:
+                    net_price = float(open_record.get('net_price') or 0)
+                    new_total_price = round(remaining_qty * net_price, 2) if net_price > 0 else 0
+                    partial_updates.append((po_line, remaining_qty, new_total_price))
+                    operation_type = 'partial_shipment'
+                
+                operations.append((source_table, f'shipment_{operation_type}', {
                     'operation': operation_type,
                     'source_table': source_table,
                     'target_table': target_table,
-                    'po': po,
-                    'pn': pn,
+                    'po': open_record.get('po'),
+                    'pn': open_record.get('pn'),
                     'shipment_qty': shipment_qty,
                     'max_qty': max_qty,
-                    'remaining_qty': max_qty - shipment_qty if not is_full_shipment else 0,
-                    'record_data': filtered_closed_record
-                }
-                
-                operation_logger.log_operation(
-                    user_email=user_email,
-                    table_name=source_table,
-                    operation=f'shipment_{operation_type}',
-                    record_data=shipment_record
+                    'remaining_qty': remaining_qty,
+                    'record_data': closed_record
+                }))
+                results.append({
+                    'po_line': po_line,
+                    'shipment_type': '全部发货' if is_full_shipment else '部分发货',
+                    'shipment_qty': shipment_qty,
+                    'remaining_qty': remaining_qty
+                })
+            
+            # 一条多行 INSERT 写入closed表（同一源表的记录列相同）
+            columns = list(closed_records[0].keys())
+            insert_closed_query = sql.SQL("INSERT INTO purchase_orders.{} ({}) VALUES %s").format(
+                sql.Identifier(target_table),
+                sql.SQL(", ").join(sql.Identifier(col) for col in columns)
+            )
+            execute_values(
+                cursor, insert_closed_query,
+                [[record.get(col) for col in columns] for record in closed_records],
+                page_size=len(closed_records)
+            )
+            
+            # 全部发货：一条 DELETE 删除open表记录
+            if full_po_lines:
+                delete_open_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE po_line = ANY(%s)").format(
+                    sql.Identifier(source_table)
                 )
-            except Exception as log_error:
-                print(f"记录发货操作日志时出错: {log_error}")
+                cursor.execute(delete_open_query, (full_po_lines,))
+            
+            # 部分发货：一条 UPDATE 更新open表qty、total_price和update_at
+            if partial_updates:
+                update_open_query = sql.SQL(
+                    "UPDATE purchase_orders.{} AS t SET qty = v.qty, total_price = v.total_price, "
+                    "update_at = CURRENT_TIMESTAMP FROM (VALUES %s) AS v(po_line, qty, total_price) "
+                    "WHERE t.po_line = v.po_line"
+                ).format(sql.Identifier(source_table))
+                execute_values(
+                    cursor, update_open_query, partial_updates,
+                    template="(%s, %s::numeric, %s::numeric)", page_size=len(partial_updates)
+                )
+            
+            # 记录操作日志（与发货在同一事务中写入，日志写入失败时整批回滚）
+            operation_logger.log_operations(user_email, operations, cursor)
+            
+            conn.commit()
             
             cursor.close()
             conn.close()
             
-            # 返回成功结果
-            result_message = f"{'全部' if is_full_shipment else '部分'}发货成功，发货数量: {shipment_qty}"
+            logger.info("批量发货: %s -> %s, 批次号=%s, %d 行（全部 %d, 部分 %d）",
+                        source_table, target_table, shipment_batch_no, len(lines),
+                        len(full_po_lines), len(partial_updates))
+            
             return {
                 'success': True,
-                'message': result_message,
-                'shipment_type': '全部发货' if is_full_shipment else '部分发货',
-                'shipment_qty': shipment_qty,
-                'remaining_qty': max_qty - shipment_qty if not is_full_shipment else 0,
-                'shipment_batch_no': shipment_batch_no
+                'message': f'批量发货成功，共 {len(lines)} 行',
+                'shipment_batch_no': shipment_batch_no,
+                'results': results
             }
             
         except Exception as error:
@@ -307,7 +435,7 @@ class ShipmentController:
                     conn.close()
                 except:
                     pass
-            return {'success': False, 'message': f'发货处理失败: {error}'}
+            return {'success': False, 'message': f'批量发货处理失败: {error}'}
     
     def return_shipment(self, closed_table, record_id, return_qty, user_email, new_shipping_cost=None, shipment_batch_no=None):
         """
@@ -385,20 +513,12 @@ class ShipmentController:
             else:
                 # 有效表中不存在该记录，需要从有效表中恢复
                 # 填充表的列
-                get_open_columns_query = """
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'purchase_orders' 
-                    AND table_name = %s
-                    ORDER BY ordinal_position
-                """
-                cursor.execute(get_open_columns_query, (source_table,))
-                open_columns = set(row[0] for row in cursor.fetchall())
+                open_columns = schema_cache.get_column_names(source_table, cursor)
                 
                 # 从有效表记录增到有效表中，但下流数量为退货数量
                 open_insert_record = {}
                 for key, value in closed_record_dict.items():
-                    if key in open_columns and key != 'shipment_batch_no' and key != 'update_at':
+                    if key in open_columns and key != 'shipment_batch_no' and key not in ROW_SYSTEM_COLUMNS:
                         if key == 'qty':
                             open_insert_record[key] = return_qty
                         elif key == 'total_price':
@@ -428,11 +548,8 @@ class ShipmentController:
             if new_shipping_cost is not None:
                 # 获取shipment_batch_no（优先使用前端传进来的批号，其次是数据库中的）
                 batch_no = shipment_batch_no or closed_record_dict.get('shipment_batch_no')
-                print(f"[DEBUG] Attempting to update shipping cost:")
-                print(f"  - Batch No (from frontend): {shipment_batch_no}")
-                print(f"  - Batch No (from database): {closed_record_dict.get('shipment_batch_no')}")
-                print(f"  - Final Batch No to use: {batch_no}")
-                print(f"  - New Shipping Cost: {new_shipping_cost}")
+                logger.debug("退货更新运费: 批次号=%s（前端: %s, 数据库: %s）, 运费=%s",
+                             batch_no, shipment_batch_no, closed_record_dict.get('shipment_batch_no'), new_shipping_cost)
                 
                 if batch_no:
                     # 更新所有相同batch的记录（除了要删除的当前记录）
@@ -442,7 +559,7 @@ class ShipmentController:
                     ).format(sql.Identifier(closed_table))
                     cursor.execute(update_shipping_cost_query, (new_shipping_cost, batch_no, record_id))
                     rows_affected = cursor.rowcount
-                    print(f"  - Query executed. Rows affected (excluding current): {rows_affected}")
+                    logger.debug("同批次其他记录运费已更新: %d 行", rows_affected)
                     
                     # 如果是部分退货，也应该更新当前记录的运费
                     if return_qty < closed_qty:
@@ -450,11 +567,8 @@ class ShipmentController:
                             "UPDATE purchase_orders.{} SET shipping_cost = %s, update_at = CURRENT_TIMESTAMP WHERE id = %s"
                         ).format(sql.Identifier(closed_table))
                         cursor.execute(update_current_cost_query, (new_shipping_cost, record_id))
-                        print(f"  - Current record shipping cost also updated (partial return)")
                 else:
-                    print(f"[DEBUG] No shipment_batch_no found, cannot update shipping cost")
-            else:
-                print(f"[DEBUG] new_shipping_cost is None, skipping shipping cost update")
+                    logger.warning("退货记录 %s 没有发货批次号，无法更新运费", record_id)
             
             # 处理closed表的数据：根据退货数量是否为全部发货来删除或更新
             if return_qty >= closed_qty:
@@ -477,34 +591,257 @@ class ShipmentController:
                 )
                 cursor.execute(update_closed_query, (new_closed_qty, new_closed_total_price, record_id))
             
+            # 记录退货操作日志（与退货在同一事务中写入）
+            return_record = {
+                'operation': 'return_shipment',
+                'closed_table': closed_table,
+                'source_table': source_table,
+                'po_line': po_line,
+                'return_qty': return_qty,
+                'new_shipping_cost': new_shipping_cost
+            }
+            operation_logger.log_operation(
+                user_email=user_email,
+                table_name=closed_table,
+                operation='return_shipment',
+                record_data=return_record,
+                cursor=cursor
+            )
+            
             conn.commit()
             
-            # 记录退货操作日志
+            cursor.close()
+            conn.close()
+            
+            return {
+                'success': True,
+                'message': f'退货成功，退货数量: {return_qty}'
+            }
+            
+        except Exception as error:
+            if conn:
+                try:
+                    conn.rollback()
+                    cursor.close()
+                    conn.close()
+                except:
+                    pass
+            return {'success': False, 'message': f'退货处理失败: {error}'}
+    
+    def return_shipment_batch(self, closed_table, returns, user_email, new_shipping_cost=None, shipment_batch_no=None):
+        """
+        批量退货：整批在一个事务中处理，任一行失败时整批回滚
+        
+        一次锁定本批所有closed表记录和对应的open表记录，用集合操作把数量合并回open表
+        （已存在的 UPDATE ... FROM (VALUES ...)，不存在的多行 INSERT），closed表一条 DELETE（全部退货）
+        和一条 UPDATE（部分退货），运费只按发货批次重新设置一次。
+        
+        Args:
+            closed_table: closed表名 (wf_closed 或 non_wf_closed)
+            returns: 退货明细 [{'record_id', 'return_qty'}, ...]
+            user_email: 用户邮箱
+            new_shipping_cost: 新的运费 (可选，设置到相关发货批次中保留的记录上)
+            shipment_batch_no: 发货批次号 (可选，不提供时使用退货记录自身的批次号)
+        
+        Returns:
+            dict: 处理结果，results 中为每条记录的退货类型和closed表剩余数量
+        """
+        # 验证参数
+        if not closed_table or closed_table not in ['wf_closed', 'non_wf_closed']:
+            return {'success': False, 'message': '无效的closed表'}
+        if not isinstance(returns, list) or not returns:
+            return {'success': False, 'message': '退货明细不能为空'}
+        
+        return_qtys = {}
+        for item in returns:
             try:
-                return_record = {
+                record_id = int(item.get('record_id'))
+                return_qty = float(item.get('return_qty'))
+            except (AttributeError, TypeError, ValueError):
+                return {'success': False, 'message': '退货明细需要有效的 record_id 和 return_qty'}
+            if return_qty <= 0:
+                return {'success': False, 'message': f'记录 {record_id}: 退货数量必须大于0'}
+            if record_id in return_qtys:
+                return {'success': False, 'message': f'记录 {record_id}: 同一批次中重复的退货记录'}
+            return_qtys[record_id] = return_qty
+        record_ids = list(return_qtys)
+        
+        source_table = 'wf_open' if closed_table == 'wf_closed' else 'non_wf_open'
+        
+        conn = self.get_connection()
+        if not conn:
+            return {'success': False, 'message': '数据库连接失败'}
+        
+        try:
+            cursor = conn.cursor()
+            
+            # 锁定本批所有closed表记录（按 id 顺序，避免并发批次互相死锁）
+            lock_closed_query = sql.SQL(
+                "SELECT * FROM purchase_orders.{} WHERE id = ANY(%s) ORDER BY id FOR UPDATE"
+            ).format(sql.Identifier(closed_table))
+            cursor.execute(lock_closed_query, (record_ids,))
+            colnames = [desc[0] for desc in cursor.description]
+            closed_records = {}
+            for record in cursor.fetchall():
+                closed_record = dict(zip(colnames, record))
+                closed_records[closed_record['id']] = closed_record
+            
+            error_message = None
+            missing = [str(record_id) for record_id in record_ids if record_id not in closed_records]
+            if missing:
+                error_message = f"未找到指定的closed记录: {', '.join(missing)}"
+            else:
+                for record_id in record_ids:
+                    closed_qty = float(closed_records[record_id].get('qty') or 0)
+                    if return_qtys[record_id] > closed_qty:
+                        error_message = f'记录 {record_id}: 退货数量不能超过已发货数量 {closed_qty}'
+                        break
+            if error_message:
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                return {'success': False, 'message': error_message}
+            
+            # 按 po_line 合并退货数量（同一 po_line 可能有多条发货记录）
+            returned_by_po_line = {}
+            for record_id in record_ids:
+                po_line = closed_records[record_id].get('po_line')
+                returned_by_po_line[po_line] = returned_by_po_line.get(po_line, 0) + return_qtys[record_id]
+            
+            # 锁定对应的open表记录
+            lock_open_query = sql.SQL(
+                "SELECT po_line FROM purchase_orders.{} WHERE po_line = ANY(%s) ORDER BY po_line FOR UPDATE"
+            ).format(sql.Identifier(source_table))
+            cursor.execute(lock_open_query, (list(returned_by_po_line),))
+            existing_po_lines = set(row[0] for row in cursor.fetchall())
+            
+            # open表中存在的记录：一条 UPDATE 加回数量并重新计算total_price
+            open_updates = [
+                (po_line, qty) for po_line, qty in returned_by_po_line.items() if po_line in existing_po_lines
+            ]
+            if open_updates:
+                update_open_query = sql.SQL(
+                    "UPDATE purchase_orders.{} AS t SET qty = COALESCE(t.qty, 0) + v.qty, "
+                    "total_price = CASE WHEN t.net_price > 0 THEN ROUND((COALESCE(t.qty, 0) + v.qty) * t.net_price, 2) ELSE 0 END, "
+                    "update_at = CURRENT_TIMESTAMP FROM (VALUES %s) AS v(po_line, qty) WHERE t.po_line = v.po_line"
+                ).format(sql.Identifier(source_table))
+                execute_values(cursor, update_open_query, open_updates,
+                               template="(%s, %s::numeric)", page_size=len(open_updates))
+            
+            # open表中不存在的记录：从closed表记录恢复，一条多行 INSERT
+            open_inserts = []
+            restored = set()
+            open_columns = schema_cache.get_column_names(source_table, cursor)
+            for record_id in record_ids:
+                closed_record = closed_records[record_id]
+                po_line = closed_record.get('po_line')
+                if po_line in existing_po_lines or po_line in restored:
+                    continue
+                restored.add(po_line)
+                qty = returned_by_po_line[po_line]
+                net_price = float(closed_record.get('net_price') or 0)
+                open_insert_record = {}
+                for key, value in closed_record.items():
+                    if key in open_columns and key != 'shipment_batch_no' and key not in ROW_SYSTEM_COLUMNS:
+                        if key == 'qty':
+                            open_insert_record[key] = qty
+                        elif key == 'total_price':
+                            open_insert_record[key] = round(qty * net_price, 2) if net_price > 0 else 0
+                        else:
+                            open_insert_record[key] = value
+                open_inserts.append(open_insert_record)
+            if open_inserts:
+                columns = list(open_inserts[0].keys())
+                insert_open_query = sql.SQL("INSERT INTO purchase_orders.{} ({}) VALUES %s").format(
+                    sql.Identifier(source_table),
+                    sql.SQL(", ").join(sql.Identifier(col) for col in columns)
+                )
+                execute_values(cursor, insert_open_query,
+                               [[record.get(col) for col in columns] for record in open_inserts],
+                               page_size=len(open_inserts))
+            
+            # closed表：全部退货的记录一条 DELETE，部分退货的记录一条 UPDATE
+            full_ids = []
+            closed_updates = []
+            results = []
+            operations = []
+            for record_id in record_ids:
+                closed_record = closed_records[record_id]
+                return_qty = return_qtys[record_id]
+                closed_qty = float(closed_record.get('qty') or 0)
+                if return_qty >= closed_qty:
+                    full_ids.append(record_id)
+                    remaining_qty = 0
+                else:
+                    remaining_qty = closed_qty - return_qty
+                    net_price = float(closed_record.get('net_price') or 0)
+                    new_closed_total_price = round(remaining_qty * net_price, 2) if net_price > 0 else 0
+                    closed_updates.append((record_id, remaining_qty, new_closed_total_price))
+                results.append({
+                    'record_id': record_id,
+                    'po_line': closed_record.get('po_line'),
+                    'return_type': '全部退货' if return_qty >= closed_qty else '部分退货',
+                    'return_qty': return_qty,
+                    'remaining_qty': remaining_qty
+                })
+                operations.append((closed_table, 'return_shipment', {
                     'operation': 'return_shipment',
                     'closed_table': closed_table,
                     'source_table': source_table,
-                    'po_line': po_line,
+                    'record_id': record_id,
+                    'po_line': closed_record.get('po_line'),
                     'return_qty': return_qty,
                     'new_shipping_cost': new_shipping_cost
-                }
-                
-                operation_logger.log_operation(
-                    user_email=user_email,
-                    table_name=closed_table,
-                    operation='return_shipment',
-                    record_data=return_record
+                }))
+            
+            if full_ids:
+                delete_closed_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE id = ANY(%s)").format(
+                    sql.Identifier(closed_table)
                 )
-            except Exception as log_error:
-                print(f"记录退货操作日志时出错: {log_error}")
+                cursor.execute(delete_closed_query, (full_ids,))
+            
+            if closed_updates:
+                update_closed_query = sql.SQL(
+                    "UPDATE purchase_orders.{} AS t SET qty = v.qty, total_price = v.total_price, "
+                    "update_at = CURRENT_TIMESTAMP FROM (VALUES %s) AS v(id, qty, total_price) WHERE t.id = v.id"
+                ).format(sql.Identifier(closed_table))
+                execute_values(cursor, update_closed_query, closed_updates,
+                               template="(%s::integer, %s::numeric, %s::numeric)", page_size=len(closed_updates))
+            
+            # 运费：整批只重新设置一次（全部退货的记录已删除，不需要更新）
+            if new_shipping_cost is not None:
+                if shipment_batch_no:
+                    batch_nos = [shipment_batch_no]
+                else:
+                    batch_nos = sorted(set(
+                        closed_records[record_id].get('shipment_batch_no') for record_id in record_ids
+                    ) - {None, ''})
+                if batch_nos:
+                    update_shipping_cost_query = sql.SQL(
+                        "UPDATE purchase_orders.{} SET shipping_cost = %s, update_at = CURRENT_TIMESTAMP "
+                        "WHERE shipment_batch_no = ANY(%s)"
+                    ).format(sql.Identifier(closed_table))
+                    cursor.execute(update_shipping_cost_query, (new_shipping_cost, batch_nos))
+                    logger.debug("批量退货更新运费: 批次号=%s, 运费=%s, %d 行",
+                                 batch_nos, new_shipping_cost, cursor.rowcount)
+                else:
+                    logger.warning("批量退货记录没有发货批次号，无法更新运费: %s", record_ids)
+            
+            # 记录退货操作日志（与退货在同一事务中写入）
+            operation_logger.log_operations(user_email, operations, cursor)
+            
+            conn.commit()
             
             cursor.close()
             conn.close()
             
+            logger.info("批量退货: %s -> %s, %d 条记录（全部 %d, 部分 %d）",
+                        closed_table, source_table, len(record_ids), len(full_ids), len(closed_updates))
+            
             return {
                 'success': True,
-                'message': f'退货成功，退货数量: {return_qty}'
+                'message': f'批量退货成功，共 {len(record_ids)} 条记录',
+                'results': results
             }
             
         except Exception as error:
@@ -515,4 +852,4 @@ class ShipmentController:
                     conn.close()
                 except:
                     pass
-            return {'success': False, 'message': f'退货处理失败: {error}'}
\ No newline at end of file
+            return {'success': False, 'message': f'批量退货处理失败: {error}'}
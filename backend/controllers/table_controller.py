@@ -1,4 +1,4 @@
-from backend.models.database import DatabaseManager
+from backend.models.database import DatabaseManager, RowVersionConflict
 
 class TableController:
     def __init__(self):
@@ -36,6 +36,91 @@ class TableController:
                 'error': str(e)
             }
     
+    def get_table_page(self, table_name, filters=None, sort=None, limit=200, cursor=None, exact_count=False):
+        """分页获取表数据（服务端过滤、排序、keyset 分页）"""
+        try:
+            page = self.db_manager.query_table_page(
+                table_name,
+                filters=filters,
+                sort=sort,
+                limit=limit,
+                cursor_token=cursor,
+                exact_count=exact_count
+            )
+            return {
+                'success': True,
+                'data': page['rows'],
+                'next_cursor': page['next_cursor'],
+                'has_more': page['has_more'],
+                'total': page['total'],
+                'total_is_estimate': page['total_is_estimate'],
+                'sort': page['sort'],
+                'limit': limit
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 400
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def export_table(self, table_name, filters=None, sort=None):
+        """
+        准备流式导出
+
+        Returns:
+            dict: 成功时包含 columns 和逐行产出元组的 rows 生成器
+        """
+        try:
+            columns, rows = self.db_manager.open_table_export(table_name, filters=filters, sort=sort)
+            return {
+                'success': True,
+                'columns': columns,
+                'rows': rows
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 400
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def search(self, term, tables=None, limit=20, similarity_threshold=0.4):
+        """跨表搜索 PO、PN、PO/Line、描述和 tracking_no"""
+        try:
+            result = self.db_manager.search_tables(
+                term,
+                tables=tables,
+                limit=limit,
+                similarity_threshold=similarity_threshold
+            )
+            return {
+                'success': True,
+                'data': result['results'],
+                'mode': result['mode']
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 400
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
     def check_duplicates(self, table_name, data_list):
         """检查数据列表中是否存在主键冲突"""
         try:
@@ -50,8 +135,8 @@ class TableController:
                 'error': str(e)
             }
     
-    def update_row(self, table_name, pn, updates, user_email=None):
-        """更新行数据"""
+    def update_row(self, table_name, key, updates, user_email=None, expected_version=None, key_field=None):
+        """更新行数据（key_field 默认为表的主键；传入 expected_version 时做乐观并发检查）"""
         try:
             # 检查是否有更新数据
             if not updates or not isinstance(updates, dict):
@@ -67,10 +152,27 @@ class TableController:
                     'message': '没有更改需要保存'
                 }
             
-            success, message = self.db_manager.update_row(table_name, pn, updates, user_email)
+            success, message, row_version = self.db_manager.update_row(
+                table_name, key, updates, user_email,
+                expected_version=expected_version, key_field=key_field
+            )
             return {
                 'success': success,
-                'message': message
+                'message': message,
+                'row_version': row_version
+            }
+        except RowVersionConflict as e:
+            return {
+                'success': False,
+                'message': str(e),
+                'conflict': True,
+                'status': 409
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 400
             }
         except Exception as e:
             return {
@@ -78,14 +180,47 @@ class TableController:
                 'error': str(e)
             }
     
-    def delete_row(self, table_name, key, user_email=None, key_field='pn'):
-        """删除行数据"""
+    def bulk_update_rows(self, table_name, rows, user_email=None, atomic=False):
+        """批量修改多行，返回每行的结果和新的 row_version"""
         try:
-            success, message = self.db_manager.delete_row(table_name, key, user_email, key_field)
+            result = self.db_manager.bulk_update_rows(table_name, rows, user_email, atomic=atomic)
+            return {
+                'success': result['failed'] == 0,
+                'data': result['results'],
+                'updated': result['updated'],
+                'failed': result['failed'],
+                'committed': result['committed']
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 400
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'status': 500
+            }
+    
+    def delete_row(self, table_name, key, user_email=None, key_field='pn', expected_version=None):
+        """删除行数据（传入 expected_version 时做乐观并发检查）"""
+        try:
+            success, message = self.db_manager.delete_row(
+                table_name, key, user_email, key_field, expected_version=expected_version
+            )
             return {
                 'success': success,
                 'message': message
             }
+        except RowVersionConflict as e:
+            return {
+                'success': False,
+                'message': str(e),
+                'conflict': True,
+                'status': 409
+            }
         except Exception as e:
             return {
                 'success': False,
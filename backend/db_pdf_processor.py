@@ -1,12 +1,114 @@
-def extract_wefaricate_data(pdf_path):
-    """提取Wefaricate内部采购订单数据"""
+import re
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 解析器版本：修改某个解析函数的提取逻辑后递增对应版本，使旧的解析缓存自动失效
+EXTRACTOR_VERSIONS = {
+    'wefabricate': 2,
+    'centurion': 1,
+    'magic_fx': 1,
+}
+
+# Wefaricate 解析使用的正则（模块加载时编译一次）
+WF_PO_NUMBER_RE = re.compile(r'Purchase Order[^\d]*(\d+)')
+WF_PO_NUMBER_FALLBACK_RE = re.compile(r'(\d{10})')
+WF_CREATED_ON_RE = re.compile(r'Created on:\s*([A-Za-z]+\s*\d{1,2},\s*\d{4})')
+WF_CONTACT_PERSON_RE = re.compile(r'Contact Person[:\s]*(.*)')
+WF_SCHEDULE_DATE_RE = re.compile(r'[A-Za-z]+\s*\d{1,2},\s*\d{4}')
+WF_ITEM_RE = re.compile(r'^\d+$')
+WF_ID_RE = re.compile(r'^\d{4}-\d{4}-\d{4}$')
+WF_QUANTITY_RE = re.compile(r'([\d,]+)(?:\.\d+)?')
+WF_NUMBER_RE = re.compile(r'[\d,]+\.?\d*')
+WF_DIGITS_RE = re.compile(r'[\d]+\.?\d*')
+WF_PER_QUANTITY_RE = re.compile(r'per\s+(\d+)', re.IGNORECASE)
+WF_CURRENCY_SYMBOL_RE = re.compile(r'[€$£]')
+WF_SKIP_TEXTS = ('Page:', 'We Fabricate', 'Incoterms:')
+
+
+class ScheduleLineMatcher:
+    """
+    按页面、表格、行的顺序流式关联数据行与 Schedule Lines 日期
+
+    每个数据行取其后所有 Schedule Lines 中最早的日期：
+    - 同一表格内，收集到该表格的下一个数据行为止；
+    - 每页各表格的最后一个数据行跨页等待，收集后续页面的 Schedule Lines，直到后续页面出现任意数据行
+      （同一页其他表格中的 Schedule Lines 不计入）。
+    只保留等待中的数据行，每条 Schedule Lines 只更新等待中的数据行，整体为线性时间。
+    """
+
+    def __init__(self):
+        self._page = None
+        self._table = None
+        self._current = None      # 当前表格中等待的数据行
+        self._page_pending = []   # 本页已结束表格的最后一个数据行
+        self._carried = []        # 前面页面跨页等待的数据行
+
+    def _advance(self, page_num, table_idx):
+        if page_num != self._page:
+            self._end_table()
+            self._carried.extend(self._page_pending)
+            self._page_pending = []
+            self._page = page_num
+            self._table = table_idx
+        elif table_idx != self._table:
+            self._end_table()
+            self._table = table_idx
+
+    def _end_table(self):
+        if self._current is not None:
+            self._page_pending.append(self._current)
+            self._current = None
+
+    def _close(self, rows):
+        for row in rows:
+            logger.debug("数据行 %s 关联到日期: %s", row.get('po_line'), row.get('req_date_wf'))
+
+    def add_data_row(self, row, page_num, table_idx):
+        """
+        添加数据行（row['req_date_wf'] 会在后续 Schedule Lines 出现时原地更新）
+        """
+        self._advance(page_num, table_idx)
+        # 本页第一个数据行结束前面页面的跨页等待；同一表格的上一个数据行也不再等待
+        self._close(self._carried)
+        self._carried = []
+        if self._current is not None:
+            self._close([self._current])
+        row['req_date_wf'] = None
+        self._current = row
+
+    def add_schedule(self, req_date, page_num, table_idx):
+        """添加一条 Schedule Lines 日期"""
+        self._advance(page_num, table_idx)
+        if req_date is None:
+            return
+        waiting = self._carried if self._current is None else self._carried + [self._current]
+        for row in waiting:
+            if row['req_date_wf'] is None or req_date < row['req_date_wf']:
+                row['req_date_wf'] = req_date
+
+    def finish(self):
+        """所有页面处理完成后结束剩余的等待"""
+        self._end_table()
+        self._close(self._carried + self._page_pending)
+        self._carried = []
+        self._page_pending = []
+
+
+def extract_wefaricate_data(pdf_path, progress_callback=None):
+    """
+    提取Wefaricate内部采购订单数据
+
+    逐页流式解析：只在第一页提取文本（PO号、日期、采购员），每页只提取表格，
+    数据行与 Schedule Lines 日期由 ScheduleLineMatcher 在解析过程中关联，跨页只保留等待中的数据行。
+    """
     import pdfplumber
-    import re
     from datetime import datetime
     from decimal import Decimal, InvalidOperation
-    
+
     data = []
-    
+
     # 导入内部函数
     def remove_leading_zeros(value):
         """去掉前导零"""
@@ -21,7 +123,7 @@ def extract_wefaricate_data(pdf_path):
         """解析日期字符串"""
         if not date_str:
             return None
-        
+
         # 尝试解析不同的日期格式
         date_formats = [
             '%m/%d/%y',
@@ -33,14 +135,14 @@ def extract_wefaricate_data(pdf_path):
             '%b %d, %Y',
             '%B %d, %Y'
         ]
-        
+
         for fmt in date_formats:
             try:
                 date_obj = datetime.strptime(date_str.strip(), fmt)
                 return date_obj.date()
             except:
                 continue
-        
+
         # 如果所有格式都失败，返回None
         return None
 
@@ -48,16 +150,16 @@ def extract_wefaricate_data(pdf_path):
         """解析欧元价格，提取数值并计算单价"""
         if not price_str:
             return "", ""
-        
+
         # 提取价格数值
-        price_match = re.search(r'[\d,]+\.?\d*', price_str.replace(',', ''))
+        price_match = WF_NUMBER_RE.search(price_str.replace(',', ''))
         if not price_match:
             return price_str, ""
-        
+
         # 提取per后的数量
-        per_match = re.search(r'per\s+(\d+)', price_str, re.IGNORECASE)
+        per_match = WF_PER_QUANTITY_RE.search(price_str)
         quantity = int(per_match.group(1)) if per_match else 1
-        
+
         # 计算单价
         try:
             price_value = float(price_match.group(0))
@@ -71,17 +173,17 @@ def extract_wefaricate_data(pdf_path):
         """清理货币值，只保留货币符号和数字"""
         if not value:
             return value
-        
+
         # 移除逗号以便处理
         clean_value = value.replace(',', '')
-        
+
         # 提取数字部分
-        number_match = re.search(r'[\d]+\.?\d*', clean_value)
+        number_match = WF_DIGITS_RE.search(clean_value)
         if not number_match:
             return value
-        
+
         number_part = number_match.group(0)
-        
+
         # 检查货币符号（可能在前面或后面）
         currency_symbol = ""
         if '€' in value or 'EUR' in value:
@@ -90,7 +192,7 @@ def extract_wefaricate_data(pdf_path):
             currency_symbol = "$"
         elif '£' in value:
             currency_symbol = "£"
-        
+
         # 如果没有找到货币符号，尝试从常见的货币代码中提取
         if not currency_symbol:
             if 'EUR' in value:
@@ -99,88 +201,72 @@ def extract_wefaricate_data(pdf_path):
                 currency_symbol = "$"
             elif 'GBP' in value:
                 currency_symbol = "£"
-        
+
         return f"{currency_symbol}{number_part}"
 
     def parse_decimal(value):
         """解析Decimal值，处理货币符号"""
         if not value:
             return None
-        
+
         try:
             # 移除货币符号
-            clean_value = re.sub(r'[€$£]', '', str(value))
+            clean_value = WF_CURRENCY_SYMBOL_RE.sub('', str(value))
             # 移除逗号
             clean_value = clean_value.replace(',', '')
             return Decimal(clean_value)
         except (InvalidOperation, ValueError):
             return None
-    
-    # 存储所有页面的数据和Schedule Lines信息，用于跨页处理
-    all_pages_info = []
-    
+
+    def parse_net_value(net_value_raw):
+        """解析总价列，只保留货币符号和数字"""
+        if net_value_raw and ('€' in net_value_raw or 'EUR' in net_value_raw or WF_NUMBER_RE.search(net_value_raw)):
+            return clean_currency_value(net_value_raw.replace('EUR', '€'))
+        return net_value_raw
+
+    matcher = ScheduleLineMatcher()
+    po_number = ""
+    po_placed_date = None
+    purchaser = ""
+
     with pdfplumber.open(pdf_path) as pdf:
-        # 首先收集所有页面的信息
+        total_pages = len(pdf.pages)
         for page_num, page in enumerate(pdf.pages):
-            text = page.extract_text()
-            
-            print(f"Processing Wefaricate PDF: {pdf_path}, Page: {page_num + 1}")
-            
-            # 提取采购订单号 (只在第一页提取)
-            po_number = ""
+            logger.debug("Processing Wefaricate PDF: %s, Page: %d", pdf_path, page_num + 1)
+
+            # 提取采购订单号、日期和采购员 (只在第一页提取文本)
             if page_num == 0:
-                print(f"Processing Wefaricate PDF: {pdf_path}")
-                
+                text = page.extract_text() or ""
+
                 # 提取采购订单号 (更灵活的匹配)
-                po_match = re.search(r'Purchase Order[^\d]*(\d+)', text)
+                po_match = WF_PO_NUMBER_RE.search(text)
                 if not po_match:
-                    po_match = re.search(r'(\d{10})', text)  # 尝试匹配10位数字
+                    po_match = WF_PO_NUMBER_FALLBACK_RE.search(text)  # 尝试匹配10位数字
                 po_number = po_match.group(1) if po_match else ""
-                print(f"Extracted PO Number: {po_number}")
-                
+
                 # 提取Created On日期作为PO Placed date
-                po_placed_date = None
-                created_on_match = re.search(r'Created on:\s*([A-Za-z]+\s*\d{1,2},\s*\d{4})', text)
+                created_on_match = WF_CREATED_ON_RE.search(text)
                 if created_on_match:
-                    # 解析日期
-                    date_str = created_on_match.group(1)
-                    po_placed_date = parse_date(date_str)
-                
+                    po_placed_date = parse_date(created_on_match.group(1))
+
                 # 提取Contact Person作为Purchaser
-                purchaser = ""
-                contact_match = re.search(r'Contact Person[:\s]*(.*)', text)
+                contact_match = WF_CONTACT_PERSON_RE.search(text)
                 if contact_match:
                     purchaser = contact_match.group(1).strip()
-                print(f"PO Placed Date: {po_placed_date}")
-            
+                logger.info("Wefaricate PDF %s: PO=%s, PO Placed Date=%s", pdf_path, po_number, po_placed_date)
+                del text
+
             # 查找表格数据
             tables = page.extract_tables()
-            
-            # 存储当前页面的信息
-            page_info = {
-                'page_num': page_num,
-                'text': text,
-                'table': tables[0] if tables else None,
-                'data_rows': [],  # 存储数据行信息
-                'schedule_lines': [],  # 存储Schedule Lines信息
-                'po_number': po_number,
-                'po_placed_date': po_placed_date,
-                'purchaser': purchaser
-            }
-            
-            # 处理所有表格中的数据
-            tables_to_process = tables if tables else []
-            
-            for table_idx, table in enumerate(tables_to_process):
+
+            for table_idx, table in enumerate(tables):
                 if not table:
                     continue
-                
-                print(f"Processing table {table_idx + 1}/{len(tables_to_process)} with {len(table)} rows")
-                
+
                 # 检测表格的列结构
                 header_row_index = -1
                 table_structure = 'standard'  # 默认标准结构
-                
+
                 for i, row in enumerate(table):
                     if row and any(cell and ('Item' in str(cell) or 'Description' in str(cell) or 'Expected Value' in str(cell)) for cell in row):
                         header_row_index = i
@@ -193,378 +279,132 @@ def extract_wefaricate_data(pdf_path):
                             # 标准结构：Item | ID | Description | Quantity | Net Price | Net Value
                             table_structure = 'standard'
                         break
-                
-                print(f"Header row index: {header_row_index}, Structure: {table_structure}")
-                
+
                 # 处理数据行
                 start_index = header_row_index + 1 if header_row_index >= 0 else 0
                 for i in range(start_index, len(table)):
                     row = table[i]
-                    if row and any(cell and str(cell).strip() for cell in row):  # 非空行
-                        # 过滤掉明显不是数据的行
-                        row_text = " ".join(str(cell) for cell in row if cell)
-                        if any(skip_text in row_text for skip_text in ['Page:', 'We Fabricate', 'Incoterms:']):
-                            continue
-                        
-                        # 检查是否为Schedule Lines行
-                        if 'Schedule Lines:' in row_text:
-                            # 查找Schedule Lines行之后的日期行
-                            schedule_lines_index = i + 1
-                            if schedule_lines_index < len(table):
-                                schedule_row = table[schedule_lines_index]
-                                # 检查这行是否包含日期信息
-                                if schedule_row and len(schedule_row) > 4:
-                                    # 检查第4列（数量列）和第5列（日期列）
-                                    qty_cell = str(schedule_row[3]).strip() if schedule_row[3] else ""
-                                    date_cell = str(schedule_row[4]).strip() if schedule_row[4] else ""
-                                    # 检查是否包含日期格式 (例如: Oct 7, 2025)
-                                    if re.match(r'[A-Za-z]+\s*\d{1,2},\s*\d{4}', date_cell):
-                                        # 解析日期
-                                        try:
-                                            req_date = parse_date(date_cell)
-                                            print(f"解析到Schedule Lines日期: {date_cell} -> {req_date}")
-                                            # 存储Schedule Lines信息
-                                            page_info['schedule_lines'].append({
-                                                'table_idx': table_idx,  # 此次会话指的是哪个表格
-                                                'table_row_index': i,  # Schedule Lines行在表格中的索引
-                                                'date_row_index': schedule_lines_index,  # 日期行在表格中的索引
-                                                'req_date': req_date,
-                                                'date_cell': date_cell,
-                                                'quantity': qty_cell
-                                            })
-                                        except Exception as e:
-                                            print(f"日期解析失败: {date_cell}, 错误: {e}")
+                    if not row or not any(cell and str(cell).strip() for cell in row):
+                        continue
+
+                    # 过滤掉明显不是数据的行
+                    row_text = " ".join(str(cell) for cell in row if cell)
+                    if any(skip_text in row_text for skip_text in WF_SKIP_TEXTS):
+                        continue
+
+                    # 检查是否为Schedule Lines行：日期在下一行的第5列
+                    if 'Schedule Lines:' in row_text:
+                        if i + 1 < len(table):
+                            schedule_row = table[i + 1]
+                            if schedule_row and len(schedule_row) > 4:
+                                date_cell = str(schedule_row[4]).strip() if schedule_row[4] else ""
+                                # 检查是否包含日期格式 (例如: Oct 7, 2025)
+                                if WF_SCHEDULE_DATE_RE.match(date_cell):
+                                    matcher.add_schedule(parse_date(date_cell), page_num, table_idx)
+                        continue
+
+                    # 检查是否为Schedule Lines日期行（可能不包含"Schedule Lines:"文本）
+                    # 判断标准：第一列为空，且第五列或第六列包含日期格式
+                    cell0 = str(row[0]).strip() if len(row) > 0 and row[0] else ""
+                    cell4 = str(row[4]).strip() if len(row) > 4 and row[4] else ""
+                    cell5 = str(row[5]).strip() if len(row) > 5 and row[5] else ""
+                    if not cell0:
+                        if WF_SCHEDULE_DATE_RE.match(cell4):
+                            matcher.add_schedule(parse_date(cell4), page_num, table_idx)
                             continue
-                        
-                        # 检查是否为Schedule Lines日期行（可能不包含"Schedule Lines:"文本）
-                        # 判断标准：第一列为空，且第四列或第五列包含日期格式
-                        cell0 = str(row[0]).strip() if len(row) > 0 and row[0] else ""
-                        cell4 = str(row[4]).strip() if len(row) > 4 and row[4] else ""
-                        cell5 = str(row[5]).strip() if len(row) > 5 and row[5] else ""
-                        
-                        # 检查这行是否是Schedule Lines日期行
-                        is_schedule_date_row = (not cell0 and (re.match(r'[A-Za-z]+\s*\d{1,2},\s*\d{4}', cell4) or re.match(r'[A-Za-z]+\s*\d{1,2},\s*\d{4}', cell5)))
-                        if is_schedule_date_row:
-                            print(f"发现Schedule Lines日期行 {i}: {row_text[:60]}")
-                            # 尝试从cell4或cell5提取日期
-                            date_cell = ""
-                            if re.match(r'[A-Za-z]+\s*\d{1,2},\s*\d{4}', cell4):
-                                date_cell = cell4
-                            elif re.match(r'[A-Za-z]+\s*\d{1,2},\s*\d{4}', cell5):
-                                date_cell = cell5
-                            
-                            if date_cell:
-                                try:
-                                    req_date = parse_date(date_cell)
-                                    print(f"解析到Schedule Lines日期（行）: {date_cell} -> {req_date}")
-                                    # 存储Schedule Lines信息
-                                    page_info['schedule_lines'].append({
-                                        'table_idx': table_idx,  # 此次会话指的是哪个表格
-                                        'table_row_index': i,  # Schedule Lines行在表格中的索引
-                                        'date_row_index': i,   # 日期就在这一行
-                                        'req_date': req_date,
-                                        'date_cell': date_cell,
-                                        'quantity': cell0 or cell4.split()[0] if cell4 else ""
-                                    })
-                                except Exception as e:
-                                    print(f"日期解析失败: {date_cell}, 错误: {e}")
+                        if WF_SCHEDULE_DATE_RE.match(cell5):
+                            matcher.add_schedule(parse_date(cell5), page_num, table_idx)
                             continue
-                        
-                        # 确保行数据完整
-                        while len(row) < 10:
-                            row.append("")
-                        
-                        # 提取数据，更灵活地处理列位置
-                        item = ""
-                        id_part = ""
-                        description = ""
-                        quantity = ""
-                        net_price = ""
-                        net_value = ""
-                        req_date = None
-                        
-                        if table_structure == 'simple':
-                            # 简化结构：Item | Description | Expected Value
-                            if len(row) > 0:
-                                cell0 = str(row[0]).strip() if row[0] else ""
-                                if re.match(r'^\d+$', cell0):
-                                    item = cell0
-                                    print(f"提取到Item编号: {item}")
-                                else:
-                                    print(f"无效的Item编号: '{cell0}'")
-                            if len(row) > 1:
-                                description = str(row[1]).strip() if row[1] else ""
-                            if len(row) > 2:
-                                net_value_raw = str(row[2]).strip() if row[2] else ""
-                                print(f"Raw net value: '{net_value_raw}'")
-                                if net_value_raw and ('€' in net_value_raw or 'EUR' in net_value_raw or re.search(r'[\d,]+\.?\d*', net_value_raw)):
-                                    net_value = clean_currency_value(net_value_raw.replace('EUR', '€'))
-                                else:
-                                    if net_value_raw and re.search(r'[\d,]+\.?\d*', net_value_raw):
-                                        number_match = re.search(r'[\d,]+\.?\d*', net_value_raw.replace(',', ''))
-                                        if number_match:
-                                            net_value = f"€{number_match.group(0)}"
-                                        else:
-                                            net_value = net_value_raw
-                                    else:
-                                        net_value = net_value_raw
-                            id_part = ""  # 简化结构无ID
-                            quantity = ""  # 简化结构无Quantity
-                            net_price = net_value  # 特殊情况：net_price = net_value
-                        else:
-                            # 标准结构：Item | ID | Description | Quantity | Net Price | Net Value
-                            # 提取Item编号
-                            if len(row) > 0:
-                                cell0 = str(row[0]).strip() if row[0] else ""
-                                # 检查是否为Item编号（数字格式）
-                                if re.match(r'^\d+$', cell0):
-                                    item = cell0
-                                    print(f"提取到Item编号: {item}")
-                                else:
-                                    print(f"无效的Item编号: '{cell0}'")
-                            
-                            # 提取ID (不一定需要符合xxxx-xxxx-xxxx格式)
-                            if len(row) > 1:
-                                id_part = str(row[1]).strip() if row[1] else ""
-                                print(f"提取到ID: '{id_part}'")
-                                # 验证ID格式(如果存在就必须符合xxxx-xxxx-xxxx模式)
-                                if id_part and not re.match(r'^\d{4}-\d{4}-\d{4}$', id_part):
-                                    print(f"跳过不符合格式的ID: '{id_part}'")
-                                    # 不立即跳过，而是继续处理其他字段，稍后再决定是否添加数据行
-                            
-                            # 提取描述
-                            if len(row) > 2:
-                                description = str(row[2]).strip() if row[2] else ""
-                            
-                            # 提取数量 (正确处理逗号分隔的数字)
-                            if len(row) > 3:
-                                quantity_cell = str(row[3]).strip() if row[3] else ""
-                                # 提取数量（数字），正确处理逗号
-                                qty_match = re.search(r'([\d,]+)(?:\.\d+)?', quantity_cell)
-                                if qty_match:
-                                    # 移除逗号并获取数量
-                                    quantity = qty_match.group(1).replace(',', '')
-                            
-                            # 提取价格信息
-                            if len(row) > 4:
-                                net_price_raw = str(row[4]).strip() if row[4] else ""
-                                # 解析欧元价格
-                                net_price, _ = parse_eur_price(net_price_raw)
-                                print(f"Price parsing: raw='{net_price_raw}', unit='{net_price}'")
-                            
-                            # 确保总是从第6列获取Net Value（Total Price）
-                            if len(row) > 5:
-                                net_value_raw = str(row[5]).strip() if row[5] else ""
-                                print(f"Raw net value: '{net_value_raw}'")
-                                # 如果第五列有总价，使用它
-                                if net_value_raw and ('€' in net_value_raw or 'EUR' in net_value_raw or re.search(r'[\d,]+\.?\d*', net_value_raw)):
-                                    # 清理Net Value，只保留货币符号和数字
-                                    net_value = clean_currency_value(net_value_raw.replace('EUR', '€'))
-                                else:
-                                    # 如果没有有效的net_value_raw，但有数值，添加欧元符号
-                                    if net_value_raw and re.search(r'[\d,]+\.?\d*', net_value_raw):
-                                        # 提取数字并添加欧元符号
-                                        number_match = re.search(r'[\d,]+\.?\d*', net_value_raw.replace(',', ''))
-                                        if number_match:
-                                            net_value = f"€{number_match.group(0)}"
-                                        else:
-                                            net_value = net_value_raw
-                                    else:
-                                        net_value = net_value_raw
-
-                        print(f"Processing row: Item={item}, ID={id_part}, Qty={quantity}, Net Price={net_price}, Net Value={net_value}")
-                        
-                        # 验证ID格式（ID可以为空，但如果存在就必须符合格式）
-                        id_valid = (not id_part) or re.match(r'^\d{4}-\d{4}-\d{4}$', id_part)
-                        
-                        # 检查是否为特殊行：只有Description和Value，没有Item、Quantity、Net Price
-                        # 这种情况下：pn为空，Quantity设为1，net_price和total_price都为该value
-                        is_special_case = (not item and description and net_value and not quantity and not net_price) or (table_structure == 'simple' and item and description and net_value)
-                        
-                        # 只要有有效的Item编号和ID格式正确，就添加数据（允许ID为空）
-                        # 或者是特殊情况：只有Description和Value
-                        if (item and id_valid) or is_special_case:
-                            if is_special_case:
-                                print(f"添加特殊数据行（仅Description和Value）: Description={description}, Value={net_value}")
-                                # 特殊情况：item可能为空或不为空
-                                if not item:
-                                    item = ""
-                                    item_no_zero = ""
-                                else:
-                                    item_no_zero = remove_leading_zeros(item) if item else ""
-                                id_part = ""  # pn为空
-                                quantity = "1"  # 数量设为1
-                                net_price = net_value  # net_price和total_price都为value
-                            else:
-                                print(f"添加有效数据行: Item={item}, ID={id_part if id_part else 'N/A'}")
-                                # 去掉前导零
-                                item_no_zero = remove_leading_zeros(item) if item else ""
-                            
-                            # 创建数据行信息
-                            data_row_info = {
-                                "item": item,
-                                "item_no_zero": item_no_zero,
-                                "id_part": id_part,  # 可以为空
-                                "description": description,
-                                "quantity": quantity,
-                                "net_price": net_price,
-                                "net_value": net_value,
-                                "table_idx": table_idx,  # 此次会话指的是哪个表格
-                                "table_row_index": i,  # 数据行在表格中的索引
-                                "table_row_data": row
-                            }
-                            page_info['data_rows'].append(data_row_info)
-                        else:
-                            print(f"跳过无效数据行: Item='{item}', ID='{id_part}'")
-                            # 记录详细信息
-                            if not item:
-                                print(f"  原因: 缺少Item编号")
-                            if id_part and not re.match(r'^\d{4}-\d{4}-\d{4}$', id_part):
-                                print(f"  原因: ID格式不正确")
-                
-            # 存储页面信息
-            all_pages_info.append(page_info)
-        
-        # 处理完所有页面后，统一处理数据和Schedule Lines的关联
-        # 首先处理非第一页的页面，获取PO信息
-        if len(all_pages_info) > 0:
-            first_page_po = all_pages_info[0]['po_number']
-            first_page_date = all_pages_info[0]['po_placed_date']
-            first_page_purchaser = all_pages_info[0]['purchaser']
-            
-            # 为后续页面设置PO信息
-            for page_info in all_pages_info[1:]:
-                page_info['po_number'] = first_page_po
-                page_info['po_placed_date'] = first_page_date
-                page_info['purchaser'] = first_page_purchaser
-        
-        # 创建一个列表来存储所有数据行，便于跨页关联
-        all_data_rows = []
-        all_schedule_lines = []
-        
-        # 收集所有数据行和Schedule Lines信息
-        for page_info in all_pages_info:
-            # 为每个数据行添加页面信息
-            for table_idx, data_row in enumerate(page_info['data_rows']):
-                data_row_with_page = data_row.copy()
-                data_row_with_page['page_num'] = page_info['page_num']
-                data_row_with_page['po_number'] = page_info['po_number']
-                data_row_with_page['po_placed_date'] = page_info['po_placed_date']
-                data_row_with_page['purchaser'] = page_info['purchaser']
-                # 注意：这里的table_idx是数据行在page_info['data_rows']中的索引，不是表格本身的索引
-                # 我们需要从原始数据中追踪来自哪个表格
-                all_data_rows.append(data_row_with_page)
-            
-            # 为每个Schedule Lines添加页面信息
-            for schedule_line in page_info['schedule_lines']:
-                schedule_line_with_page = schedule_line.copy()
-                schedule_line_with_page['page_num'] = page_info['page_num']
-                all_schedule_lines.append(schedule_line_with_page)
-        
-        # 为每个数据行查找对应的Schedule Lines日期
-        # 正确的逻辑是：每个数据行应该关联到它后面的最近一个Schedule Lines日期
-        
-        # 按页面和行索引排序所有元素（包括数据行和Schedule Lines）
-        all_elements = []
-        
-        # 收集所有数据行
-        for data_row in all_data_rows:
-            all_elements.append({
-                'type': 'data',
-                'page_num': data_row['page_num'],
-                'table_idx': data_row.get('table_idx'),  # 添加表格索引
-                'table_row_index': data_row['table_row_index'],
-                'data': data_row
-            })
-        
-        # 收集所有Schedule Lines
-        for schedule_line in all_schedule_lines:
-            all_elements.append({
-                'type': 'schedule',
-                'page_num': schedule_line['page_num'],
-                'table_idx': schedule_line.get('table_idx'),  # 添加表格索引
-                'table_row_index': schedule_line['table_row_index'],
-                'data': schedule_line
-            })
-        
-        # 按页面、表格和行索引排序
-        all_elements.sort(key=lambda x: (x['page_num'], x.get('table_idx', 0), x['table_row_index']))
-        
-        # 为每个数据行找到其后面的所有Schedule Lines，并选择最早的日期
-        for i, element in enumerate(all_elements):
-            if element['type'] == 'data':
-                # 处理数据行
-                data_row = element['data']
-                po_number = data_row['po_number']
-                po_placed_date = data_row['po_placed_date']
-                purchaser = data_row['purchaser']
-                item = data_row['item']
-                item_no_zero = data_row['item_no_zero']
-                id_part = data_row['id_part']
-                description = data_row['description']
-                quantity = data_row['quantity']
-                net_price = data_row['net_price']
-                net_value = data_row['net_value']
-                
-                # 查找这个数据行后面的所有Schedule Lines（可能跨页），选择最早的日期
-                req_date_wf = None
-                schedule_dates = []
-                for j in range(i + 1, len(all_elements)):
-                    next_element = all_elements[j]
-                    
-                    # 检查是否是同一表格（同页同表格）中的Schedule Lines
-                    if next_element['page_num'] == element['page_num'] and next_element.get('table_idx') == element.get('table_idx'):
-                        # 同一表格中的元素
-                        if next_element['type'] == 'schedule':
-                            schedule_dates.append(next_element['data']['req_date'])
-                        elif next_element['type'] == 'data':
-                            # 遇到下一个数据行时停止（如果在同一表格中）
-                            break
-                    elif next_element['page_num'] > element['page_num']:
-                        # 已经转到下一页
-                        # 如果下一页也有Schedule Lines，继续收集（跨页关联）
-                        if next_element['type'] == 'schedule':
-                            schedule_dates.append(next_element['data']['req_date'])
-                        elif next_element['type'] == 'data':
-                            # 遇到下一个数据行时停止
-                            break
-                    # 如果是上一页的数据，忽略
-                
-                # 从所有Schedule Lines中选择最早的日期
-                if schedule_dates:
-                    req_date_wf = min(schedule_dates)
-                    print(f"数据行 {item} 有 {len(schedule_dates)} 条schedule lines，选择最早日期: {req_date_wf}")
-                else:
-                    print(f"数据行 {item} 没有找到schedule lines")
-                
-                print(f"数据行 {item} 关联到日期: {req_date_wf}")
-                
-                # 创建最终的数据行
-                final_data_row = {
-                    "po": po_number,
-                    "pn": id_part,
-                    "line": int(item_no_zero) if item_no_zero and item_no_zero.isdigit() else None,
-                    "po_line": f"{po_number}/{item_no_zero}" if item_no_zero and po_number else (item_no_zero or id_part),
-                    "description": description,
-                    "qty": parse_decimal(quantity),
-                    "net_price": parse_decimal(net_price),
-                    "total_price": parse_decimal(net_value),
-                    "req_date_wf": req_date_wf,
-                    "eta_wfsz": None,
-                    "shipping_mode": None,
-                    "comment": None,
-                    "po_placed_date": po_placed_date,
-                    "purchaser": purchaser,
-                    "record_no": None,
-                    "shipping_cost": None,
-                    "tracking_no": None,
-                    "so_number": None,
-                    "latest_departure_date": None,
-                    "chinese_name": None,
-                    "unit": None
-                }
-                data.append(final_data_row)
-    
+
+                    # 确保行数据完整
+                    while len(row) < 10:
+                        row.append("")
+
+                    # 提取数据，更灵活地处理列位置
+                    item = cell0 if WF_ITEM_RE.match(cell0) else ""
+                    id_part = ""
+                    description = ""
+                    quantity = ""
+                    net_price = ""
+                    net_value = ""
+
+                    if table_structure == 'simple':
+                        # 简化结构：Item | Description | Expected Value
+                        description = str(row[1]).strip() if row[1] else ""
+                        net_value = parse_net_value(str(row[2]).strip() if row[2] else "")
+                        net_price = net_value  # 特殊情况：net_price = net_value
+                    else:
+                        # 标准结构：Item | ID | Description | Quantity | Net Price | Net Value
+                        # ID 可以为空，但如果存在就必须符合xxxx-xxxx-xxxx格式
+                        id_part = str(row[1]).strip() if row[1] else ""
+                        description = str(row[2]).strip() if row[2] else ""
+
+                        # 提取数量（数字），正确处理逗号
+                        qty_match = WF_QUANTITY_RE.search(str(row[3]).strip() if row[3] else "")
+                        if qty_match:
+                            quantity = qty_match.group(1).replace(',', '')
+
+                        # 解析欧元价格
+                        net_price, _ = parse_eur_price(str(row[4]).strip() if row[4] else "")
+
+                        # 从第6列获取Net Value（Total Price）
+                        net_value = parse_net_value(str(row[5]).strip() if row[5] else "")
+
+                    id_valid = (not id_part) or WF_ID_RE.match(id_part)
+
+                    # 检查是否为特殊行：只有Description和Value，没有Item、Quantity、Net Price
+                    # 这种情况下：pn为空，Quantity设为1，net_price和total_price都为该value
+                    is_special_case = (not item and description and net_value and not quantity and not net_price) or (table_structure == 'simple' and item and description and net_value)
+
+                    # 只要有有效的Item编号和ID格式正确，就添加数据（允许ID为空）
+                    # 或者是特殊情况：只有Description和Value
+                    if not ((item and id_valid) or is_special_case):
+                        logger.debug("跳过无效数据行: Item=%r, ID=%r", item, id_part)
+                        continue
+
+                    if is_special_case:
+                        id_part = ""  # pn为空
+                        quantity = "1"  # 数量设为1
+                        net_price = net_value  # net_price和total_price都为value
+                    # 去掉前导零
+                    item_no_zero = remove_leading_zeros(item) if item else ""
+
+                    final_data_row = {
+                        "po": po_number,
+                        "pn": id_part,
+                        "line": int(item_no_zero) if item_no_zero and item_no_zero.isdigit() else None,
+                        "po_line": f"{po_number}/{item_no_zero}" if item_no_zero and po_number else (item_no_zero or id_part),
+                        "description": description,
+                        "qty": parse_decimal(quantity),
+                        "net_price": parse_decimal(net_price),
+                        "total_price": parse_decimal(net_value),
+                        "req_date_wf": None,
+                        "eta_wfsz": None,
+                        "shipping_mode": None,
+                        "comment": None,
+                        "po_placed_date": po_placed_date,
+                        "purchaser": purchaser,
+                        "record_no": None,
+                        "shipping_cost": None,
+                        "tracking_no": None,
+                        "so_number": None,
+                        "latest_departure_date": None,
+                        "chinese_name": None,
+                        "unit": None
+                    }
+                    # 先按出现顺序加入结果，req_date_wf 由后续的 Schedule Lines 原地填写
+                    data.append(final_data_row)
+                    matcher.add_data_row(final_data_row, page_num, table_idx)
+
+            # 释放本页解析出的对象，内存占用不随页数增长
+            del tables
+            page.flush_cache()
+
+            # 报告解析进度（已完成页数, 总页数）
+            if progress_callback:
+                progress_callback(page_num + 1, total_pages)
+
+    matcher.finish()
     return data
 
 def insert_wf_open_data(data_entries):
@@ -621,19 +461,19 @@ def insert_wf_open_data(data_entries):
                 
                 cursor.execute(insert_query, entry)
                 success_count += 1
-                print(f"成功插入/更新数据: PO={entry['po']}, Line={entry['line']}")
+                logger.debug("成功插入/更新数据: PO=%s, Line=%s", entry['po'], entry['line'])
                 
             except Exception as e:
                 error_count += 1
-                print(f"插入数据时出错: {e}")
-                print(f"出错数据: {entry}")
+                logger.warning("插入数据时出错: %s", e)
+                logger.debug("出错数据: %s", entry)
 
         connection.commit()
-        print(f"成功插入 {success_count} 条WF Open数据，{error_count} 条数据有错误")
+        logger.info("成功插入 %d 条WF Open数据，%d 条数据有错误", success_count, error_count)
         return success_count
         
     except Exception as error:
-        print(f"插入WF Open数据时出错: {error}")
+        logger.error("插入WF Open数据时出错: %s", error)
         return 0
     finally:
         if 'connection' in locals() and connection:
@@ -707,19 +547,19 @@ def insert_non_wf_open_data(data_entries):
                 
                 cursor.execute(insert_query, entry)
                 success_count += 1
-                print(f"成功插入/更新数据: PO={entry['po']}, PN={entry['pn']}")
+                logger.debug("成功插入/更新数据: PO=%s, PN=%s", entry['po'], entry['pn'])
                 
             except Exception as e:
                 error_count += 1
-                print(f"插入数据时出错: {e}")
-                print(f"出错数据: {entry}")
+                logger.warning("插入数据时出错: %s", e)
+                logger.debug("出错数据: %s", entry)
 
         connection.commit()
-        print(f"成功插入 {success_count} 条Non-WF Open数据，{error_count} 条数据有错误")
+        logger.info("成功插入 %d 条Non-WF Open数据，%d 条数据有错误", success_count, error_count)
         return success_count
         
     except Exception as error:
-        print(f"插入Non-WF Open数据时出错: {error}")
+        logger.error("插入Non-WF Open数据时出错: %s", error)
         return 0
     finally:
         if 'connection' in locals() and connection:
@@ -750,10 +590,10 @@ def connect_to_db():
     try:
         db_config = get_db_config()
         connection = psycopg2.connect(**db_config)
-        print("成功连接到数据库")
+        logger.debug("成功连接到数据库")
         return connection
     except Exception as error:
-        print(f"连接数据库时出错: {error}")
+        logger.error("连接数据库时出错: %s", error)
         return None
 
 def remove_leading_zeros(value):
@@ -871,7 +711,7 @@ def parse_decimal(value):
     except (InvalidOperation, ValueError):
         return None
 
-def extract_centurion_data(pdf_path):
+def extract_centurion_data(pdf_path, progress_callback=None):
     """提取Centurion采购订单数据"""
     import pdfplumber
     import re
@@ -886,25 +726,28 @@ def extract_centurion_data(pdf_path):
         all_lines = []
         
         # 遍历所有页面
-        for page in pdf.pages:
+        for page_num, page in enumerate(pdf.pages):
             text = page.extract_text()
             all_text += text + "\n"
             all_lines.extend(text.split('\n'))
+            
+            # 报告解析进度（已完成页数, 总页数）
+            if progress_callback:
+                progress_callback(page_num + 1, len(pdf.pages))
         
-        print(f"Processing Centurion PDF: {pdf_path} with {len(pdf.pages)} pages")
+        logger.debug("Processing Centurion PDF: %s with %d pages", pdf_path, len(pdf.pages))
         
         # 提取采购订单号
         po_match = re.search(r'PO[-\s]*(\d+)', all_text)
         if not po_match:
             po_match = re.search(r'Number\s*([A-Z0-9\-]+)', all_text)
         po_number = po_match.group(1) if po_match else ""
-        print(f"Extracted PO Number: {po_number}")
         
         # 提取日期
         date_match = re.search(r'Date[:\s]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', all_text)
         po_date_str = date_match.group(1) if date_match else ""
         po_date = parse_date(po_date_str) if po_date_str else None
-        print(f"Extracted PO Date: {po_date}")
+        logger.info("Centurion PDF %s: PO=%s, PO Date=%s", pdf_path, po_number, po_date)
         
         # 识别货币类型
         currency_symbol = "$"  # 默认美元符号
@@ -918,7 +761,7 @@ def extract_centurion_data(pdf_path):
                 "GBP": "£"
             }
             currency_symbol = currency_map.get(currency_code, currency_symbol)
-        print(f"Currency symbol: {currency_symbol}")
+        logger.debug("Currency symbol: %s", currency_symbol)
         
         # 查找包含关键字段的行（更灵活的匹配）
         item_start = -1
@@ -931,7 +774,7 @@ def extract_centurion_data(pdf_path):
                 break
         
         if item_start != -1:
-            print(f"Found item header at line {item_start}")
+            logger.debug("Found item header at line %d", item_start)
             
             # 处理数据行，按照Centurion的特定格式
             i = item_start + 1
@@ -1035,7 +878,7 @@ def extract_centurion_data(pdf_path):
                             # 更新i以跳过所有处理过的描述延续行
                             i = j - 1  # 最后一个处理行的上一行（因为下方的主流程i += 1）
 
-                        print(f"Processing row: Line={line_number}, PN={pn}, Qty={quantity}")
+                        logger.debug("Processing row: Line=%s, PN=%s, Qty=%s", line_number, pn, quantity)
                         
                         # 创建数据行
                         data_row = {
@@ -1063,7 +906,7 @@ def extract_centurion_data(pdf_path):
                 
                 i += 1
         else:
-            print("Could not find item header in Centurion PDF")
+            logger.warning("Could not find item header in Centurion PDF: %s", pdf_path)
     
     return data
 
@@ -1127,7 +970,7 @@ def parse_magic_fx_line(block_text, line_number, po_number, po_placed_date):
     net_price_str = f"€{net_price_str.replace('.', '').replace(',', '.')}"  # 同样处理
     total_price_str = f"€{total_price_str.replace('.', '').replace(',', '.')}"  # 同样处理
     
-    print(f"Processing row {line_number}: Description={description}, Qty={qty_str}")
+    logger.debug("Processing row %s: Description=%s, Qty=%s", line_number, description, qty_str)
     
     # 创建数据行
     data_row = {
@@ -1153,7 +996,7 @@ def parse_magic_fx_line(block_text, line_number, po_number, po_placed_date):
     }
     return data_row
 
-def extract_magic_fx_data(pdf_path):
+def extract_magic_fx_data(pdf_path, progress_callback=None):
     """提取MAGIC FX采购订单数据"""
     import pdfplumber
     import re
@@ -1164,18 +1007,17 @@ def extract_magic_fx_data(pdf_path):
     
     with pdfplumber.open(pdf_path) as pdf:
         if not pdf.pages:
-            print(f"No pages found in PDF: {pdf_path}")
+            logger.warning("No pages found in PDF: %s", pdf_path)
             return data
         
         # 从第一页提取PO信息
         text = pdf.pages[0].extract_text()
-        print(f"Processing MAGIC FX PDF: {pdf_path}")
-        print(f"PDF text length: {len(text) if text else 0}")
+        logger.debug("Processing MAGIC FX PDF: %s", pdf_path)
+        logger.debug("PDF text length: %d", len(text) if text else 0)
         
         # 提取采购订单号
         po_match = re.search(r'Purchase Order No\.\s*([\d]+)', text)
         po_number = po_match.group(1) if po_match else ""
-        print(f"Extracted PO Number: {po_number}")
         
         # 提取日期
         date_match = re.search(r'Date\s+([\d]{2}-[\d]{2}-[\d]{4})', text)
@@ -1187,15 +1029,19 @@ def extract_magic_fx_data(pdf_path):
                 po_placed_date = datetime.strptime(date_str, '%d-%m-%Y').date()
             except:
                 po_placed_date = None
-        print(f"PO Placed Date: {po_placed_date}")
+        logger.info("MAGIC FX PDF %s: PO=%s, PO Placed Date=%s", pdf_path, po_number, po_placed_date)
         
         # 查找表格
         tables = pdf.pages[0].extract_tables()
         
+        # 只解析第一页，报告解析进度（已完成页数, 总页数）
+        if progress_callback:
+            progress_callback(1, 1)
+        
         if tables and tables[0]:
             # 使用表格数据
             table = tables[0]
-            print(f"Found table with {len(table)} rows")
+            logger.debug("Found table with %d rows", len(table))
             
             # 查找表头行
             header_row_index = -1
@@ -1204,7 +1050,7 @@ def extract_magic_fx_data(pdf_path):
                     header_row_index = i
                     break
             
-            print(f"Header row index: {header_row_index}")
+            logger.debug("Header row index: %d", header_row_index)
             
             if header_row_index != -1:
                 # 处理数据行
@@ -1271,7 +1117,7 @@ def extract_magic_fx_data(pdf_path):
                     if not description and not qty_str:
                         continue
                     
-                    print(f"Processing row {line_number}: Description={description}, Qty={qty_str}")
+                    logger.debug("Processing row %s: Description=%s, Qty=%s", line_number, description, qty_str)
                     
                     # 创建数据行
                     data_row = {
@@ -1299,7 +1145,7 @@ def extract_magic_fx_data(pdf_path):
                     line_number += 1
         else:
             # 没有表格，尝试从PDF文本中提取
-            print(f"No tables found, attempting to extract from text...")
+            logger.debug("No tables found, attempting to extract from text...")
             
             # 使用正则表达式从文本中提取数据
             # 格式：CODE | CODE | 描述(可能多行) | 交货日期 | 数量 | 价格 | 总价
@@ -1448,7 +1294,7 @@ def extract_magic_fx_data(pdf_path):
                         # MAGIC FX订单通常没有具体的零件号，使用PO号-行号作为唯一标识
                         pn = f"{po_number}-{line_number:02d}" if po_number else f"MFX-{line_number:02d}"
                         
-                        print(f"Processing row {line_number}: Description={description}, Qty={qty_str}, PN={pn}")
+                        logger.debug("Processing row %s: Description=%s, Qty=%s, PN=%s", line_number, description, qty_str, pn)
                         
                         # 创建数据行
                         data_row = {
@@ -1477,7 +1323,7 @@ def extract_magic_fx_data(pdf_path):
                 
                 i += 1
     
-    print(f"Extracted {len(data)} rows from MAGIC FX PDF")
+    logger.info("Extracted %d rows from MAGIC FX PDF", len(data))
     return data
 
 def insert_non_wf_open_magic_fx_data(data_entries):
@@ -1555,19 +1401,19 @@ def insert_non_wf_open_magic_fx_data(data_entries):
                 
                 cursor.execute(insert_query, entry)
                 success_count += 1
-                print(f"成功插入/更新数据: PO={entry['po']}, Line={entry['line']}, Description={entry['description']}")
+                logger.debug("成功插入/更新数据: PO=%s, Line=%s, Description=%s", entry['po'], entry['line'], entry['description'])
                 
             except Exception as e:
                 error_count += 1
-                print(f"插入数据时出错: {e}")
-                print(f"出错数据: {entry}")
+                logger.warning("插入数据时出错: %s", e)
+                logger.debug("出错数据: %s", entry)
 
         connection.commit()
-        print(f"成功插入 {success_count} 条MAGIC FX Non-WF Open数据，{error_count} 条数据有错误")
+        logger.info("成功插入 %d 条MAGIC FX Non-WF Open数据，%d 条数据有错误", success_count, error_count)
         return success_count
         
     except Exception as error:
-        print(f"插入MAGIC FX Non-WF Open数据时出错: {error}")
+        logger.error("插入MAGIC FX Non-WF Open数据时出错: %s", error)
         return 0
     finally:
         if 'connection' in locals() and connection:
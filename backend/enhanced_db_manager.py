@@ -6,7 +6,7 @@ import os
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.env_db_config import get_db_config
-import hashlib
+from backend.utils.db_pool import get_connection as get_pooled_connection
 import time
 from datetime import datetime
 import pandas as pd
@@ -16,13 +16,8 @@ class DatabaseManager:
         self.db_config = get_db_config()
     
     def get_connection(self):
-        """获取数据库连接"""
-        try:
-            connection = psycopg2.connect(**self.db_config)
-            return connection
-        except Exception as error:
-            print(f"数据库连接失败: {error}")
-            return None
+        """从共享连接池获取数据库连接（close() 即归还连接池）"""
+        return get_pooled_connection()
     
     def query_table(self, table_name):
         """查询指定表的数据"""
@@ -47,119 +42,98 @@ class DatabaseManager:
             print(f"查询表 {table_name} 时出错: {error}")
             return None, None
     
-    def generate_row_hash(self, row_data):
-        """为行数据生成哈希值用于版本控制"""
-        # 将行数据转换为字符串并生成哈希
-        row_str = str(sorted(row_data.items()))
-        return hashlib.md5(row_str.encode()).hexdigest()
+    def _version_key_field(self, table_name):
+        """带版本控制的更新/删除使用的主键字段：open表为po_line，closed表为id"""
+        if table_name in ['wf_open', 'non_wf_open']:
+            return 'po_line'
+        return 'id'
+    
+    def _version_conflict_message(self, cursor, table_name, key_field, key_value):
+        """条件语句未命中时区分记录不存在和版本冲突（只在失败时查询）"""
+        exists_query = sql.SQL("SELECT 1 FROM purchase_orders.{} WHERE {} = %s").format(
+            sql.Identifier(table_name),
+            sql.Identifier(key_field)
+        )
+        cursor.execute(exists_query, (key_value,))
+        if cursor.fetchone():
+            return "数据已被其他用户修改，请刷新页面后重试"
+        return "未找到要操作的记录"
     
-    def update_row_with_version(self, table_name, pn, updates, expected_hash):
+    def update_row_with_version(self, table_name, pn, updates, expected_version):
         """
         更新表中的数据（带版本控制）
         
+        一条 UPDATE ... WHERE key = %s AND row_version = %s RETURNING row_version 完成冲突检测和更新，
+        row_version 由触发器在每次更新时加 1。
+        
         Args:
             table_name: 表名
             pn: 主键值
             updates: 要更新的字段字典 {column_name: new_value}
-            expected_hash: 预期的行数据哈希值
+            expected_version: 客户端读取时的 row_version
             
         Returns:
-            tuple: (success, message)
+            tuple: (success, message, row_version)
         """
         conn = self.get_connection()
         if not conn:
-            return False, "数据库连接失败"
+            return False, "数据库连接失败", None
         
+        cursor = None
         try:
             cursor = conn.cursor()
-            
-            # 确定主键字段
-            primary_key_field = 'id'  # 默认使用新的自增主键
-            primary_key_value = pn
-            
-            if table_name in ['wf_open']:
-                primary_key_field = 'po_line'
-            elif table_name in ['wf_closed', 'non_wf_closed']:
-                # 对于这些表，我们仍然使用pn作为业务主键进行查找
-                primary_key_field = 'pn'
-            
-            # 首先检查当前数据是否与预期的哈希值匹配
-            select_query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE {} = %s").format(
-                sql.Identifier(table_name),
-                sql.Identifier(primary_key_field)
-            )
-            cursor.execute(select_query, (primary_key_value,))
-            current_record = cursor.fetchone()
-            
-            if current_record:
-                # 获取列名
-                colnames = [desc[0] for desc in cursor.description]
-                # 构建当前行数据字典
-                current_row_data = dict(zip(colnames, current_record))
-                # 生成当前数据的哈希值
-                current_hash = self.generate_row_hash(current_row_data)
-                
-                # 检查哈希值是否匹配
-                if current_hash != expected_hash:
-                    cursor.close()
-                    conn.close()
-                    return False, "数据已被其他用户修改，请刷新页面后重试"
+            primary_key_field = self._version_key_field(table_name)
             
             # 构建更新查询
             set_clauses = []
             values = []
             for column_name, new_value in updates.items():
                 set_clauses.append(sql.SQL("{} = %s").format(sql.Identifier(column_name)))
-                # 处理日期字段的特殊格式
-                if column_name in ['req_date_wf', 'eta_wfsz', 'latest_departure_date', 'po_placed_date']:
-                    if new_value is None or new_value == '' or new_value == 'None' or new_value == 'nan':
-                        values.append(None)
-                    else:
-                        # 如果是日期字符串，直接使用
-                        values.append(new_value)
+                # 处理空值（日期字段的空字符串也视为空值）
+                if new_value == 'None' or new_value == 'nan':
+                    values.append(None)
+                elif new_value == '' and column_name in ['req_date_wf', 'eta_wfsz', 'latest_departure_date', 'po_placed_date']:
+                    values.append(None)
                 else:
-                    # 处理其他字段的空值
-                    if new_value == 'None' or new_value == 'nan':
-                        values.append(None)
-                    else:
-                        values.append(new_value)
+                    values.append(new_value)
+            values.extend([pn, expected_version])
             
-            # 添加主键值
-            values.append(primary_key_value)
-            
-            update_query = sql.SQL("UPDATE purchase_orders.{} SET {} WHERE {} = %s").format(
+            update_query = sql.SQL(
+                "UPDATE purchase_orders.{} SET {} WHERE {} = %s AND row_version = %s RETURNING row_version"
+            ).format(
                 sql.Identifier(table_name),
                 sql.SQL(", ").join(set_clauses),
                 sql.Identifier(primary_key_field)
             )
-            
-            # 执行更新
             cursor.execute(update_query, values)
-            affected_rows = cursor.rowcount
+            result = cursor.fetchone()
+            if not result:
+                message = self._version_conflict_message(cursor, table_name, primary_key_field, pn)
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                return False, message, None
+            
             conn.commit()
             cursor.close()
             conn.close()
-            
-            if affected_rows > 0:
-                return True, f"更新成功，影响了 {affected_rows} 行"
-            else:
-                return False, "未找到要更新的记录或数据未发生变化"
+            return True, "更新成功，影响了 1 行", result[0]
         except Exception as error:
             if conn:
                 conn.rollback()
                 if cursor:
                     cursor.close()
                 conn.close()
-            return False, f"更新数据时出错: {error}"
+            return False, f"更新数据时出错: {error}", None
     
-    def delete_row_with_version(self, table_name, pn, expected_hash):
+    def delete_row_with_version(self, table_name, pn, expected_version):
         """
         删除表中的数据（带版本控制）
         
         Args:
             table_name: 表名
             pn: 主键值
-            expected_hash: 预期的行数据哈希值
+            expected_version: 客户端读取时的 row_version
             
         Returns:
             tuple: (success, message)
@@ -168,56 +142,27 @@ class DatabaseManager:
         if not conn:
             return False, "数据库连接失败"
         
+        cursor = None
         try:
             cursor = conn.cursor()
+            primary_key_field = self._version_key_field(table_name)
             
-            # 确定主键字段
-            primary_key_field = 'id'  # 默认使用新的自增主键
-            primary_key_value = pn
-            
-            if table_name in ['wf_open']:
-                primary_key_field = 'po_line'
-            elif table_name in ['wf_closed', 'non_wf_closed']:
-                # 对于这些表，我们仍然使用pn作为业务主键进行查找
-                primary_key_field = 'pn'
-            
-            # 首先检查当前数据是否与预期的哈希值匹配
-            select_query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE {} = %s").format(
+            delete_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE {} = %s AND row_version = %s").format(
                 sql.Identifier(table_name),
                 sql.Identifier(primary_key_field)
             )
-            cursor.execute(select_query, (primary_key_value,))
-            current_record = cursor.fetchone()
-            
-            if current_record:
-                # 获取列名
-                colnames = [desc[0] for desc in cursor.description]
-                # 构建当前行数据字典
-                current_row_data = dict(zip(colnames, current_record))
-                # 生成当前数据的哈希值
-                current_hash = self.generate_row_hash(current_row_data)
-                
-                # 检查哈希值是否匹配
-                if current_hash != expected_hash:
-                    cursor.close()
-                    conn.close()
-                    return False, "数据已被其他用户修改，请刷新页面后重试"
+            cursor.execute(delete_query, (pn, expected_version))
+            if cursor.rowcount == 0:
+                message = self._version_conflict_message(cursor, table_name, primary_key_field, pn)
+                conn.rollback()
+                cursor.close()
+                conn.close()
+                return False, message
             
-            # 执行删除
-            delete_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE {} = %s").format(
-                sql.Identifier(table_name),
-                sql.Identifier(primary_key_field)
-            )
-            cursor.execute(delete_query, (primary_key_value,))
-            affected_rows = cursor.rowcount
             conn.commit()
             cursor.close()
             conn.close()
-            
-            if affected_rows > 0:
-                return True, f"删除成功，影响了 {affected_rows} 行"
-            else:
-                return False, "未找到要删除的记录"
+            return True, "删除成功，影响了 1 行"
         except Exception as error:
             if conn:
                 conn.rollback()
@@ -9,6 +9,10 @@ from datetime import datetime, timedelta
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
 
 class ExcelSyncProcessor:
     """处理从 Excel 源表同步数据到 order report"""
@@ -30,36 +34,39 @@ class ExcelSyncProcessor:
             dict: 处理结果
         """
         try:
-            # 加载两个工作簿
+            # order report 需要修改并保存，完整加载
             order_wb = load_workbook(order_report_path)
-            source_wb = load_workbook(source_data_path)
             
-            # 检查必要的工作表
             if order_sheet not in order_wb.sheetnames:
                 return {
                     'success': False,
                     'error': f'缺少工作表 (Order Report 文件): {order_sheet}'
                 }
             
-            if source_sheet not in source_wb.sheetnames:
-                return {
-                    'success': False,
-                    'error': f'缺少工作表 (Source 文件): {source_sheet}'
-                }
-            
-            # 加载工作表
             order_ws = order_wb[order_sheet]
-            source_ws = source_wb[source_sheet]
             
-            # 解析源表数据
-            source_data = self._parse_source_sheet(source_ws)
+            # 源数据文件只读取，使用只读模式逐行解析，解析完成后立即关闭
+            source_wb = load_workbook(source_data_path, read_only=True)
+            try:
+                if source_sheet not in source_wb.sheetnames:
+                    return {
+                        'success': False,
+                        'error': f'缺少工作表 (Source 文件): {source_sheet}'
+                    }
+                
+                # 解析源表数据
+                source_data = self._parse_source_sheet(source_wb[source_sheet])
+            finally:
+                source_wb.close()
+            
             if not source_data:
                 return {
                     'success': False,
                     'error': '无法从源表读取数据'
                 }
             
-            print(f"[Excel Sync] 从 {source_sheet} 读取了 {len(source_data)} 条记录")
+            source_index = self._build_source_index(source_data)
+            logger.info("从 %s 读取了 %d 条记录", source_sheet, len(source_data))
             
             # 处理 order report
             updated_rows = []
@@ -69,8 +76,8 @@ class ExcelSyncProcessor:
             order_headers = [cell.value for cell in order_ws[1]]
             col_indices = {header: idx + 1 for idx, header in enumerate(order_headers)}
             
-            print(f"[Excel Sync] Order report 列: {order_headers}")
-            print(f"[Excel Sync] 列索引: {col_indices}")
+            logger.debug("Order report 列: %s", order_headers)
+            logger.debug("列索引: %s", col_indices)
             
             # 检查必要列
             required_cols = ['Material', 'PurchaseOrder', 'Reply']
@@ -88,10 +95,10 @@ class ExcelSyncProcessor:
                 comments_col_idx = len(order_headers) + 1
                 order_ws.cell(1, comments_col_idx).value = 'Comments'
                 col_indices['Comments'] = comments_col_idx
-                print(f"[Excel Sync] 创建了 Comments 列在列 {comments_col_idx}")
+                logger.info("创建了 Comments 列在列 %d", comments_col_idx)
             else:
                 comments_col_idx = col_indices['Comments']
-                print(f"[Excel Sync] 使用已存在的 Comments 列在列 {comments_col_idx}")
+                logger.info("使用已存在的 Comments 列在列 %d", comments_col_idx)
             
             # 处理 order report 中的每一行
             for row_idx in range(2, order_ws.max_row + 1):
@@ -113,7 +120,7 @@ class ExcelSyncProcessor:
                     po, line = po_info
                     
                     # 在源表中查找匹配的记录
-                    matching_record = self._find_matching_record_by_po_line(source_data, po, line, material)
+                    matching_record = self._find_matching_record_by_po_line(source_index, po, line, material)
                     
                     if matching_record:
                         # 1. 更新 Comments：追加 Tracking No（如果存在）
@@ -124,14 +131,14 @@ class ExcelSyncProcessor:
                             if tracking_no_str not in str(current_comments):
                                 new_comments = f"{current_comments}; {tracking_no_str}".lstrip('; ')
                                 comments_cell.value = new_comments
-                                print(f"[Excel Sync] 行 {row_idx}: 已更新 Comments 为 {new_comments}")
+                                logger.debug("行 %d: 已更新 Comments 为 %s", row_idx, new_comments)
                         
                         # 2. 更新 Reply：从 ETA 日期 +7 天
                         eta_date = self._get_eta_date(matching_record)
                         if eta_date:
                             reply_str = eta_date.strftime('%m/%d/%y')
                             reply_cell.value = reply_str
-                            print(f"[Excel Sync] 行 {row_idx}: 已更新 Reply 为 {reply_str}")
+                            logger.debug("行 %d: 已更新 Reply 为 %s", row_idx, reply_str)
                         
                         updated_rows.append({
                             'row': row_idx,
@@ -140,15 +147,15 @@ class ExcelSyncProcessor:
                             'material': material
                         })
                     else:
-                        print(f"[Excel Sync] 行 {row_idx}: 未找到匹配的源数据 (PO={po}, Line={line}, Material={material})")
+                        logger.debug("行 %d: 未找到匹配的源数据 (PO=%s, Line=%s, Material=%s)", row_idx, po, line, material)
                 
                 except Exception as row_error:
                     errors.append(f'行 {row_idx}: {str(row_error)}')
             
             # 保存修改后的 order report 文件
-            print(f"[Excel Sync] 即将保存 order report 文件: {order_report_path}")
+            logger.info("即将保存 order report 文件: %s", order_report_path)
             order_wb.save(order_report_path)
-            print(f"[Excel Sync] 文件保存成功")
+            logger.info("文件保存成功")
             
             return {
                 'success': True,
@@ -165,15 +172,20 @@ class ExcelSyncProcessor:
             }
     
     def _parse_source_sheet(self, worksheet):
-        """解析源表数据"""
+        """解析源表数据（逐行读取单元格值，适用于只读模式的工作表）"""
         try:
-            headers = [cell.value for cell in worksheet[1]]
+            if hasattr(worksheet, 'reset_dimensions'):
+                # 只读模式依赖文件中记录的表格范围，部分工具生成的文件范围不准确，改为按实际行读取
+                worksheet.reset_dimensions()
+            
+            rows = worksheet.iter_rows(values_only=True)
+            headers = list(next(rows, None) or [])
             data = []
             
-            for row_idx in range(2, worksheet.max_row + 1):
+            for values in rows:
                 row_data = {}
-                for col_idx, header in enumerate(headers, 1):
-                    cell_value = worksheet.cell(row_idx, col_idx).value
+                for col_idx, header in enumerate(headers):
+                    cell_value = values[col_idx] if col_idx < len(values) else None
                     # 该序列中的 key 不仅是 header 本身，也包括接死的版本（有/没有尾部空格）
                     row_data[header] = cell_value
                     # 如果 header 有尾部空格，也可以用不带空格的版本查找
@@ -186,38 +198,74 @@ class ExcelSyncProcessor:
             
             return data
         except Exception as e:
-            print(f"解析源表失败: {e}")
+            logger.error("解析源表失败: %s", e)
             return []
     
-    def _find_matching_record(self, source_data, po_line, material):
-        """在源数据中查找匹配的记录"""
-        for record in source_data:
-            # 比较 PO/Line（考虑空格和大小写）
-            source_po_line = record.get('PN/Line') or record.get('PO/Line')
-            if source_po_line:
-                source_po_line = str(source_po_line).strip()
-            
-            target_po_line = str(po_line).strip() if po_line else None
-            
-            # 比较 PN（物料号）
-            source_pn = record.get('PN') or record.get('PN ')
-            target_pn = str(material).strip() if material else None
+    def _normalize_po_line(self, record):
+        """源记录的 PN/Line（或 PO/Line）去除首尾空格，没有时返回 None"""
+        source_po_line = record.get('PN/Line') or record.get('PO/Line')
+        if source_po_line:
+            return str(source_po_line).strip()
+        return None
+    
+    def _build_source_index(self, source_data):
+        """
+        为源表数据建立哈希索引，每条记录的键只规范化一次
+        
+        Args:
+            source_data: 源表数据列表
             
-            # 匹配逻辑：可以通过 PO + Line 或物料号匹配
-            if source_po_line == target_po_line:
-                return record
+        Returns:
+            dict: records 为原列表；by_key 以 (po, line, pn) 为键，by_po_line 以 PN/Line 字符串为键，
+                  by_po 以 PO 为键，值为记录在列表中的位置。同一个键出现多次时保留第一条，
+                  与按顺序逐条扫描的结果一致
+        """
+        by_key = {}
+        by_po_line = {}
+        by_po = {}
+        
+        for position, record in enumerate(source_data):
+            source_po_line = self._normalize_po_line(record)
+            by_po_line.setdefault(source_po_line, position)
             
-            # 尝试从 PO/Line 中提取信息
-            if target_po_line and '/' in str(target_po_line):
-                parts = str(target_po_line).split('/')
+            if source_po_line:
+                parts = source_po_line.split('/')
                 if len(parts) == 2:
-                    target_po = parts[0].strip()
-                    # 检查源数据的 PO
-                    source_po = record.get('PO')
-                    if source_po and str(source_po).strip() == target_po:
-                        return record
+                    source_pn = record.get('PN') or record.get('PN ')
+                    key = (parts[0].strip(), parts[1].strip(), str(source_pn).strip())
+                    by_key.setdefault(key, position)
+            
+            source_po = record.get('PO')
+            if source_po:
+                by_po.setdefault(str(source_po).strip(), position)
         
-        return None
+        return {
+            'records': source_data,
+            'by_key': by_key,
+            'by_po_line': by_po_line,
+            'by_po': by_po
+        }
+    
+    def _find_matching_record(self, source_index, po_line, material):
+        """在源数据中查找匹配的记录：PO/Line 完全相同，或 PO 相同；两者都命中时取源表中靠前的一条"""
+        target_po_line = str(po_line).strip() if po_line else None
+        candidates = []
+        
+        position = source_index['by_po_line'].get(target_po_line)
+        if position is not None:
+            candidates.append(position)
+        
+        # 尝试从 PO/Line 中提取 PO
+        if target_po_line and '/' in target_po_line:
+            parts = target_po_line.split('/')
+            if len(parts) == 2:
+                position = source_index['by_po'].get(parts[0].strip())
+                if position is not None:
+                    candidates.append(position)
+        
+        if not candidates:
+            return None
+        return source_index['records'][min(candidates)]
     
     def _parse_po_line(self, po_line_str):
         """
@@ -243,12 +291,12 @@ class ExcelSyncProcessor:
         except:
             return None
     
-    def _find_matching_record_by_po_line(self, source_data, po, line, material):
+    def _find_matching_record_by_po_line(self, source_index, po, line, material):
         """
         根据 PO、Line 和 Material 在源数据中查找匹配的记录
         
         Args:
-            source_data: 源表数据列表
+            source_index: _build_source_index() 建立的索引
             po: 采购单号
             line: 行号
             material: 物料代码
@@ -256,23 +304,10 @@ class ExcelSyncProcessor:
         Returns:
             dict: 匹配的记录或 None
         """
-        for record in source_data:
-            # 尝试从 PN/Line 或 PO/Line 列提取信息
-            source_po_line = record.get('PN/Line') or record.get('PO/Line')
-            if source_po_line:
-                source_po_line = str(source_po_line).strip()
-                # 解析 PO 和 Line
-                parts = source_po_line.split('/')
-                if len(parts) == 2:
-                    source_po = parts[0].strip()
-                    source_line = parts[1].strip()
-                    source_pn = record.get('PN') or record.get('PN ')
-                    
-                    # 匹配 PO、Line 和 Material
-                    if source_po == po and source_line == line and str(source_pn).strip() == str(material).strip():
-                        return record
-        
-        return None
+        position = source_index['by_key'].get((po, line, str(material).strip()))
+        if position is None:
+            return None
+        return source_index['records'][position]
     
     def _get_eta_date(self, record):
         """从记录中获取 ETA 日期并加 7 天
@@ -282,44 +317,44 @@ class ExcelSyncProcessor:
         """
         # 优先使用 ETA WFSZ 字段
         eta_wfsz = record.get('ETA WFSZ')
-        print(f"[Excel Sync] _get_eta_date: 查找 ETA WFSZ, 值={eta_wfsz}")
+        logger.debug("_get_eta_date: 查找 ETA WFSZ, 值=%s", eta_wfsz)
         if eta_wfsz:
             if isinstance(eta_wfsz, datetime):
                 result = eta_wfsz + timedelta(days=7)
-                print(f"[Excel Sync] _get_eta_date: ETA WFSZ 是 datetime 对象, 返回 {result}")
+                logger.debug("_get_eta_date: ETA WFSZ 是 datetime 对象, 返回 %s", result)
                 return result
             try:
                 eta_date = datetime.strptime(str(eta_wfsz), '%Y-%m-%d')
                 result = eta_date + timedelta(days=7)
-                print(f"[Excel Sync] _get_eta_date: ETA WFSZ 解析成功, 返回 {result}")
+                logger.debug("_get_eta_date: ETA WFSZ 解析成功, 返回 %s", result)
                 return result
             except Exception as e:
-                print(f"[Excel Sync] _get_eta_date: ETA WFSZ 解析失败: {e}")
+                logger.debug("_get_eta_date: ETA WFSZ 解析失败: %s", e)
         
         # 尝试从 Record No 中提取 ETA
         record_no = record.get('Record No')
-        print(f"[Excel Sync] _get_eta_date: 查找 Record No, 值={record_no}")
+        logger.debug("_get_eta_date: 查找 Record No, 值=%s", record_no)
         if record_no:
             eta_pattern = r'ETA\s+[^:]+:\s*(\d{1,2}/\d{1,2}/\d{2,4})'
             match = re.search(eta_pattern, str(record_no))
             if match:
                 date_str = match.group(1)
-                print(f"[Excel Sync] _get_eta_date: 从 Record No 提取到 ETA 日期 {date_str}")
+                logger.debug("_get_eta_date: 从 Record No 提取到 ETA 日期 %s", date_str)
                 try:
                     eta_date = datetime.strptime(date_str, '%m/%d/%y')
                     result = eta_date + timedelta(days=7)
-                    print(f"[Excel Sync] _get_eta_date: 日期解析成功 (%m/%d/%y), 返回 {result}")
+                    logger.debug("_get_eta_date: 日期解析成功 (%%m/%%d/%%y), 返回 %s", result)
                     return result
                 except ValueError:
                     try:
                         eta_date = datetime.strptime(date_str, '%m/%d/%Y')
                         result = eta_date + timedelta(days=7)
-                        print(f"[Excel Sync] _get_eta_date: 日期解析成功 (%m/%d/%Y), 返回 {result}")
+                        logger.debug("_get_eta_date: 日期解析成功 (%%m/%%d/%%Y), 返回 %s", result)
                         return result
                     except Exception as e:
-                        print(f"[Excel Sync] _get_eta_date: 日期解析失败: {e}")
+                        logger.debug("_get_eta_date: 日期解析失败: %s", e)
         
-        print(f"[Excel Sync] _get_eta_date: 无法从该记录提取 ETA 日期")
+        logger.debug("_get_eta_date: 无法从该记录提取 ETA 日期")
         return None
 
 
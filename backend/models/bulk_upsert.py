@@ -0,0 +1,151 @@
+"""
+批量插入/覆盖（upsert）
+按列组合将多行数据分组，每组使用一条 execute_values 多行 INSERT 发送，
+open 表冲突时只覆盖 PDF 可提取的列，保留其他列（如手工填写的 comment）的原值。
+"""
+
+from functools import lru_cache
+
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 定义 PDF 可提取的列（只有这些列会在冲突时被覆盖）
+# WF OPEN 表: PO PN LINE PO/LINE description qty net_price total_price req_date_wf placed_date purchaser
+# Non-wf OPEN 表: PO PN LINE PO/LINE description qty net_price total_price req_date placed_date
+PDF_EXTRACTABLE_COLUMNS = {
+    'wf_open': {'po', 'pn', 'line', 'po_line', 'description', 'qty', 'net_price', 'total_price', 'req_date_wf', 'po_placed_date', 'purchaser'},
+    'non_wf_open': {'po', 'pn', 'line', 'po_line', 'description', 'qty', 'net_price', 'total_price', 'req_date', 'po_placed_date'}
+}
+
+# 使用 po_line 作为主键、冲突时覆盖的表
+UPSERT_TABLES = ('wf_open', 'non_wf_open')
+
+# 每条多行 INSERT 最多包含的行数
+BULK_PAGE_SIZE = 1000
+
+
+def clean_row(data, existing_columns):
+    """清理数据中的特殊值，只保留表中存在的列"""
+    cleaned_data = {}
+    for k, v in data.items():
+        if k not in existing_columns:
+            # 跳过不存在的列
+            continue
+        if v == 'None' or v == 'nan' or v == '':
+            cleaned_data[k] = None
+        else:
+            cleaned_data[k] = v
+    return cleaned_data
+
+
+@lru_cache(maxsize=256)
+def build_upsert_query(table_name, columns):
+    """
+    构建 execute_values 使用的 INSERT 语句（VALUES %s），按 (表名, 列组合) 缓存
+
+    Args:
+        table_name: 表名
+        columns: 列名元组
+    """
+    insert_sql = sql.SQL("INSERT INTO purchase_orders.{} ({}) VALUES %s").format(
+        sql.Identifier(table_name),
+        sql.SQL(", ").join(sql.Identifier(col) for col in columns)
+    )
+    if table_name not in UPSERT_TABLES:
+        # 其他表使用默认的插入方式（不做 ON CONFLICT 处理）
+        return insert_sql
+
+    # 构建 ON CONFLICT 更新的 SET 子句，只覆盖 PDF 提取的列，保留其他列的原值
+    pdf_cols = PDF_EXTRACTABLE_COLUMNS.get(table_name, set(columns))
+    update_fields = [
+        sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col))
+        for col in columns
+        if col != 'po_line' and col != 'update_at' and col in pdf_cols
+    ]
+    if not update_fields:
+        update_fields = [sql.SQL("po = EXCLUDED.po")]
+    return insert_sql + sql.SQL(" ON CONFLICT (po_line) DO UPDATE SET ") + sql.SQL(", ").join(update_fields)
+
+
+def _group_rows(table_name, rows):
+    """
+    按 (批次, 列组合) 分组
+
+    同一条 INSERT ... ON CONFLICT 不能两次更新同一行，所以同一个 po_line 第 n 次出现时
+    放入第 n 批，各批按顺序执行，保持逐行执行时“后出现的覆盖先出现的”的结果。
+    """
+    groups = {}
+    occurrences = {}
+    for idx, cleaned_data in rows:
+        generation = 0
+        if table_name in UPSERT_TABLES:
+            key = cleaned_data.get('po_line')
+            generation = occurrences.get(key, 0)
+            occurrences[key] = generation + 1
+        signature = tuple(cleaned_data.keys())
+        groups.setdefault((generation, signature), []).append((idx, cleaned_data))
+    return [groups[key] for key in sorted(groups, key=lambda k: k[0])]
+
+
+def bulk_upsert(cursor, table_name, data_list, existing_columns):
+    """
+    批量插入数据，open 表主键冲突时覆盖 PDF 可提取的列
+
+    每组先整组执行；整组失败时回退到逐行执行（每行一个 SAVEPOINT），以便逐行报告错误。
+    调用方负责提交或回滚事务。
+
+    Args:
+        cursor: 数据库游标
+        table_name: 表名
+        data_list: 数据字典列表
+        existing_columns: 表中存在的列名集合
+
+    Returns:
+        tuple: (success_count, error_list)，error_list 中为 "行N: 错误信息"
+    """
+    success_count = 0
+    error_list = []
+
+    rows = []
+    for idx, data in enumerate(data_list):
+        cleaned_data = clean_row(data, existing_columns)
+        if not cleaned_data:
+            error_list.append((idx, "没有有效数据"))
+            continue
+        rows.append((idx, cleaned_data))
+
+    for group in _group_rows(table_name, rows):
+        columns = tuple(group[0][1].keys())
+        query = build_upsert_query(table_name, columns)
+        values = [tuple(cleaned_data[col] for col in columns) for _, cleaned_data in group]
+
+        cursor.execute("SAVEPOINT bulk_upsert_group")
+        try:
+            execute_values(cursor, query, values, page_size=BULK_PAGE_SIZE)
+            cursor.execute("RELEASE SAVEPOINT bulk_upsert_group")
+            success_count += len(group)
+            continue
+        except Exception as group_error:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_upsert_group")
+            logger.warning("批量插入 %d 条数据失败，改为逐行插入: %s", len(group), group_error)
+
+        for (idx, cleaned_data), row_values in zip(group, values):
+            cursor.execute("SAVEPOINT bulk_upsert_row")
+            try:
+                execute_values(cursor, query, [row_values])
+                cursor.execute("RELEASE SAVEPOINT bulk_upsert_row")
+                success_count += 1
+            except Exception as item_error:
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_upsert_row")
+                error_list.append((idx, str(item_error).strip()))
+                logger.info("插入第%d条数据时出错: %s", idx + 1, item_error)
+                logger.debug("数据内容: %s", cleaned_data)
+
+        cursor.execute("RELEASE SAVEPOINT bulk_upsert_group")
+
+    error_list.sort(key=lambda item: item[0])
+    return success_count, [f"行{idx+1}: {message}" for idx, message in error_list]
@@ -1,20 +1,92 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import sys
 import os
 import json
+import base64
+import re
+import uuid
+from decimal import Decimal, InvalidOperation
 
 # 添加项目根目录到 Python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from backend.utils.config import get_db_config
-import hashlib
+from backend.utils.db_pool import get_connection as get_pooled_connection
+from backend.models.schema_cache import schema_cache
+from backend.models.bulk_upsert import PDF_EXTRACTABLE_COLUMNS
 
 # 导入操作日志记录器
 from backend.operation_logger import operation_logger
 
+# open/closed 表
+OPEN_TABLES = ['wf_open', 'non_wf_open']
+CLOSED_TABLES = ['wf_closed', 'non_wf_closed']
+
+# 导出时服务端游标每次取回的行数
+EXPORT_ITERSIZE = 2000
+
+# 跨表搜索的表和文本列（与 init_db.py 的 TRGM_SEARCH_COLUMNS 一致，这些列有 pg_trgm 索引）
+SEARCH_COLUMNS = {
+    'wf_open': ('po', 'pn', 'po_line', 'description'),
+    'wf_closed': ('po', 'pn', 'po_line', 'description', 'tracking_no'),
+    'non_wf_open': ('po', 'pn', 'po_line', 'description'),
+    'non_wf_closed': ('po', 'pn', 'po_line', 'description', 'tracking_no'),
+}
+SEARCH_RESULT_COLUMNS = ('po', 'pn', 'po_line', 'description', 'tracking_no')
+# 搜索词最短长度（少于 3 个字符时 trigram 索引无法缩小范围）
+SEARCH_MIN_LENGTH = 3
+# 列得分：完全匹配 3、前缀匹配 2、包含 1，模糊匹配时再加上 word_similarity（0~0.999）
+SEARCH_MATCH_TYPES = ((3, 'exact'), (2, 'prefix'), (1, 'contains'), (0, 'fuzzy'))
+
+# 前端编辑时空字符串表示清空的日期列
+DATE_COLUMNS = ('req_date_wf', 'eta_wfsz', 'latest_departure_date', 'po_placed_date')
+TEXT_DATA_TYPES = ('character varying', 'text', 'character')
+# 批量编辑的键列和不允许修改的列（row_version/update_at 由触发器维护）
+BULK_UPDATE_PROTECTED_COLUMNS = ('id', 'po_line', 'row_version', 'update_at', 'created_at')
+# 批量编辑单次请求最多包含的行数
+BULK_UPDATE_MAX_ROWS = 5000
+# 数据类型名只允许字母、空格（用于 VALUES 中的类型转换）
+_DATA_TYPE_PATTERN = re.compile(r'^[a-z ]+$')
+
 # 创建全局数据库管理器实例
 db_manager = None
 
+class RowVersionConflict(Exception):
+    """乐观并发冲突：记录的 row_version 与客户端读取时不同（已被其他用户修改或删除）"""
+
+    def __init__(self, message="数据已被其他用户修改，请刷新页面后重试"):
+        super().__init__(message)
+
+def encode_page_cursor(values):
+    """将上一页最后一行的排序列值编码为不透明的分页游标"""
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(token):
+    """解码分页游标，返回排序列值列表"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(values, list):
+        raise ValueError("无效的分页游标")
+    return values
+
+def escape_like(value):
+    """转义 LIKE/ILIKE 模式中的通配符"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def clean_update_value(column_name, value, data_type=None):
+    """
+    清理前端提交的单元格值：'None'/'nan' 视为空值；日期列（以及已知类型的非文本列）的空字符串视为空值
+    """
+    if value == 'None' or value == 'nan':
+        return None
+    if value == '' and (column_name in DATE_COLUMNS or (data_type and data_type not in TEXT_DATA_TYPES)):
+        return None
+    return value
+
 def get_db_manager():
     """获取数据库管理器实例"""
     global db_manager
@@ -27,19 +99,8 @@ class DatabaseManager:
         self.db_config = get_db_config()
     
     def get_connection(self):
-        """获取数据库连接"""
-        try:
-            connection = psycopg2.connect(**self.db_config)
-            return connection
-        except psycopg2.OperationalError as error:
-            print(f"数据库连接操作错误: {error}")
-            return None
-        except psycopg2.DatabaseError as error:
-            print(f"数据库错误: {error}")
-            return None
-        except Exception as error:
-            print(f"数据库连接失败: {error}")
-            return None
+        """从共享连接池获取数据库连接（close() 即归还连接池）"""
+        return get_pooled_connection()
     
     def query_table(self, table_name, search_column=None, search_value=None, sort_column=None, sort_order='asc'):
         """查询指定表的数据"""
@@ -51,98 +112,13 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             
-            # 首先检查表是否存在
-            check_table_query = """
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'purchase_orders' 
-                AND table_name = %s
-            """
-            cursor.execute(check_table_query, (table_name,))
-            if not cursor.fetchone():
+            # 表结构由 init_db.py 的迁移保证，这里只查询缓存
+            if not schema_cache.table_exists(table_name, cursor):
                 print(f"表 {table_name} 不存在")
                 cursor.close()
                 conn.close()
                 return []
             
-            # 对于wf_open表，添加chinese_name和unit列（如果不存在）
-            if table_name == 'wf_open':
-                # 检查列是否存在，如果不存在则添加
-                check_column_query = """
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'purchase_orders' 
-                    AND table_name = %s 
-                    AND column_name IN ('chinese_name', 'unit')
-                """
-                cursor.execute(check_column_query, (table_name,))
-                existing_columns = [row[0] for row in cursor.fetchall()]
-                
-                # 如果列不存在，则添加它们
-                if 'chinese_name' not in existing_columns:
-                    add_chinese_name_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN chinese_name VARCHAR(100)"
-                    cursor.execute(add_chinese_name_query)
-                
-                if 'unit' not in existing_columns:
-                    add_unit_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN unit VARCHAR(20)"
-                    cursor.execute(add_unit_query)
-            
-            # 注意：update_at 列应在数据库初始化时就已添加
-            # 但为了确保部署到 Portainer 时也能正确初始化，这里添加检查和创建逻辑
-            try:
-                # 检查 update_at 列是否存在
-                check_update_at_query = """
-                    SELECT EXISTS(
-                        SELECT 1 
-                        FROM information_schema.columns 
-                        WHERE table_schema = 'purchase_orders' 
-                        AND table_name = %s 
-                        AND column_name = 'update_at'
-                    )
-                """
-                cursor.execute(check_update_at_query, (table_name,))
-                has_update_at = cursor.fetchone()[0]
-                
-                if not has_update_at:
-                    # 仅在列不存在时添加
-                    add_update_at_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN update_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
-                    try:
-                        cursor.execute(add_update_at_query)
-                        conn.commit()
-                    except Exception as e:
-                        # 列可能已被其他进程创建，继续执行
-                        print(f"添加 update_at 列时：{e}")
-            except Exception as e:
-                print(f"检查 update_at 列时出错：{e}")
-            
-            # 对于 closed 表，添加 id 列和 shipment_batch_no 列（如果不存在）
-            if table_name in ['wf_closed', 'non_wf_closed']:
-                # 检查 id 列是否存在
-                check_id_query = """
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'purchase_orders' 
-                    AND table_name = %s 
-                    AND column_name IN ('id', 'shipment_batch_no')
-                """
-                cursor.execute(check_id_query, (table_name,))
-                existing_columns = [row[0] for row in cursor.fetchall()]
-                
-                # 添加 id 列（如果不存在）
-                if 'id' not in existing_columns:
-                    add_id_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN id SERIAL PRIMARY KEY"
-                    try:
-                        cursor.execute(add_id_query)
-                    except:
-                        # 如果带 PRIMARY KEY 失败，仅添加不带 PK 的 id 列
-                        add_id_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN id SERIAL"
-                        cursor.execute(add_id_query)
-                
-                # 添加 shipment_batch_no 列（如果不存在）
-                if 'shipment_batch_no' not in existing_columns:
-                    add_batch_query = f"ALTER TABLE purchase_orders.{table_name} ADD COLUMN shipment_batch_no VARCHAR(50)"
-                    cursor.execute(add_batch_query)
-            
             # 构建查询语句
             if search_column and search_value:
                 # 构建带搜索条件的查询
@@ -166,31 +142,16 @@ class DatabaseManager:
                     query = sql.SQL("SELECT * FROM purchase_orders.{} ORDER BY id DESC").format(
                         sql.Identifier(table_name)
                     )
+                elif schema_cache.has_column(table_name, 'update_at', cursor):
+                    # 有update_at字段，按update_at下降排序
+                    query = sql.SQL("SELECT * FROM purchase_orders.{} ORDER BY update_at DESC").format(
+                        sql.Identifier(table_name)
+                    )
                 else:
-                    # open表使用po_line排序，或者如果重需按update_at排序也可以
-                    # 先检查update_at是否存在
-                    check_update_at_query = """
-                        SELECT EXISTS(
-                            SELECT 1 
-                            FROM information_schema.columns 
-                            WHERE table_schema = 'purchase_orders' 
-                            AND table_name = %s 
-                            AND column_name = 'update_at'
-                        )
-                    """
-                    cursor.execute(check_update_at_query, (table_name,))
-                    has_update_at = cursor.fetchone()[0]
-                    
-                    if has_update_at:
-                        # 有update_at字段，按update_at下降排序
-                        query = sql.SQL("SELECT * FROM purchase_orders.{} ORDER BY update_at DESC").format(
-                            sql.Identifier(table_name)
-                        )
-                    else:
-                        # 不有update_at字段，按po_line下降排序（备选）
-                        query = sql.SQL("SELECT * FROM purchase_orders.{} ORDER BY po_line DESC").format(
-                            sql.Identifier(table_name)
-                        )
+                    # 不有update_at字段，按po_line下降排序（备选）
+                    query = sql.SQL("SELECT * FROM purchase_orders.{} ORDER BY po_line DESC").format(
+                        sql.Identifier(table_name)
+                    )
                 cursor.execute(query)
             
             records = cursor.fetchall()
@@ -219,6 +180,449 @@ class DatabaseManager:
                     pass
             return []
     
+    def _default_sort(self, table_name):
+        """默认排序：closed表按id下降，open表按update_at下降（po_line作为唯一次序）"""
+        if table_name in CLOSED_TABLES:
+            return [('id', 'desc')]
+        return [('update_at', 'desc'), ('po_line', 'desc')]
+
+    def _unique_sort_key(self, table_name):
+        """keyset 分页所需的唯一列"""
+        return 'id' if table_name in CLOSED_TABLES else 'po_line'
+
+    def get_key_field(self, table_name):
+        """定位单行记录的键列：表的单列主键（来自表结构缓存），没有主键时同 _unique_sort_key"""
+        return schema_cache.get_primary_key(table_name) or self._unique_sort_key(table_name)
+
+    def _row_exists(self, cursor, table_name, key_field, key):
+        """记录是否存在（条件更新/删除未命中时区分版本冲突和记录不存在）"""
+        cursor.execute(
+            sql.SQL("SELECT 1 FROM purchase_orders.{} WHERE {} = %s LIMIT 1").format(
+                sql.Identifier(table_name), sql.Identifier(key_field)
+            ),
+            (key,)
+        )
+        return cursor.fetchone() is not None
+
+    def _resolve_key(self, table_name, key, key_field=None):
+        """
+        校验键列并按列类型转换键值（只读表结构缓存，不查询数据）
+
+        Returns:
+            tuple: (key_field, key)
+
+        Raises:
+            ValueError: key_field 不是表中的列，或 key 无法转换为该列的类型
+        """
+        key_field = key_field or self.get_key_field(table_name)
+        columns = schema_cache.get_columns(table_name)
+        if key_field not in columns:
+            raise ValueError(f"表 {table_name} 中不存在键列: {key_field}")
+        if key is None or key == '':
+            raise ValueError("缺少主键值")
+        if columns[key_field] in ('integer', 'bigint', 'smallint'):
+            try:
+                key = int(key)
+            except (ValueError, TypeError):
+                raise ValueError(f"无效的 {key_field}: {key}")
+        return key_field, key
+
+    def _build_filter_clause(self, filters):
+        """将列过滤条件（AND 组合，ILIKE 包含匹配）构建为 WHERE 片段"""
+        conditions = []
+        params = []
+        for column_name, value in (filters or {}).items():
+            if value is None or value == '':
+                continue
+            conditions.append(sql.SQL("{}::text ILIKE %s").format(sql.Identifier(column_name)))
+            params.append(f"%{value}%")
+        return conditions, params
+
+    def _build_keyset_clause(self, sort, cursor_values):
+        """
+        根据上一页最后一行的排序列值构建 keyset 条件（排序统一为 NULLS LAST）
+
+        对排序列 k1..kn 生成:
+            (k1 在 v1 之后) OR (k1 = v1 AND k2 在 v2 之后) OR ...
+        """
+        disjuncts = []
+        params = []
+        for i, (column_name, direction) in enumerate(sort):
+            value = cursor_values[i]
+            if value is None:
+                # NULLS LAST：NULL 之后不再有该列的其他值
+                continue
+            parts = []
+            part_params = []
+            for j, (prev_column, _) in enumerate(sort[:i]):
+                prev_value = cursor_values[j]
+                if prev_value is None:
+                    parts.append(sql.SQL("{} IS NULL").format(sql.Identifier(prev_column)))
+                else:
+                    parts.append(sql.SQL("{} = %s").format(sql.Identifier(prev_column)))
+                    part_params.append(prev_value)
+            operator = '>' if direction == 'asc' else '<'
+            parts.append(sql.SQL("({col} " + operator + " %s OR {col} IS NULL)").format(
+                col=sql.Identifier(column_name)
+            ))
+            part_params.append(value)
+            disjuncts.append(sql.SQL("(") + sql.SQL(" AND ").join(parts) + sql.SQL(")"))
+            params.extend(part_params)
+        if not disjuncts:
+            return sql.SQL("FALSE"), []
+        return sql.SQL("(") + sql.SQL(" OR ").join(disjuncts) + sql.SQL(")"), params
+
+    def _estimate_count(self, cursor, table_name, where_sql, where_params, exact=False, min_count=0):
+        """
+        估算符合条件的总行数
+
+        Args:
+            min_count: 已知的最少行数（如当前页的行数），估算值不会小于它
+
+        Returns:
+            tuple: (count, is_estimate)
+        """
+        count_query = sql.SQL("SELECT COUNT(*) FROM purchase_orders.{}").format(sql.Identifier(table_name)) + where_sql
+        if exact:
+            cursor.execute(count_query, where_params)
+            return cursor.fetchone()[0], False
+
+        estimate = None
+        if not where_params:
+            # 无过滤条件：直接读取统计信息。reltuples <= 0 视为未知：
+            # PostgreSQL 14 之前从未 ANALYZE 的表为 0，14 起为 -1
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                (f"purchase_orders.{table_name}",)
+            )
+            row = cursor.fetchone()
+            if row and row[0] is not None and row[0] > 0:
+                estimate = int(row[0])
+
+        if estimate is None:
+            # 有过滤条件或统计信息未知：使用查询计划的行数估算（没有统计信息时规划器按表的页数估算）
+            explain_query = sql.SQL("EXPLAIN (FORMAT JSON) SELECT 1 FROM purchase_orders.{}").format(
+                sql.Identifier(table_name)
+            ) + where_sql
+            cursor.execute(explain_query, where_params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plan_rows = int(plan[0]['Plan']['Plan Rows'])
+            if plan_rows > 0:
+                estimate = plan_rows
+
+        if estimate is None:
+            # 估算不可用时退回精确计数
+            cursor.execute(count_query, where_params)
+            return cursor.fetchone()[0], False
+
+        # 统计信息过期（如批量导入后尚未 autovacuum）时估算值可能小于已返回的行数
+        return max(estimate, min_count), True
+
+    def query_table_page(self, table_name, filters=None, sort=None, limit=200, cursor_token=None, exact_count=False):
+        """
+        分页查询表数据（keyset 分页 + 列过滤 + 多列排序）
+
+        Args:
+            table_name: 表名
+            filters: 列过滤条件 {column_name: value}，多个条件 AND 组合
+            sort: 排序 [(column_name, 'asc'|'desc')]，为空时使用默认排序
+            limit: 每页行数
+            cursor_token: 上一页返回的 next_cursor
+            exact_count: 是否精确计算总行数（默认使用估算值）
+
+        Returns:
+            dict: {'rows', 'next_cursor', 'has_more', 'total', 'total_is_estimate'}
+
+        Raises:
+            ValueError: 参数无效
+        """
+        sort = list(sort) if sort else self._default_sort(table_name)
+        for column_name, direction in sort:
+            if direction not in ('asc', 'desc'):
+                raise ValueError(f"无效的排序方向: {direction}")
+        unique_key = self._unique_sort_key(table_name)
+        if unique_key not in [column_name for column_name, _ in sort]:
+            sort.append((unique_key, sort[-1][1]))
+
+        cursor_values = None
+        if cursor_token:
+            cursor_values = decode_page_cursor(cursor_token)
+            if len(cursor_values) != len(sort):
+                raise ValueError("分页游标与排序条件不匹配")
+
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("数据库连接失败")
+
+        try:
+            cursor = conn.cursor()
+
+            table_columns = schema_cache.get_column_names(table_name, cursor)
+            if not table_columns:
+                raise ValueError(f"表 {table_name} 不存在")
+            for column_name in [column_name for column_name, _ in sort] + list((filters or {}).keys()):
+                if column_name not in table_columns:
+                    raise ValueError(f"列 {column_name} 不存在")
+
+            conditions, params = self._build_filter_clause(filters)
+            where_sql = sql.SQL("")
+            if conditions:
+                where_sql = sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+            filter_params = list(params)
+
+            page_conditions = list(conditions)
+            page_params = list(params)
+            if cursor_values is not None:
+                keyset_sql, keyset_params = self._build_keyset_clause(sort, cursor_values)
+                page_conditions.append(keyset_sql)
+                page_params.extend(keyset_params)
+
+            page_where_sql = sql.SQL("")
+            if page_conditions:
+                page_where_sql = sql.SQL(" WHERE ") + sql.SQL(" AND ").join(page_conditions)
+
+            order_sql = sql.SQL(", ").join(
+                sql.SQL("{} {} NULLS LAST").format(sql.Identifier(column_name), sql.SQL(direction.upper()))
+                for column_name, direction in sort
+            )
+            query = (
+                sql.SQL("SELECT * FROM purchase_orders.{}").format(sql.Identifier(table_name))
+                + page_where_sql
+                + sql.SQL(" ORDER BY ") + order_sql
+                + sql.SQL(" LIMIT %s")
+            )
+            cursor.execute(query, page_params + [limit + 1])
+            records = cursor.fetchall()
+            colnames = [desc[0] for desc in cursor.description]
+
+            has_more = len(records) > limit
+            records = records[:limit]
+            rows = [dict(zip(colnames, record)) for record in records]
+
+            next_cursor = None
+            if has_more and rows:
+                last_row = rows[-1]
+                next_cursor = encode_page_cursor([last_row.get(column_name) for column_name, _ in sort])
+
+            if not cursor_token and not has_more:
+                # 首页即最后一页，行数就是精确总数
+                total, total_is_estimate = len(rows), False
+            else:
+                # 已返回的行数（还有下一页时至少再多一行）是总数的下限
+                total, total_is_estimate = self._estimate_count(
+                    cursor, table_name, where_sql, filter_params, exact_count,
+                    min_count=len(rows) + (1 if has_more else 0)
+                )
+
+            cursor.close()
+            conn.close()
+
+            return {
+                'rows': rows,
+                'next_cursor': next_cursor,
+                'has_more': has_more,
+                'total': total,
+                'total_is_estimate': total_is_estimate,
+                'sort': [f"{column_name}:{direction}" for column_name, direction in sort]
+            }
+        except Exception:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            raise
+
+    def open_table_export(self, table_name, filters=None, sort=None, itersize=EXPORT_ITERSIZE):
+        """
+        使用服务端命名游标流式读取整表（或过滤后的）数据，用于导出
+
+        参数在调用时校验；返回的生成器在迭代时才占用数据库连接，每次从服务器取回 itersize 行，
+        迭代结束或被关闭时归还连接，内存占用与表大小无关。
+
+        Args:
+            table_name: 表名
+            filters: 列过滤条件 {column_name: value}（与 query_table_page 相同）
+            sort: 排序 [(column_name, 'asc'|'desc')]，为空时使用默认排序
+            itersize: 每次取回的行数
+
+        Returns:
+            tuple: (columns, rows)，rows 为逐行产出元组的生成器
+
+        Raises:
+            ValueError: 表或列不存在、排序方向无效
+        """
+        columns = list(schema_cache.get_columns(table_name))
+        if not columns:
+            raise ValueError(f"表 {table_name} 不存在")
+        sort = list(sort) if sort else self._default_sort(table_name)
+        for column_name, direction in sort:
+            if direction not in ('asc', 'desc'):
+                raise ValueError(f"无效的排序方向: {direction}")
+        for column_name in [column_name for column_name, _ in sort] + list((filters or {}).keys()):
+            if column_name not in columns:
+                raise ValueError(f"列 {column_name} 不存在")
+
+        conditions, params = self._build_filter_clause(filters)
+        query = sql.SQL("SELECT {} FROM purchase_orders.{}").format(
+            sql.SQL(", ").join(sql.Identifier(column_name) for column_name in columns),
+            sql.Identifier(table_name)
+        )
+        if conditions:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+        query += sql.SQL(" ORDER BY ") + sql.SQL(", ").join(
+            sql.SQL("{} {} NULLS LAST").format(sql.Identifier(column_name), sql.SQL(direction.upper()))
+            for column_name, direction in sort
+        )
+
+        def generate():
+            conn = self.get_connection()
+            if not conn:
+                raise Exception("数据库连接失败")
+            cursor = None
+            try:
+                cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield row
+            finally:
+                try:
+                    if cursor is not None:
+                        cursor.close()
+                    conn.rollback()
+                except Exception:
+                    pass
+                conn.close()
+
+        return columns, generate()
+
+    def _build_search_branch(self, table_name, fuzzy):
+        """单个表的搜索子查询：返回匹配行及每个搜索列的得分"""
+        columns = SEARCH_COLUMNS[table_name]
+        conditions = []
+        column_scores = []
+        for column_name in columns:
+            column = sql.Identifier(column_name)
+            score = sql.SQL(
+                "CASE WHEN {0} ILIKE %(exact)s THEN 3 WHEN {0} ILIKE %(prefix)s THEN 2 "
+                "WHEN {0} ILIKE %(contains)s THEN 1 ELSE 0 END"
+            ).format(column)
+            condition = sql.SQL("{} ILIKE %(contains)s").format(column)
+            if fuzzy:
+                # 相似度不超过 0.999，得分的整数部分始终是匹配类型
+                score = score + sql.SQL(" + LEAST(COALESCE(word_similarity(%(term)s, {}), 0), 0.999)").format(column)
+                condition = condition + sql.SQL(" OR %(term)s <%% {}").format(column)
+            column_scores.append(score)
+            conditions.append(condition)
+
+        selected = [
+            sql.Identifier(column_name) if column_name in columns
+            else sql.SQL("NULL::text AS {}").format(sql.Identifier(column_name))
+            for column_name in SEARCH_RESULT_COLUMNS
+        ]
+        return sql.SQL("""
+            (SELECT {table} AS table_name, s.*, (SELECT max(v) FROM unnest(s.column_scores) AS v) AS score
+             FROM (SELECT {key}::text AS key, {selected}, ARRAY[{scores}]::real[] AS column_scores
+                   FROM purchase_orders.{table_id}
+                   WHERE {conditions}) s
+             ORDER BY score DESC
+             LIMIT %(limit)s)
+        """).format(
+            table=sql.Literal(table_name),
+            key=sql.Identifier(self._unique_sort_key(table_name)),
+            selected=sql.SQL(", ").join(selected),
+            scores=sql.SQL(", ").join(column_scores),
+            table_id=sql.Identifier(table_name),
+            conditions=sql.SQL(" OR ").join(conditions)
+        )
+
+    def search_tables(self, term, tables=None, limit=20, similarity_threshold=0.4):
+        """
+        在 open/closed 四个表中搜索 PO、PN、PO/Line、描述和 tracking_no
+
+        安装了 pg_trgm 时同时返回包含匹配和模糊匹配（word_similarity 不低于阈值），
+        否则只返回包含匹配（ILIKE）。结果按得分降序：完全匹配 > 前缀匹配 > 包含匹配 > 模糊匹配。
+
+        Args:
+            term: 搜索词
+            tables: 要搜索的表，为空时搜索全部四个表
+            limit: 最多返回的结果数
+            similarity_threshold: 模糊匹配阈值（0~1）
+
+        Returns:
+            dict: {'results': [{'table', 'key', 'score', 'matched_column', 'match_type', 'record'}], 'mode': 'fuzzy'|'contains'}
+
+        Raises:
+            ValueError: 参数无效
+        """
+        term = (term or '').strip()
+        if len(term) < SEARCH_MIN_LENGTH:
+            raise ValueError(f"搜索词至少需要 {SEARCH_MIN_LENGTH} 个字符")
+        tables = list(tables) if tables else list(SEARCH_COLUMNS)
+        for table_name in tables:
+            if table_name not in SEARCH_COLUMNS:
+                raise ValueError(f"不支持搜索的表: {table_name}")
+
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("数据库连接失败")
+
+        try:
+            cursor = conn.cursor()
+            fuzzy = schema_cache.has_extension('pg_trgm', cursor)
+            if fuzzy:
+                # 只在当前事务内生效，连接归还连接池时回滚
+                cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                               (str(similarity_threshold),))
+
+            query = (
+                sql.SQL("SELECT * FROM (")
+                + sql.SQL(" UNION ALL ").join(self._build_search_branch(t, fuzzy) for t in tables)
+                + sql.SQL(") hits ORDER BY score DESC, table_name, key LIMIT %(limit)s")
+            )
+            escaped = escape_like(term)
+            cursor.execute(query, {
+                'term': term,
+                'exact': escaped,
+                'prefix': f"{escaped}%",
+                'contains': f"%{escaped}%",
+                'limit': limit
+            })
+            colnames = [desc[0] for desc in cursor.description]
+            hits = [dict(zip(colnames, record)) for record in cursor.fetchall()]
+
+            cursor.close()
+            conn.close()
+        except Exception:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            raise
+
+        results = []
+        for hit in hits:
+            table_name = hit['table_name']
+            columns = SEARCH_COLUMNS[table_name]
+            best = max(range(len(columns)), key=lambda i: hit['column_scores'][i])
+            score = float(hit['score'])
+            key = hit['key']
+            if table_name in CLOSED_TABLES:
+                key = int(key)
+            results.append({
+                'table': table_name,
+                'key': key,
+                'score': round(score, 3),
+                'matched_column': columns[best],
+                'match_type': next(name for floor, name in SEARCH_MATCH_TYPES if score >= floor),
+                'record': {column_name: hit[column_name] for column_name in columns}
+            })
+        return {'results': results, 'mode': 'fuzzy' if fuzzy else 'contains'}
+
     def get_all_tables(self):
         """获取所有表名"""
         conn = self.get_connection()
@@ -228,14 +632,7 @@ class DatabaseManager:
         
         try:
             cursor = conn.cursor()
-            query = """
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'purchase_orders'
-                ORDER BY table_name
-            """
-            cursor.execute(query)
-            tables = [row[0] for row in cursor.fetchall()]
+            tables = schema_cache.get_tables(cursor)
             cursor.close()
             conn.close()
             return tables
@@ -249,68 +646,35 @@ class DatabaseManager:
                     pass
             return []
     
-    def generate_row_hash(self, row_data):
-        """为行数据生成哈希值用于版本控制"""
-        # 将行数据转换为字符串并生成哈希
-        row_str = str(sorted(row_data.items()))
-        return hashlib.md5(row_str.encode()).hexdigest()
-    
-    def update_row(self, table_name, pn, updates, user_email=None):
+    def update_row(self, table_name, key, updates, user_email=None, expected_version=None, key_field=None):
         """
-        更新表中的数据
+        更新表中的数据（一条 UPDATE ... RETURNING *，不再先查询确定主键）
         
         Args:
             table_name: 表名
-            pn: 主键值
+            key: 主键值
             updates: 要更新的字段字典 {column_name: new_value}
             user_email: 用户邮箱（用于记录操作日志）
+            expected_version: 客户端读取时的 row_version，传入时只在版本未变时更新
+            key_field: 定位记录的列名，默认使用表的主键（open表为po_line，closed表为id）
             
         Returns:
-            tuple: (success, message)
+            tuple: (success, message, row_version)，row_version 为更新后的版本（表没有该列时为 None）
+            
+        Raises:
+            RowVersionConflict: 记录已被其他用户修改（记录不存在时返回未找到）
+            ValueError: key_field 不是表中的列，或 key 无法转换为该列的类型
         """
+        key_field, key = self._resolve_key(table_name, key, key_field)
+        column_types = schema_cache.get_columns(table_name)
+        
         conn = self.get_connection()
         if not conn:
-            return False, "数据库连接失败"
+            return False, "数据库连接失败", None
         
         try:
             cursor = conn.cursor()
             
-            # 确定主键字段
-            primary_key_field = 'id'  # 默认使用新的自增主键
-            primary_key_value = pn
-            
-            # 对于wf_open和non_wf_open表，主键是po_line
-            if table_name in ['wf_open', 'non_wf_open']:
-                # 先尝试用po_line查询（前端现在传来的key就是po_line）
-                find_po_line_query = f"SELECT po_line FROM purchase_orders.{table_name} WHERE po_line = %s LIMIT 1"
-                cursor.execute(find_po_line_query, (pn,))
-                result = cursor.fetchone()
-                if result:
-                    # 找到了，说明pn就是po_line
-                    primary_key_field = 'po_line'
-                    primary_key_value = pn
-                else:
-                    # 没找到，尝试用pn查找po_line
-                    find_po_line_query = f"SELECT po_line FROM purchase_orders.{table_name} WHERE pn = %s LIMIT 1"
-                    cursor.execute(find_po_line_query, (pn,))
-                    result = cursor.fetchone()
-                    if result:
-                        primary_key_field = 'po_line'
-                        primary_key_value = result[0]  # 使用找到的po_line作为主键
-                    else:
-                        # 如果找不到对应的po_line，则直接使用pn进行查找
-                        primary_key_field = 'pn'
-            elif table_name in ['wf_closed', 'non_wf_closed']:
-                # 对于closed表：如果传进来的是整数，可能是id
-                try:
-                    id_value = int(pn)
-                    primary_key_field = 'id'
-                    primary_key_value = id_value
-                except (ValueError, TypeError):
-                    # 不是整数，使用pn作为主键
-                    primary_key_field = 'pn'
-                    primary_key_value = pn
-            
             # 构建更新查询
             set_clauses = []
             values = []
@@ -320,56 +684,49 @@ class DatabaseManager:
             
             for column_name, new_value in updates.items():
                 set_clauses.append(sql.SQL("{} = %s").format(sql.Identifier(column_name)))
-                # 处理日期字段的特殊格式
-                if column_name in ['req_date_wf', 'eta_wfsz', 'latest_departure_date', 'po_placed_date']:
-                    if new_value is None or new_value == '' or new_value == 'None' or new_value == 'nan':
-                        values.append(None)
-                    else:
-                        values.append(new_value)
-                else:
-                    # 处理其他字段的空值
-                    if new_value == 'None' or new_value == 'nan':
-                        values.append(None)
-                    else:
-                        values.append(new_value)
+                values.append(clean_update_value(column_name, new_value, column_types.get(column_name)))
             
             # 添加主键值
-            values.append(primary_key_value)
+            values.append(key)
+            where_clause = sql.SQL("{} = %s").format(sql.Identifier(key_field))
+            
+            # row_version 由触发器在 UPDATE 时加 1；传入 expected_version 时版本不一致则不更新
+            versioned = schema_cache.has_column(table_name, 'row_version', cursor)
+            if versioned and expected_version is not None:
+                where_clause += sql.SQL(" AND row_version = %s")
+                values.append(expected_version)
             
-            update_query = sql.SQL("UPDATE purchase_orders.{} SET {} WHERE {} = %s").format(
+            # RETURNING * 返回更新后的记录，用于操作日志和新的 row_version
+            update_query = sql.SQL("UPDATE purchase_orders.{} SET {} WHERE {} RETURNING *").format(
                 sql.Identifier(table_name),
                 sql.SQL(", ").join(set_clauses),
-                sql.Identifier(primary_key_field)
+                where_clause
             )
             
             cursor.execute(update_query, values)
-            affected_rows = cursor.rowcount
+            updated_rows = cursor.fetchall()
+            affected_rows = len(updated_rows)
+            # 没有更新任何行时只查询一次记录是否存在：存在说明版本已变化，否则是记录不存在
+            if (affected_rows == 0 and versioned and expected_version is not None
+                    and self._row_exists(cursor, table_name, key_field, key)):
+                raise RowVersionConflict()
             conn.commit()
             
+            updated_record = None
+            if updated_rows:
+                colnames = [desc[0] for desc in cursor.description]
+                updated_record = dict(zip(colnames, updated_rows[0]))
+            row_version = updated_record.get('row_version') if updated_record else None
+            
             # 记录操作日志
-            if user_email and affected_rows > 0:
-                # 获取更新前的记录数据用于日志记录
+            if user_email and updated_record:
                 try:
-                    select_query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE {} = %s").format(
-                        sql.Identifier(table_name),
-                        sql.Identifier(primary_key_field)
+                    operation_logger.log_operation(
+                        user_email=user_email,
+                        table_name=table_name,
+                        operation='update',
+                        record_data=updated_record
                     )
-                    cursor.execute(select_query, (primary_key_value,))
-                    updated_record = cursor.fetchone()
-                    
-                    # 获取列名
-                    colnames = [desc[0] for desc in cursor.description]
-                    
-                    # 转换为字典
-                    if updated_record:
-                        record_data = dict(zip(colnames, updated_record))
-                        # 记录操作日志
-                        operation_logger.log_operation(
-                            user_email=user_email,
-                            table_name=table_name,
-                            operation='update',
-                            record_data=record_data
-                        )
                 except Exception as log_error:
                     print(f"记录更新操作日志时出错: {log_error}")
             
@@ -377,9 +734,17 @@ class DatabaseManager:
             conn.close()
             
             if affected_rows > 0:
-                return True, f"更新成功，影响了 {affected_rows} 行"
+                return True, f"更新成功，影响了 {affected_rows} 行", row_version
             else:
-                return False, "未找到要更新的记录或数据未发生变化"
+                return False, "未找到要更新的记录或数据未发生变化", None
+        except RowVersionConflict:
+            try:
+                conn.rollback()
+                cursor.close()
+                conn.close()
+            except:
+                pass
+            raise
         except Exception as error:
             if conn:
                 try:
@@ -388,9 +753,165 @@ class DatabaseManager:
                     conn.close()
                 except:
                     pass
-            return False, f"更新数据时出错: {error}"
+            return False, f"更新数据时出错: {error}", None
+    
+    def bulk_update_rows(self, table_name, rows, user_email=None, atomic=False):
+        """
+        批量修改多行（表格中批量编辑/粘贴）
+        
+        按修改的列组合分组，每组一条 UPDATE ... FROM (VALUES ...)，全部在一个事务中执行；
+        传入 row_version 的行只在版本未变时修改。操作日志用一条多行 INSERT 在同一事务中写入。
+        
+        Args:
+            table_name: 表名（open 表按 po_line 定位，closed 表按 id 定位）
+            rows: [{'key': 主键值, 'changes': {column_name: new_value}, 'row_version': 读取时的版本号(可选)}]
+            user_email: 用户邮箱（用于记录操作日志）
+            atomic: 为 True 时任一行失败（冲突或不存在）则整批回滚
+            
+        Returns:
+            dict: {'results': [{'key', 'success', 'row_version', 'error', 'conflict'}], 'updated', 'failed', 'committed'}
+            
+        Raises:
+            ValueError: 参数无效（不支持的表、未知的列、重复的键等）
+        """
+        if table_name not in OPEN_TABLES and table_name not in CLOSED_TABLES:
+            raise ValueError(f"不支持批量修改的表: {table_name}")
+        if not isinstance(rows, list) or not rows:
+            raise ValueError("没有提供修改数据")
+        if len(rows) > BULK_UPDATE_MAX_ROWS:
+            raise ValueError(f"单次最多修改 {BULK_UPDATE_MAX_ROWS} 行")
+        
+        key_field = self._unique_sort_key(table_name)
+        column_types = schema_cache.get_columns(table_name)
+        
+        # 校验并按列组合分组
+        keys = []
+        groups = {}
+        for row in rows:
+            if not isinstance(row, dict) or not isinstance(row.get('changes'), dict) or not row['changes']:
+                raise ValueError("每行需要 key 和非空的 changes")
+            key = row.get('key')
+            if key_field == 'id':
+                try:
+                    key = int(key)
+                except (TypeError, ValueError):
+                    raise ValueError(f"无效的 id: {row.get('key')}")
+            elif not key:
+                raise ValueError("每行需要 key 和非空的 changes")
+            else:
+                key = str(key)
+            if key in keys:
+                raise ValueError(f"重复的键: {key}")
+            keys.append(key)
+            
+            expected_version = row.get('row_version')
+            if expected_version is not None:
+                try:
+                    expected_version = int(expected_version)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{key}: 无效的 row_version")
+            
+            for column_name in row['changes']:
+                if column_name not in column_types:
+                    raise ValueError(f"列 {column_name} 不存在")
+                if column_name in BULK_UPDATE_PROTECTED_COLUMNS:
+                    raise ValueError(f"列 {column_name} 不能批量修改")
+                if not _DATA_TYPE_PATTERN.match(column_types[column_name]):
+                    raise ValueError(f"列 {column_name} 的类型不支持批量修改: {column_types[column_name]}")
+            columns = tuple(sorted(row['changes']))
+            values = [
+                clean_update_value(column_name, row['changes'][column_name], column_types[column_name])
+                for column_name in columns
+            ]
+            groups.setdefault(columns, []).append([key, expected_version] + values)
+        
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("数据库连接失败")
+        
+        try:
+            cursor = conn.cursor()
+            updated = {}
+            colnames = None
+            for columns, group_rows in groups.items():
+                # VALUES 中显式转换类型，同一列中字符串、数字和 NULL 混合时也能匹配
+                template = "(" + ", ".join(
+                    [f"%s::{column_types[key_field]}", "%s::integer"]
+                    + [f"%s::{column_types[column_name]}" for column_name in columns]
+                ) + ")"
+                update_query = sql.SQL(
+                    "UPDATE purchase_orders.{table} AS t SET {sets}, update_at = CURRENT_TIMESTAMP "
+                    "FROM (VALUES %s) AS v({key}, expected_version, {columns}) "
+                    "WHERE t.{key} = v.{key} AND (v.expected_version IS NULL OR t.row_version = v.expected_version) "
+                    "RETURNING t.*"
+                ).format(
+                    table=sql.Identifier(table_name),
+                    sets=sql.SQL(", ").join(
+                        sql.SQL("{0} = v.{0}").format(sql.Identifier(column_name)) for column_name in columns
+                    ),
+                    key=sql.Identifier(key_field),
+                    columns=sql.SQL(", ").join(sql.Identifier(column_name) for column_name in columns)
+                )
+                returned = execute_values(cursor, update_query, group_rows, template=template,
+                                          page_size=len(group_rows), fetch=True)
+                colnames = [desc[0] for desc in cursor.description]
+                for record in returned:
+                    record_data = dict(zip(colnames, record))
+                    updated[record_data[key_field]] = record_data
+            
+            # 未修改的行：区分版本冲突和记录不存在（只在有失败时查询）
+            missed = [key for key in keys if key not in updated]
+            existing = set()
+            if missed:
+                exists_query = sql.SQL("SELECT {0} FROM purchase_orders.{1} WHERE {0} = ANY(%s)").format(
+                    sql.Identifier(key_field), sql.Identifier(table_name)
+                )
+                cursor.execute(exists_query, (missed,))
+                existing = set(row[0] for row in cursor.fetchall())
+            
+            committed = not (atomic and missed)
+            if committed:
+                if user_email and updated:
+                    operation_logger.log_operations(
+                        user_email,
+                        [(table_name, 'update', record_data) for record_data in updated.values()],
+                        cursor
+                    )
+                conn.commit()
+            else:
+                conn.rollback()
+            
+            cursor.close()
+            conn.close()
+        except Exception:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            raise
+        
+        results = []
+        for key in keys:
+            if key in updated and committed:
+                results.append({'key': key, 'success': True, 'row_version': updated[key].get('row_version')})
+            elif key in updated:
+                results.append({'key': key, 'success': False, 'error': '同一批次中其他行修改失败，已回滚'})
+            elif key in existing:
+                results.append({'key': key, 'success': False, 'conflict': True,
+                                'error': '数据已被其他用户修改，请刷新页面后重试'})
+            else:
+                results.append({'key': key, 'success': False, 'error': '未找到要更新的记录'})
+        
+        updated_count = len(updated) if committed else 0
+        return {
+            'results': results,
+            'updated': updated_count,
+            'failed': len(keys) - updated_count,
+            'committed': committed
+        }
     
-    def delete_row(self, table_name, key, user_email=None, key_field='pn'):
+    def delete_row(self, table_name, key, user_email=None, key_field='pn', expected_version=None):
         """
         删除表中的数据
         
@@ -399,9 +920,13 @@ class DatabaseManager:
             key: 主键值
             user_email: 用户邮箱（用于记录操作日志）
             key_field: 主键字段名，默认为 'pn'
+            expected_version: 客户端读取时的 row_version，传入时只在版本未变时删除
             
         Returns:
             tuple: (success, message)
+            
+        Raises:
+            RowVersionConflict: 记录已被其他用户修改（记录不存在时返回未找到）
         """
         conn = self.get_connection()
         if not conn:
@@ -410,33 +935,31 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             
-            # 获取删除前的记录数据用于日志记录
-            deleted_record = None
-            if user_email:
-                try:
-                    select_query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE {} = %s").format(
-                        sql.Identifier(table_name),
-                        sql.Identifier(key_field)
-                    )
-                    cursor.execute(select_query, (key,))
-                    deleted_record_row = cursor.fetchone()
-                    
-                    # 获取列名
-                    if deleted_record_row:
-                        colnames = [desc[0] for desc in cursor.description]
-                        deleted_record = dict(zip(colnames, deleted_record_row))
-                except Exception as log_error:
-                    print(f"获取删除前记录数据时出错: {log_error}")
+            where_clause = sql.SQL("{} = %s").format(sql.Identifier(key_field))
+            params = [key]
+            versioned = expected_version is not None and schema_cache.has_column(table_name, 'row_version', cursor)
+            if versioned:
+                where_clause += sql.SQL(" AND row_version = %s")
+                params.append(expected_version)
             
-            # 执行删除
-            delete_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE {} = %s").format(
+            # 执行删除，RETURNING 返回删除的记录用于日志记录
+            delete_query = sql.SQL("DELETE FROM purchase_orders.{} WHERE {} RETURNING *").format(
                 sql.Identifier(table_name),
-                sql.Identifier(key_field)
+                where_clause
             )
-            cursor.execute(delete_query, (key,))
-            affected_rows = cursor.rowcount
+            cursor.execute(delete_query, params)
+            deleted_rows = cursor.fetchall()
+            affected_rows = len(deleted_rows)
+            # 没有删除任何行时只查询一次记录是否存在：存在说明版本已变化，否则是记录不存在
+            if affected_rows == 0 and versioned and self._row_exists(cursor, table_name, key_field, key):
+                raise RowVersionConflict()
             conn.commit()
             
+            deleted_record = None
+            if deleted_rows:
+                colnames = [desc[0] for desc in cursor.description]
+                deleted_record = dict(zip(colnames, deleted_rows[0]))
+            
             # 记录操作日志
             if user_email and affected_rows > 0 and deleted_record:
                 try:
@@ -457,6 +980,14 @@ class DatabaseManager:
                 return True, f"删除成功，影响了 {affected_rows} 行"
             else:
                 return False, "未找到要删除的记录"
+        except RowVersionConflict:
+            try:
+                conn.rollback()
+                cursor.close()
+                conn.close()
+            except:
+                pass
+            raise
         except Exception as error:
             if conn:
                 try:
@@ -487,14 +1018,7 @@ class DatabaseManager:
             cursor = conn.cursor()
             
             # 获取表的实际列名
-            get_columns_query = """
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_schema = 'purchase_orders' 
-                AND table_name = %s
-            """
-            cursor.execute(get_columns_query, (table_name,))
-            existing_columns = set(row[0] for row in cursor.fetchall())
+            existing_columns = schema_cache.get_column_names(table_name, cursor)
             
             # 清理数据中的特殊值，只保留表中存在的列
             cleaned_data = {}
@@ -514,16 +1038,8 @@ class DatabaseManager:
                 columns = list(cleaned_data.keys())
                 values = list(cleaned_data.values())
                 
-                # 定义 PDF 可提取的列（只有这些列会在冲突时被覆盖）
-                # WF OPEN 表: PO PN LINE PO/LINE description qty net_price total_price req_date_wf placed_date purchaser
-                # Non-wf OPEN 表: PO PN LINE PO/LINE description qty net_price total_price req_date placed_date
-                pdf_extractable_columns = {
-                    'wf_open': {'po', 'pn', 'line', 'po_line', 'description', 'qty', 'net_price', 'total_price', 'req_date_wf', 'po_placed_date', 'purchaser'},
-                    'non_wf_open': {'po', 'pn', 'line', 'po_line', 'description', 'qty', 'net_price', 'total_price', 'req_date', 'po_placed_date'}
-                }
-                
-                # 获取当前表的 PDF 可提取列集合
-                pdf_cols = pdf_extractable_columns.get(table_name, set(columns))
+                # 获取当前表的 PDF 可提取列集合（只有这些列会在冲突时被覆盖）
+                pdf_cols = PDF_EXTRACTABLE_COLUMNS.get(table_name, set(columns))
                 
                 # 构建 ON CONFLICT 更新的 SET 子句
                 # 只覆盖 PDF 提取的列，保留其他列的原值
@@ -624,6 +1140,8 @@ class DatabaseManager:
             conn.commit()
             cursor.close()
             conn.close()
+            # 表结构已变更，刷新缓存
+            schema_cache.invalidate()
             return True, "列添加成功"
         except Exception as error:
             if conn:
@@ -635,54 +1153,102 @@ class DatabaseManager:
                     pass
             return False, f"添加列时出错: {error}"
 
+    def _values_differ(self, old_value, new_value):
+        """比较数据库中的值与将要写入的值（数字按数值比较，其余按字符串比较）"""
+        if old_value is None or new_value is None:
+            return old_value is not None or new_value is not None
+        try:
+            return Decimal(str(old_value)) != Decimal(str(new_value))
+        except (InvalidOperation, ValueError):
+            return str(old_value) != str(new_value)
+
+    def _diff_row(self, table_name, existing, data):
+        """
+        计算覆盖时会被改变的字段
+
+        Returns:
+            dict: {column_name: {'old': 旧值, 'new': 新值}}
+        """
+        # open 表冲突时只覆盖 PDF 可提取的列
+        overwritable = PDF_EXTRACTABLE_COLUMNS.get(table_name)
+        diff = {}
+        for column_name, new_value in data.items():
+            if column_name not in existing:
+                continue
+            if overwritable is not None and column_name not in overwritable:
+                continue
+            if new_value == 'None' or new_value == 'nan' or new_value == '':
+                new_value = None
+            old_value = existing[column_name]
+            if self._values_differ(old_value, new_value):
+                diff[column_name] = {'old': old_value, 'new': new_value}
+        return diff
+
     def check_duplicates(self, table_name, data_list):
         """
-        检查数据列表中是否存在主键冲突
+        检查数据列表中是否存在主键冲突（所有主键一次查询）
         
         Args:
             table_name: 表名
             data_list: 要检查的数据列表
             
         Returns:
-            list: 重复的数据项列表
+            list: 重复的数据项列表 [{'data', 'primary_key', 'existing', 'diff'}]
+                existing 为数据库中的现有行，diff 为覆盖时会被改变的字段
         """
+        # 根据表名确定主键字段
+        primary_key_field = 'id'  # 默认使用新的自增主键
+        if table_name in ['wf_open', 'non_wf_open']:
+            primary_key_field = 'po_line'
+        elif table_name in ['wf_closed', 'non_wf_closed']:
+            # 对于新表结构，我们通过pn字段检查重复
+            primary_key_field = 'pn'
+        
+        candidates = [(data, data.get(primary_key_field)) for data in data_list]
+        candidates = [(data, value) for data, value in candidates if value]
+        if not candidates:
+            return []
+        
         conn = self.get_connection()
         if not conn:
             raise Exception("数据库连接失败")
         
         try:
             cursor = conn.cursor()
-            duplicates = []
             
-            # 根据表名确定主键字段
-            primary_key_field = 'id'  # 默认使用新的自增主键
-            if table_name in ['wf_open', 'non_wf_open']:
-                primary_key_field = 'po_line'
-            elif table_name in ['wf_closed', 'non_wf_closed']:
-                # 对于新表结构，我们通过pn字段检查重复
-                primary_key_field = 'pn'
-            
-            # 检查每个数据项
-            for data in data_list:
-                # 获取主键值
-                primary_key_value = data.get(primary_key_field)
-                if not primary_key_value:
+            # 文本主键统一按字符串比较，避免数组类型与列类型不一致
+            key_type = schema_cache.get_columns(table_name, cursor).get(primary_key_field, '')
+            if key_type in ('character varying', 'text', 'character'):
+                candidates = [(data, str(value)) for data, value in candidates]
+            keys = list(dict.fromkeys(value for _, value in candidates))
+            
+            # 一次查询所有候选主键
+            query = sql.SQL("SELECT * FROM purchase_orders.{} WHERE {} = ANY(%s)").format(
+                sql.Identifier(table_name),
+                sql.Identifier(primary_key_field)
+            )
+            cursor.execute(query, (keys,))
+            colnames = [desc[0] for desc in cursor.description]
+            existing_rows = {}
+            for record in cursor.fetchall():
+                row = dict(zip(colnames, record))
+                # 同一主键有多行时（closed表按pn检查）以第一行为准
+                existing_rows.setdefault(row[primary_key_field], row)
+            
+            cursor.close()
+            conn.close()
+            
+            duplicates = []
+            for data, primary_key_value in candidates:
+                existing = existing_rows.get(primary_key_value)
+                if existing is None:
                     continue
-                
-                # 查询数据库中是否存在相同的主键
-                query = sql.SQL("SELECT COUNT(*) FROM purchase_orders.{} WHERE {} = %s").format(
-                    sql.Identifier(table_name),
-                    sql.Identifier(primary_key_field)
-                )
-                cursor.execute(query, (primary_key_value,))
-                count = cursor.fetchone()[0]
-                
-                if count > 0:
-                    # 如果存在，添加到重复列表中
-                    duplicates.append({
-                        'data': data,
-                        'primary_key': primary_key_value
-                    })
+                duplicates.append({
+                    'data': data,
+                    'primary_key': primary_key_value,
+                    'existing': existing,
+                    'diff': self._diff_row(table_name, existing, data)
+                })
             
             return duplicates
         except Exception as error:
@@ -713,14 +1279,14 @@ def get_all_tables():
         print(f"获取所有表名时出错: {e}")
         return []
 
-def update_table_data(table_name, row_data, primary_key_value):
+def update_table_data(table_name, row_data, primary_key_value, key_field=None):
     """更新表数据"""
     try:
         manager = get_db_manager()
-        return manager.update_row(table_name, primary_key_value, row_data)
+        return manager.update_row(table_name, primary_key_value, row_data, key_field=key_field)
     except Exception as e:
         print(f"更新表数据时出错: {e}")
-        return False, f"更新数据时出错: {e}"
+        return False, f"更新数据时出错: {e}", None
 
 def insert_table_data(table_name, row_data, user_email=None):
     """插入表数据"""
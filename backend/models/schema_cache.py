@@ -0,0 +1,138 @@
+"""
+表结构缓存
+进程内缓存 purchase_orders 模式下各表的列信息、单列主键（以及已安装的扩展），读写路径不再每次查询 information_schema。
+表结构变更由 init_db.py 的迁移在启动时完成；运行期间通过 add_dynamic_columns 变更时调用 invalidate()。
+"""
+
+import os
+import threading
+import time
+
+from backend.utils.db_pool import get_connection as get_pooled_connection
+
+SCHEMA_NAME = 'purchase_orders'
+
+
+class SchemaCache:
+    def __init__(self, ttl=None, missing_ttl=None):
+        """
+        Args:
+            ttl: 缓存有效期（秒），None 或 0 表示只在 invalidate() 后重新加载
+            missing_ttl: 不存在的表名的缓存有效期（秒），期间再次请求该表不重新加载；
+                         None 时与 ttl 相同，ttl 为 0 时默认 30 秒
+        """
+        if ttl is None:
+            ttl = float(os.getenv('SCHEMA_CACHE_TTL', '0'))
+        if missing_ttl is None:
+            missing_ttl = float(os.getenv('SCHEMA_CACHE_MISSING_TTL', ttl or 30))
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._tables = None
+        self._extensions = set()
+        self._primary_keys = {}
+        # 最近一次加载后仍不存在的表名 -> 记录时间（避免拼错的表名每次都重新加载）
+        self._missing = {}
+        self._loaded_at = 0.0
+
+    def _expired(self):
+        if self._tables is None:
+            return True
+        return bool(self.ttl) and time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self, cursor=None):
+        """加载模式下所有表的列（按列顺序）、单列主键和已安装的扩展"""
+        query = """
+            SELECT table_name, column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = %s
+            ORDER BY table_name, ordinal_position
+        """
+        conn = None
+        if cursor is None:
+            conn = get_pooled_connection()
+            if not conn:
+                raise Exception("数据库连接失败")
+            cursor = conn.cursor()
+        try:
+            cursor.execute(query, (SCHEMA_NAME,))
+            tables = {}
+            for table_name, column_name, data_type in cursor.fetchall():
+                tables.setdefault(table_name, {})[column_name] = data_type
+            # 只记录单列主键；组合主键的表没有可用于按行定位的单一键列
+            cursor.execute("""
+                SELECT c.relname, a.attname
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+                WHERE n.nspname = %s AND i.indisprimary AND i.indnatts = 1
+            """, (SCHEMA_NAME,))
+            primary_keys = dict(cursor.fetchall())
+            cursor.execute("SELECT extname FROM pg_extension")
+            extensions = set(row[0] for row in cursor.fetchall())
+        finally:
+            if conn:
+                cursor.close()
+                conn.close()
+        self._tables = tables
+        self._primary_keys = primary_keys
+        self._extensions = extensions
+        self._missing = {}
+        self._loaded_at = time.monotonic()
+
+    def _get_tables(self, cursor=None, table_name=None):
+        with self._lock:
+            if self._expired():
+                self._load(cursor)
+            elif table_name is not None and table_name not in self._tables:
+                # 请求的表不在缓存中（可能是新建的表）时重新加载；
+                # 重新加载后仍不存在的表名在 missing_ttl 内不再触发加载
+                missing_since = self._missing.get(table_name)
+                if missing_since is None or time.monotonic() - missing_since > self.missing_ttl:
+                    self._load(cursor)
+                    if table_name not in self._tables:
+                        self._missing[table_name] = time.monotonic()
+            return self._tables
+
+    def get_tables(self, cursor=None):
+        """返回模式下所有表名（排序）"""
+        return sorted(self._get_tables(cursor))
+
+    def table_exists(self, table_name, cursor=None):
+        return table_name in self._get_tables(cursor, table_name)
+
+    def get_columns(self, table_name, cursor=None):
+        """
+        获取表的列及数据类型
+
+        Returns:
+            dict: {column_name: data_type}（按列顺序），表不存在时为空字典
+        """
+        return dict(self._get_tables(cursor, table_name).get(table_name, {}))
+
+    def get_column_names(self, table_name, cursor=None):
+        """获取表的列名集合"""
+        return set(self._get_tables(cursor, table_name).get(table_name, {}))
+
+    def has_column(self, table_name, column_name, cursor=None):
+        return column_name in self._get_tables(cursor, table_name).get(table_name, {})
+
+    def get_primary_key(self, table_name, cursor=None):
+        """获取表的单列主键列名，没有（或为组合主键）时返回 None"""
+        self._get_tables(cursor, table_name)
+        return self._primary_keys.get(table_name)
+
+    def has_extension(self, extension_name, cursor=None):
+        """数据库是否已安装指定扩展（如 pg_trgm），随表结构一起缓存"""
+        self._get_tables(cursor)
+        return extension_name in self._extensions
+
+    def invalidate(self):
+        """表结构变更后调用，下次访问时重新加载"""
+        with self._lock:
+            self._tables = None
+
+
+# 全局表结构缓存实例
+schema_cache = SchemaCache()
@@ -0,0 +1,172 @@
+"""
+表数据流式导出
+将 DatabaseManager.open_table_export() 逐行产出的元组序列化为 NDJSON、JSON 数组、CSV 或 Excel，
+按块产出，不在内存中构建完整结果。
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 每次向客户端写出的行数
+EXPORT_CHUNK_ROWS = 500
+
+
+def _default(value):
+    """日期使用 ISO 8601，Decimal 使用字符串以保留精度"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+# 共用一个编码器实例，避免每行重新构建
+_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_row(columns, row):
+    return _encoder.encode(dict(zip(columns, row)))
+
+
+def iter_ndjson(columns, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """每行一个 JSON 对象；读取中途出错时最后输出一行 {"error": ...}"""
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(encode_row(columns, row))
+            if len(chunk) >= chunk_rows:
+                yield '\n'.join(chunk) + '\n'
+                chunk = []
+        if chunk:
+            yield '\n'.join(chunk) + '\n'
+    except Exception as e:
+        logger.error("导出数据时出错: %s", e)
+        if chunk:
+            yield '\n'.join(chunk) + '\n'
+        yield _encoder.encode({'error': str(e)}) + '\n'
+
+
+def iter_json_array(columns, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """JSON 数组；读取中途出错时输出会被截断（不是合法的 JSON），客户端据此判断导出失败"""
+    chunk = ['[']
+    first = True
+    try:
+        for row in rows:
+            if first:
+                chunk.append(encode_row(columns, row))
+                first = False
+            else:
+                chunk.append(',' + encode_row(columns, row))
+            if len(chunk) >= chunk_rows:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append(']')
+        yield ''.join(chunk)
+    except Exception as e:
+        logger.error("导出数据时出错: %s", e)
+        yield ''.join(chunk)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(columns, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """CSV（UTF-8 带 BOM，Excel 可直接打开中文内容），首行为列名"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    count = 0
+    try:
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+            count += 1
+            if count >= chunk_rows:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                count = 0
+        yield buffer.getvalue()
+    except Exception as e:
+        # CSV 无法表示错误行，中断响应使客户端得到不完整的传输而不是看似完整的文件
+        logger.error("导出数据时出错: %s", e)
+        raise
+
+
+def _xlsx_value(value, illegal_characters):
+    if isinstance(value, str):
+        # Excel 不允许的控制字符
+        return illegal_characters.sub('', value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    return value
+
+
+def iter_xlsx(columns, rows, sheet_title=None, read_size=64 * 1024):
+    """
+    Excel 工作簿（openpyxl 只写模式）
+
+    只写模式逐行写入磁盘上的临时文件，不在内存中保留单元格；
+    工作簿保存完成后再从临时文件分块输出。
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    from openpyxl.styles import Font
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=(sheet_title or 'Sheet1')[:31])
+        header = []
+        for column_name in columns:
+            cell = WriteOnlyCell(sheet, value=column_name)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        for row in rows:
+            sheet.append([_xlsx_value(value, ILLEGAL_CHARACTERS_RE) for value in row])
+        workbook.save(path)
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(read_size)
+                if not chunk:
+                    break
+                yield chunk
+    except Exception as e:
+        logger.error("导出Excel时出错: %s", e)
+        raise
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# 导出格式: format -> (生成函数, MIME 类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson'),
+    'json': (iter_json_array, 'application/json', 'json'),
+    'csv': (iter_csv, 'text/csv', 'csv'),
+    'xlsx': (iter_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
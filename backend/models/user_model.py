@@ -4,6 +4,7 @@ import hashlib
 import secrets
 import datetime
 from backend.utils.config import get_db_config
+from backend.utils.db_pool import get_connection as get_pooled_connection
 
 
 class UserManager:
@@ -11,13 +12,8 @@ class UserManager:
         self.db_config = get_db_config()
 
     def get_connection(self):
-        """获取数据库连接"""
-        try:
-            connection = psycopg2.connect(**self.db_config)
-            return connection
-        except Exception as error:
-            print(f"数据库连接失败: {error}")
-            return None
+        """从共享连接池获取数据库连接（close() 即归还连接池）"""
+        return get_pooled_connection()
 
     def create_users_table(self):
         """创建用户表"""
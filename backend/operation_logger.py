@@ -1,22 +1,70 @@
+"""
+操作日志
+默认由后台线程批量写入（有界内存队列 + 多行 INSERT），不占用数据变更请求的响应时间；
+进程退出时写入队列中剩余的日志。需要与数据变更同一事务写入的操作（如发货、退货）传入 cursor。
+"""
+
+import atexit
 import json
+import os
+import queue
+import threading
 import psycopg2
 from psycopg2 import sql
-from backend.utils.config import get_db_config
+from psycopg2.extras import execute_values
+from backend.utils.config import get_db_config, get_operation_log_config
+from backend.utils.db_pool import get_connection as get_pooled_connection
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+INSERT_LOG_QUERY = """
+    INSERT INTO purchase_orders.po_records
+    (user_email, table_name, operation, record_data)
+    VALUES %s
+"""
+
+# 后台线程退出标记
+_STOP = object()
 
 class OperationLogger:
-    def __init__(self):
+    def __init__(self, async_enabled=None, batch_size=None, flush_interval=None, queue_size=None):
+        """
+        Args:
+            async_enabled: 是否后台批量写入
+            batch_size: 每批最多写入条数
+            flush_interval: 等待凑满一批的最长时间（秒）
+            queue_size: 队列容量，队列满时改为同步写入
+        """
+        config = get_operation_log_config()
         self.db_config = get_db_config()
+        self.async_enabled = config['async'] if async_enabled is None else async_enabled
+        self.batch_size = batch_size or config['batch_size']
+        self.flush_interval = flush_interval or config['flush_interval']
+        self.queue_size = queue_size or config['queue_size']
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        atexit.register(self.shutdown)
     
     def get_connection(self):
-        """获取数据库连接"""
-        try:
-            connection = psycopg2.connect(**self.db_config)
-            return connection
-        except Exception as error:
-            print(f"数据库连接失败: {error}")
-            return None
+        """从共享连接池获取数据库连接（close() 即归还连接池）"""
+        return get_pooled_connection()
+
+    def _get_queue(self):
+        """获取日志队列并确保后台线程在运行（fork 后的子进程重新创建）"""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._queue is None or self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.queue_size)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._writer, name='operation-logger', daemon=True)
+                self._thread.start()
+            return self._queue
     
-    def log_operation(self, user_email, table_name, operation, record_data):
+    def log_operation(self, user_email, table_name, operation, record_data, cursor=None):
         """
         记录用户操作
         
@@ -25,44 +73,130 @@ class OperationLogger:
             table_name: 表名
             operation: 操作类型 ('insert', 'update', 'delete')
             record_data: 记录数据 (dict)
+            cursor: 调用方事务中的游标。传入时在同一事务中立即写入，
+                    出错时抛出异常由调用方回滚（用于发货等需要审计保证的操作）
             
         Returns:
-            bool: 是否成功记录
+            bool: 是否成功记录（异步模式下表示已加入写入队列）
         """
+        # 入队时即序列化，之后调用方修改 record_data 不影响日志内容
+        row = (user_email, table_name, operation, json.dumps(record_data, default=str))
+
+        if cursor is not None:
+            execute_values(cursor, INSERT_LOG_QUERY, [row])
+            return True
+
+        if self.async_enabled:
+            try:
+                self._get_queue().put_nowait(row)
+                return True
+            except queue.Full:
+                logger.warning("操作日志队列已满，改为同步写入")
+
+        return self._write_rows([row])
+
+    def log_operations(self, user_email, operations, cursor):
+        """
+        在调用方事务中用一条多行 INSERT 记录多条操作（用于批量发货等）
+
+        Args:
+            user_email: 用户邮箱
+            operations: [(table_name, operation, record_data), ...]
+            cursor: 调用方事务中的游标，出错时抛出异常由调用方回滚
+        """
+        rows = [
+            (user_email, table_name, operation, json.dumps(record_data, default=str))
+            for table_name, operation, record_data in operations
+        ]
+        if rows:
+            execute_values(cursor, INSERT_LOG_QUERY, rows, page_size=len(rows))
+        return True
+
+    def _write_rows(self, rows):
+        """用一条多行 INSERT 写入日志；整批失败时逐条写入，跳过出错的日志"""
         conn = self.get_connection()
         if not conn:
-            print("无法获取数据库连接")
+            logger.error("无法获取数据库连接，丢弃 %d 条操作日志", len(rows))
             return False
         
         try:
             cursor = conn.cursor()
-            
-            # 将记录数据转换为JSON字符串
-            record_json = json.dumps(record_data, default=str)
-            
-            # 插入操作记录
-            insert_query = """
-                INSERT INTO purchase_orders.po_records 
-                (user_email, table_name, operation, record_data)
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(insert_query, (user_email, table_name, operation, record_json))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return True
-        except Exception as error:
-            print(f"记录操作时出错: {error}")
-            if conn:
+            try:
+                execute_values(cursor, INSERT_LOG_QUERY, rows, page_size=self.batch_size)
+                conn.commit()
+                return True
+            except Exception as batch_error:
+                conn.rollback()
+                if len(rows) == 1:
+                    raise
+                logger.warning("批量写入 %d 条操作日志失败，改为逐条写入: %s", len(rows), batch_error)
+
+            success = True
+            for row in rows:
                 try:
+                    execute_values(cursor, INSERT_LOG_QUERY, [row])
+                    conn.commit()
+                except Exception as row_error:
                     conn.rollback()
-                    cursor.close()
-                    conn.close()
-                except:
-                    pass
+                    success = False
+                    logger.error("记录操作时出错: %s (%s %s)", row_error, row[1], row[2])
+            return success
+        except Exception as error:
+            logger.error("记录操作时出错: %s", error)
             return False
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            conn.close()
+
+    def _writer(self):
+        """后台线程：从队列中取出日志，凑满一批或等待 flush_interval 后写入"""
+        log_queue = self._queue
+        while True:
+            item = log_queue.get()
+            batch = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+                while len(batch) < self.batch_size:
+                    try:
+                        item = log_queue.get(timeout=self.flush_interval)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+            try:
+                if batch:
+                    self._write_rows(batch)
+            except Exception as error:
+                logger.error("写入操作日志时出错: %s", error)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    log_queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """等待队列中的日志全部写入"""
+        with self._lock:
+            log_queue = self._queue if self._pid == os.getpid() else None
+        if log_queue is not None:
+            log_queue.join()
+
+    def shutdown(self, timeout=10):
+        """写入队列中剩余的日志并停止后台线程（进程退出时自动调用）"""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            log_queue = self._queue
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        log_queue.put(_STOP)
+        thread.join(timeout)
     
     def get_operation_logs(self, user_email=None, table_name=None, operation=None, limit=100):
         """
@@ -77,9 +211,12 @@ class OperationLogger:
         Returns:
             list: 操作日志列表
         """
+        # 先写入本进程队列中的日志，保证刚执行的操作可以查到
+        self.flush()
+
         conn = self.get_connection()
         if not conn:
-            print("无法获取数据库连接")
+            logger.error("无法获取数据库连接，无法查询操作日志")
             return []
         
         try:
@@ -134,7 +271,7 @@ class OperationLogger:
             
             return result
         except Exception as error:
-            print(f"获取操作日志时出错: {error}")
+            logger.error("获取操作日志时出错: %s", error)
             if conn:
                 try:
                     cursor.close()
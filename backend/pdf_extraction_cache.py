@@ -0,0 +1,167 @@
+"""
+PDF 解析结果缓存
+以 SHA-256(文件内容) + 公司 + 解析器版本 为键，将解析出的结构化数据保存在磁盘上，
+同一个 PDF 重复上传时直接返回缓存结果。缓存总大小超过上限时按最近访问时间（LRU）淘汰。
+解析器版本（db_pdf_processor.EXTRACTOR_VERSIONS）变更后旧缓存自动失效。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from backend.utils.config import get_pdf_import_config
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def file_sha256(pdf_path):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(value):
+    """JSON 编码时保留 Decimal 和日期类型"""
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f"无法缓存的类型: {type(value).__name__}")
+
+
+def _decode(obj):
+    if '__decimal__' in obj:
+        return Decimal(obj['__decimal__'])
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__date__' in obj:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+class PDFExtractionCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Args:
+            cache_dir: 缓存目录，为空时禁用缓存
+            max_bytes: 缓存总大小上限（字节）
+        """
+        config = get_pdf_import_config()
+        self.cache_dir = config['cache_dir'] if cache_dir is None else cache_dir
+        self.max_bytes = config['cache_max_bytes'] if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.cache_dir) and self.max_bytes > 0
+
+    def make_key(self, pdf_path, company_name, extractor_version):
+        """缓存键: SHA-256(文件内容) + 公司 + 解析器版本"""
+        raw = f"{file_sha256(pdf_path)}:{company_name}:{extractor_version}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        读取缓存
+
+        Returns:
+            list: 缓存的解析结果，未命中时返回 None
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f, object_hook=_decode)
+            # 更新访问时间，用于 LRU 淘汰
+            os.utime(path, None)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning("读取PDF解析缓存失败，忽略该缓存: %s", e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """写入缓存（先写临时文件再替换，避免并发读到不完整的文件；失败时删除临时文件）"""
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, default=_encode, ensure_ascii=False)
+            os.replace(tmp_path, self._entry_path(key))
+            tmp_path = None
+            self._evict()
+        except Exception as e:
+            logger.warning("写入PDF解析缓存失败: %s", e)
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def _evict(self):
+        """缓存总大小超过上限时删除最久未访问的条目"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def get_or_extract(self, pdf_path, company_name, extractor_version, extract):
+        """
+        命中缓存时直接返回，否则调用 extract() 解析并写入缓存
+
+        Args:
+            extract: 无参数的解析函数，返回数据列表
+        """
+        if not self.enabled:
+            return extract()
+        key = self.make_key(pdf_path, company_name, extractor_version)
+        data = self.get(key)
+        if data is not None:
+            logger.debug("PDF解析缓存命中: %s", pdf_path)
+            return data
+        data = extract()
+        if data is not None:
+            self.put(key, data)
+        return data
+
+
+# 全局解析缓存实例
+pdf_extraction_cache = PDFExtractionCache()
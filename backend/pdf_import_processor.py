@@ -1,7 +1,99 @@
+import itertools
 import json
+import multiprocessing
 import os
-from backend.db_pdf_processor import extract_wefaricate_data, extract_centurion_data, extract_magic_fx_data
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from backend.db_pdf_processor import extract_wefaricate_data, extract_centurion_data, extract_magic_fx_data, EXTRACTOR_VERSIONS
+from backend.pdf_extraction_cache import pdf_extraction_cache
 from backend.models.database import insert_table_data
+from backend.models.schema_cache import schema_cache
+from backend.models.bulk_upsert import bulk_upsert
+from backend.utils.config import get_pdf_import_config
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+def get_extractor(company_name):
+    """
+    根据公司名称选择解析函数
+
+    Returns:
+        tuple: (解析器名称, 解析函数)
+    """
+    # 根据公司类型调用相应的处理函数
+    if company_name == 'wefabricate':
+        return 'wefabricate', extract_wefaricate_data
+    elif company_name == 'centurion':
+        return 'centurion', extract_centurion_data
+    elif company_name == 'magic_fx':
+        return 'magic_fx', extract_magic_fx_data
+    elif company_name.startswith('generic_wf'):
+        # 通用WF处理方式
+        return 'wefabricate', extract_wefaricate_data
+    elif company_name.startswith('generic_non_wf'):
+        # 通用Non-WF处理方式
+        return 'centurion', extract_centurion_data
+    else:
+        # 对于其他公司，使用默认处理方式
+        return 'wefabricate', extract_wefaricate_data
+
+def extract_pdf_by_company(pdf_path, company_name, progress_callback=None):
+    """
+    根据公司名称处理PDF文件（模块级函数，可在进程池中执行）
+    相同内容的PDF命中解析缓存时直接返回缓存结果
+
+    Args:
+        progress_callback: 可选，每解析完一页调用 progress_callback(已完成页数, 总页数)
+    """
+    extractor_name, extract = get_extractor(company_name)
+    extractor_version = f"{extractor_name}-v{EXTRACTOR_VERSIONS[extractor_name]}"
+    return pdf_extraction_cache.get_or_extract(
+        pdf_path, company_name, extractor_version,
+        lambda: extract(pdf_path, progress_callback)
+    )
+
+def get_target_table(company_name):
+    """根据公司名称确定导入的目标表"""
+    if company_name == 'centurion' or company_name == 'magic_fx' or 'non_wf' in company_name:
+        return 'non_wf_open'
+    return 'wf_open'
+
+def _extract_pdf_worker(pdf_path, company_name):
+    """进程池任务：解析单个PDF并为每条数据添加公司字段"""
+    data = extract_pdf_by_company(pdf_path, company_name) or []
+    for item in data:
+        item['company'] = company_name
+    return data
+
+
+# 批量解析共用的进程池。使用 spawn 启动子进程：gunicorn gthread worker 是多线程进程，
+# fork 会复制其他线程持有的锁（如连接池锁），子进程可能死锁；共用一个池也避免每个请求重复启动进程
+_extract_executor = None
+_extract_executor_pid = None
+_extract_executor_lock = threading.Lock()
+
+def _get_extract_executor():
+    """获取共用的解析进程池（首次使用时创建，fork 后的子进程重新创建）"""
+    global _extract_executor, _extract_executor_pid
+    with _extract_executor_lock:
+        if _extract_executor is None or _extract_executor_pid != os.getpid():
+            _extract_executor = ProcessPoolExecutor(
+                max_workers=max(1, get_pdf_import_config()['workers']),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _extract_executor_pid = os.getpid()
+        return _extract_executor
+
+def _discard_extract_executor(executor):
+    """子进程异常退出导致进程池不可用时丢弃，下次使用时重新创建"""
+    global _extract_executor
+    with _extract_executor_lock:
+        if _extract_executor is executor:
+            _extract_executor = None
+    executor.shutdown(wait=False)
+
 
 class PDFImportProcessor:
     def __init__(self, config_path="config/column_mapping.json", upload_folder="uploads"):
@@ -19,7 +111,7 @@ class PDFImportProcessor:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"加载配置文件失败: {e}")
+            logger.warning("加载配置文件失败: %s", e)
             return {}
     
     def save_mapping_config(self):
@@ -29,7 +121,7 @@ class PDFImportProcessor:
                 json.dump(self.mapping_config, f, indent=2, ensure_ascii=False)
             return True
         except Exception as e:
-            print(f"保存配置文件失败: {e}")
+            logger.warning("保存配置文件失败: %s", e)
             return False
     
     def get_available_companies(self):
@@ -55,39 +147,18 @@ class PDFImportProcessor:
                 f.write(file_data)
             return file_path
         except Exception as e:
-            print(f"保存上传文件失败: {e}")
+            logger.error("保存上传文件失败: %s", e)
             return None
     
-    def process_pdf_by_company(self, pdf_path, company_name):
+    def process_pdf_by_company(self, pdf_path, company_name, progress_callback=None):
         """根据公司名称处理PDF文件"""
-        # 根据公司类型调用相应的处理函数
-        if company_name == 'wefabricate':
-            data = extract_wefaricate_data(pdf_path)
-            return data
-        elif company_name == 'centurion':
-            data = extract_centurion_data(pdf_path)
-            return data
-        elif company_name == 'magic_fx':
-            data = extract_magic_fx_data(pdf_path)
-            return data
-        elif company_name.startswith('generic_wf'):
-            # 通用WF处理方式
-            data = extract_wefaricate_data(pdf_path)
-            return data
-        elif company_name.startswith('generic_non_wf'):
-            # 通用Non-WF处理方式
-            data = extract_centurion_data(pdf_path)
-            return data
-        else:
-            # 对于其他公司，使用默认处理方式
-            data = extract_wefaricate_data(pdf_path)
-            return data
+        return extract_pdf_by_company(pdf_path, company_name, progress_callback)
     
-    def process_pdf_with_duplicate_check(self, pdf_path, company_name):
+    def process_pdf_with_duplicate_check(self, pdf_path, company_name, progress_callback=None):
         """处理PDF文件并检查重复数据"""
         try:
-            print(f"正在处理: {pdf_path}")
-            data = self.process_pdf_by_company(pdf_path, company_name)
+            logger.info("正在处理: %s", pdf_path)
+            data = self.process_pdf_by_company(pdf_path, company_name, progress_callback)
             
             if not data:
                 return {
@@ -100,9 +171,7 @@ class PDFImportProcessor:
                 item['company'] = company_name
             
             # 确定目标表名
-            table_name = 'wf_open'
-            if company_name == 'centurion' or company_name == 'magic_fx' or 'non_wf' in company_name:
-                table_name = 'non_wf_open'
+            table_name = get_target_table(company_name)
             
             # 检查重复数据
             duplicates = self.check_duplicates(table_name, data)
@@ -114,7 +183,7 @@ class PDFImportProcessor:
                 "table_name": table_name
             }
         except Exception as e:
-            print(f"处理 {pdf_path} 时出错: {e}")
+            logger.exception("处理 %s 时出错: %s", pdf_path, e)
             return {
                 "success": False,
                 "error": str(e)
@@ -129,7 +198,7 @@ class PDFImportProcessor:
             duplicates = db_manager.check_duplicates(table_name, data_list)
             return duplicates
         except Exception as e:
-            print(f"检查重复数据时出错: {e}")
+            logger.error("检查重复数据时出错: %s", e)
             return []
     
     def insert_data_with_check(self, table_name, data_list, user_email=None):
@@ -147,7 +216,6 @@ class PDFImportProcessor:
             
             # 导入数据库相关模块
             from backend.models.database import get_db_manager
-            from psycopg2 import sql
             
             db_manager = get_db_manager()
             conn = db_manager.get_connection()
@@ -165,86 +233,10 @@ class PDFImportProcessor:
                 cursor = conn.cursor()
                 
                 # 获取表的实际列名（用于验证）
-                get_columns_query = """
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'purchase_orders' 
-                    AND table_name = %s
-                """
-                cursor.execute(get_columns_query, (table_name,))
-                existing_columns = set(row[0] for row in cursor.fetchall())
+                existing_columns = schema_cache.get_column_names(table_name, cursor)
                 
-                # 批量插入数据
-                for idx, data in enumerate(data_list):
-                    try:
-                        # 清理数据中的特殊值，只保留表中存在的列
-                        cleaned_data = {}
-                        for k, v in data.items():
-                            if k not in existing_columns:
-                                # 跳过不存在的列
-                                continue
-                            if v == 'None' or v == 'nan' or v == '':
-                                cleaned_data[k] = None
-                            else:
-                                cleaned_data[k] = v
-                        
-                        if not cleaned_data:
-                            error_list.append(f"行{idx+1}: 没有有效数据")
-                            continue
-                        
-                        # 根据表名确定主键字段和处理策略
-                        if table_name in ['wf_open', 'non_wf_open']:
-                            # WF Open和Non-WF Open表使用po_line作为主键
-                            columns = list(cleaned_data.keys())
-                            values = list(cleaned_data.values())
-                            
-                            # 定义 PDF 可提取的列（只有这些列会在冲突时被覆盖）
-                            # WF OPEN 表: PO PN LINE PO/LINE description qty net_price total_price req_date_wf placed_date purchaser
-                            # Non-wf OPEN 表: PO PN LINE PO/LINE description qty net_price total_price req_date placed_date
-                            pdf_extractable_columns = {
-                                'wf_open': {'po', 'pn', 'line', 'po_line', 'description', 'qty', 'net_price', 'total_price', 'req_date_wf', 'po_placed_date', 'purchaser'},
-                                'non_wf_open': {'po', 'pn', 'line', 'po_line', 'description', 'qty', 'net_price', 'total_price', 'req_date', 'po_placed_date'}
-                            }
-                                                        
-                            # 获取当前表的 PDF 可提取列集合
-                            pdf_cols = pdf_extractable_columns.get(table_name, set(columns))
-                                                        
-                            # 构建 ON CONFLICT 更新的 SET 子句
-                            # 只覆盖 PDF 提取的列，保留其他列的原值
-                            update_fields = []
-                            for col in columns:
-                                if col != 'po_line' and col in pdf_cols:  # 只更新 PDF 列
-                                    update_fields.append(f"{col} = EXCLUDED.{col}")
-                            
-                            insert_query = sql.SQL("""
-                                INSERT INTO purchase_orders.{} ({}) 
-                                VALUES ({}) 
-                                ON CONFLICT (po_line) DO UPDATE SET {}
-                            """).format(
-                                sql.Identifier(table_name),
-                                sql.SQL(", ").join(sql.Identifier(col) for col in columns),
-                                sql.SQL(", ").join(sql.Placeholder() * len(columns)),
-                                sql.SQL(", ".join(update_fields) if update_fields else "po = EXCLUDED.po")
-                            )
-                        else:
-                            # 其他表使用默认的插入方式
-                            columns = list(cleaned_data.keys())
-                            values = list(cleaned_data.values())
-                            placeholders = sql.SQL(", ").join(sql.Placeholder() * len(columns))
-                            
-                            insert_query = sql.SQL("INSERT INTO purchase_orders.{} ({}) VALUES ({})").format(
-                                sql.Identifier(table_name),
-                                sql.SQL(", ").join(sql.Identifier(col) for col in columns),
-                                placeholders
-                            )
-                        
-                        cursor.execute(insert_query, values)
-                        success_count += 1
-                        
-                    except Exception as item_error:
-                        error_list.append(f"行{idx+1}: {str(item_error)}")
-                        print(f"插入第{idx+1}条数据时出错: {item_error}")
-                        print(f"数据内容: {data}")
+                # 按列组合分组批量插入，冲突时覆盖 PDF 可提取的列
+                success_count, error_list = bulk_upsert(cursor, table_name, data_list, existing_columns)
                 
                 # 一次性提交所有更改
                 conn.commit()
@@ -278,36 +270,152 @@ class PDFImportProcessor:
                 conn.close()
                 
         except Exception as e:
-            print(f"批量插入数据时出错: {e}")
+            logger.error("批量插入数据时出错: %s", e)
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    def iter_extract_pdfs(self, pdf_files, company_name, max_workers=None):
+        """
+        并行解析多个PDF文件（共用进程池），按完成顺序逐个返回结果
+
+        Args:
+            pdf_files: PDF文件路径列表
+            company_name: 公司名称
+            max_workers: 同时解析的文件数，默认 PDF_IMPORT_WORKERS（CPU 核数，也是进程池大小）
+
+        Yields:
+            tuple: (index, data, error)，error 为 None 表示解析成功
+        """
+        if max_workers is None:
+            max_workers = get_pdf_import_config()['workers']
+        max_workers = max(1, min(max_workers, len(pdf_files)))
+
+        if max_workers == 1:
+            # 单个文件或单进程时直接在当前进程解析
+            for index, pdf_path in enumerate(pdf_files):
+                try:
+                    yield index, _extract_pdf_worker(pdf_path, company_name), None
+                except Exception as e:
+                    logger.exception("处理 %s 时出错: %s", pdf_path, e)
+                    yield index, [], str(e)
+            return
+
+        # 共用进程池，每次调用同时提交的文件数不超过 max_workers
+        pending = enumerate(pdf_files)
+        # future -> (文件序号, 提交时的进程池)
+        futures = {}
+
+        def submit(count):
+            for index, pdf_path in itertools.islice(pending, count):
+                executor = _get_extract_executor()
+                try:
+                    future = executor.submit(_extract_pdf_worker, pdf_path, company_name)
+                except (BrokenProcessPool, RuntimeError):
+                    # 进程池已损坏（或已被其他请求丢弃），换一个新的进程池重试
+                    _discard_extract_executor(executor)
+                    executor = _get_extract_executor()
+                    future = executor.submit(_extract_pdf_worker, pdf_path, company_name)
+                futures[future] = (index, executor)
+
+        try:
+            submit(max_workers)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, executor = futures.pop(future)
+                    try:
+                        data, error = future.result(), None
+                    except BrokenProcessPool as e:
+                        logger.error("处理 %s 时解析进程异常退出: %s", pdf_files[index], e)
+                        _discard_extract_executor(executor)
+                        data, error = [], str(e)
+                    except Exception as e:
+                        logger.error("处理 %s 时出错: %s", pdf_files[index], e)
+                        data, error = [], str(e)
+                    # 先补充提交再返回结果，调用方处理结果时进程池保持忙碌
+                    submit(1)
+                    yield index, data, error
+        finally:
+            # 调用方提前停止迭代（如客户端断开）时取消尚未开始的任务
+            for future in futures:
+                future.cancel()
+
+    def process_pdf_batch(self, pdf_files, company_name, insert=False, user_email=None, max_workers=None):
+        """
+        批量导入PDF：并行解析，所有文件合并后只做一次重复检查和（可选）一次批量插入
+
+        Args:
+            pdf_files: [(文件名, 文件路径)] 列表
+            company_name: 公司名称
+            insert: 是否在解析完成后直接插入（重复数据覆盖）
+            user_email: 用户邮箱（用于记录操作日志）
+            max_workers: 解析进程数
+
+        Yields:
+            dict: 每个文件解析完成时 {'event': 'file', ...}，最后 {'event': 'summary', ...}
+        """
+        table_name = get_target_table(company_name)
+        results = [None] * len(pdf_files)
+        success_count = 0
+        error_count = 0
+
+        paths = [pdf_path for _, pdf_path in pdf_files]
+        for index, data, error in self.iter_extract_pdfs(paths, company_name, max_workers):
+            filename = pdf_files[index][0]
+            if error is None and not data:
+                error = "未从PDF中提取到有效数据"
+            if error is None:
+                results[index] = data
+                success_count += 1
+            else:
+                error_count += 1
+            yield {
+                'event': 'file',
+                'file': filename,
+                'success': error is None,
+                'count': len(data),
+                'error': error
+            }
+
+        # 按上传顺序合并，同一 po_line 出现多次时以后面的文件为准
+        all_data = [item for data in results if data for item in data]
+
+        summary = {
+            'event': 'summary',
+            'success': True,
+            'table_name': table_name,
+            'success_count': success_count,
+            'error_count': error_count,
+            'data': all_data,
+            'duplicates': self.check_duplicates(table_name, all_data) if all_data else []
+        }
+        if insert and all_data:
+            summary['insert_result'] = self.insert_data_with_check(table_name, all_data, user_email)
+            summary['success'] = summary['insert_result'].get('success', False)
+        yield summary
+
     def process_multiple_pdfs(self, pdf_files, company_name):
         """处理多个PDF文件"""
         all_data = []
         success_count = 0
         error_count = 0
+        results = [None] * len(pdf_files)
         
-        for pdf_path in pdf_files:
-            try:
-                print(f"正在处理: {pdf_path}")
-                data = self.process_pdf_by_company(pdf_path, company_name)
-                if data:
-                    # 为每条数据添加公司字段
-                    for item in data:
-                        item['company'] = company_name
-                    all_data.extend(data)
-                    success_count += 1
-                else:
-                    error_count += 1
-            except Exception as e:
-                print(f"处理 {pdf_path} 时出错: {e}")
+        for index, data, error in self.iter_extract_pdfs(pdf_files, company_name):
+            if error is None and data:
+                results[index] = data
+                success_count += 1
+            else:
                 error_count += 1
         
+        for data in results:
+            if data:
+                all_data.extend(data)
+        
         return {
             "data": all_data,
             "success_count": success_count,
             "error_count": error_count
-        }
\ No newline at end of file
+        }
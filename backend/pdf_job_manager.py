@@ -0,0 +1,372 @@
+"""
+PDF 异步导入任务
+提交后立即返回任务 id，由进程内有限的工作线程执行 process_pdf_with_duplicate_check，
+任务状态、逐页/逐文件进度和最终结果保存在 purchase_orders.pdf_import_jobs 表中，
+进程重启后未完成的任务会重新排队。
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import Json, RealDictCursor
+
+from backend.utils.config import get_pdf_import_config
+from backend.utils.db_pool import get_connection as get_pooled_connection
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# 任务因进程退出被重新排队的最大次数
+MAX_ATTEMPTS = 3
+
+JOB_COLUMNS = """
+    id, status, company, user_email, files, progress, result, error, attempts,
+    created_at, started_at, finished_at, updated_at
+"""
+
+
+def _json(value):
+    """JSONB 参数（Decimal/date 等转为字符串）"""
+    return Json(value, dumps=lambda obj: json.dumps(obj, default=str, ensure_ascii=False))
+
+
+class PDFJobManager:
+    def __init__(self, processor, job_folder=None, max_workers=None, max_pending=None):
+        """
+        Args:
+            processor: PDFImportProcessor 实例
+            job_folder: 任务文件保存目录，默认 <upload_folder>/pdf_jobs
+            max_workers: 工作线程数
+            max_pending: 本进程最多排队（含执行中）的任务数
+        """
+        config = get_pdf_import_config()
+        self.processor = processor
+        self.job_folder = job_folder or os.path.join(processor.upload_folder, 'pdf_jobs')
+        self.max_workers = max_workers or config['job_workers']
+        self.max_pending = max_pending or config['job_max_pending']
+        self.stale_seconds = config['job_stale_seconds']
+        self.progress_interval = config['job_progress_interval']
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+        # 本进程执行中任务的最新进度（数据库中的进度按间隔写入）
+        self._progress = {}
+
+        if not os.path.exists(self.job_folder):
+            os.makedirs(self.job_folder)
+
+    def get_connection(self):
+        """从共享连接池获取数据库连接（close() 即归还连接池）"""
+        return get_pooled_connection()
+
+    def _get_executor(self):
+        """获取工作线程池（fork 后的子进程重新创建）"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pdf-job')
+                self._pid = os.getpid()
+                self._pending = set()
+                self._progress = {}
+            return self._executor
+
+    def _schedule(self, job_id):
+        executor = self._get_executor()
+        with self._lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        executor.submit(self._run, job_id)
+
+    def new_job_dir(self):
+        """为新任务创建文件目录，返回 (job_id, 目录)"""
+        job_id = str(uuid.uuid4())
+        job_dir = os.path.join(self.job_folder, job_id)
+        os.makedirs(job_dir)
+        return job_id, job_dir
+
+    def submit(self, job_id, company, files, user_email=None):
+        """
+        提交导入任务
+
+        Args:
+            job_id: new_job_dir() 返回的任务 id
+            company: 公司名称
+            files: [(文件名, 文件路径)]，文件应保存在任务目录中
+            user_email: 用户邮箱
+
+        Returns:
+            tuple: (success, job 或错误信息)
+        """
+        self._get_executor()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return False, "导入任务队列已满，请稍后再试"
+
+        conn = self.get_connection()
+        if not conn:
+            return False, "数据库连接失败"
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            progress = {'files_total': len(files), 'files_done': 0, 'current_file': None,
+                        'pages_done': 0, 'pages_total': None}
+            cursor.execute(f"""
+                INSERT INTO purchase_orders.pdf_import_jobs (id, status, company, user_email, files, progress)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING {JOB_COLUMNS}
+            """, (job_id, JOB_QUEUED, company, user_email,
+                  _json([{'name': name, 'path': path} for name, path in files]), _json(progress)))
+            job = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            return False, f"创建导入任务时出错: {e}"
+
+        self._schedule(job_id)
+        return True, self._format_job(job)
+
+    def get_job(self, job_id):
+        """
+        获取任务状态、进度和结果
+
+        Returns:
+            dict: 任务信息，不存在时返回 None
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("数据库连接失败")
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM purchase_orders.pdf_import_jobs WHERE id = %s", (job_id,))
+            job = cursor.fetchone()
+            cursor.close()
+            conn.close()
+        except Exception:
+            try:
+                conn.close()
+            except:
+                pass
+            raise
+        if job is None:
+            return None
+        job = self._format_job(job)
+        # 本进程执行中的任务使用内存中的最新进度
+        if job['status'] == JOB_RUNNING and job_id in self._progress:
+            job['progress'] = dict(self._progress[job_id])
+        return job
+
+    def _format_job(self, job):
+        job = dict(job)
+        job['files'] = [f['name'] for f in job.get('files') or []]
+        for key in ('created_at', 'started_at', 'finished_at', 'updated_at'):
+            if job.get(key) is not None:
+                job[key] = job[key].isoformat()
+        return job
+
+    def recover(self):
+        """
+        重新排队未完成的任务（进程启动时调用）
+
+        超过 stale_seconds 未更新的执行中任务视为进程已退出：重试次数未用完时重新排队，否则标记失败。
+        """
+        conn = self.get_connection()
+        if not conn:
+            logger.warning("无法获取数据库连接，跳过导入任务恢复")
+            return 0
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE purchase_orders.pdf_import_jobs
+                SET status = CASE WHEN attempts >= %s THEN %s ELSE %s END,
+                    error = CASE WHEN attempts >= %s THEN '任务执行中进程多次退出' ELSE error END,
+                    finished_at = CASE WHEN attempts >= %s THEN CURRENT_TIMESTAMP ELSE finished_at END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = %s
+                AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """, (MAX_ATTEMPTS, JOB_FAILED, JOB_QUEUED, MAX_ATTEMPTS, MAX_ATTEMPTS, JOB_RUNNING, self.stale_seconds))
+            cursor.execute("""
+                SELECT id FROM purchase_orders.pdf_import_jobs
+                WHERE status = %s
+                ORDER BY created_at
+            """, (JOB_QUEUED,))
+            job_ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            logger.error("恢复导入任务时出错: %s", e)
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            return 0
+
+        for job_id in job_ids:
+            self._schedule(job_id)
+        if job_ids:
+            logger.info("重新排队 %d 个未完成的PDF导入任务", len(job_ids))
+        return len(job_ids)
+
+    def _claim(self, job_id):
+        """将排队中的任务标记为执行中，已被其他进程领取时返回 None"""
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("数据库连接失败")
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("""
+                UPDATE purchase_orders.pdf_import_jobs
+                SET status = %s, attempts = attempts + 1,
+                    started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = %s
+                RETURNING company, user_email, files
+            """, (JOB_RUNNING, job_id, JOB_QUEUED))
+            job = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return job
+        except Exception:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            raise
+
+    def _save(self, job_id, **fields):
+        """更新任务字段（progress/result 以 JSONB 保存）"""
+        assignments = ["updated_at = CURRENT_TIMESTAMP"]
+        params = []
+        for key, value in fields.items():
+            if key in ('progress', 'result'):
+                value = _json(value)
+            if key == 'finished':
+                assignments.append("finished_at = CURRENT_TIMESTAMP")
+                continue
+            assignments.append(f"{key} = %s")
+            params.append(value)
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("数据库连接失败")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE purchase_orders.pdf_import_jobs SET {', '.join(assignments)} WHERE id = %s",
+                params + [job_id]
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception:
+            try:
+                conn.rollback()
+                conn.close()
+            except:
+                pass
+            raise
+
+    def _run(self, job_id):
+        """工作线程：逐个文件执行 process_pdf_with_duplicate_check 并记录进度"""
+        try:
+            job = self._claim(job_id)
+            if job is None:
+                return
+
+            files = job['files']
+            progress = {'files_total': len(files), 'files_done': 0, 'current_file': None,
+                        'pages_done': 0, 'pages_total': None}
+            self._progress[job_id] = progress
+            last_saved = [0.0]
+
+            def report(force=False):
+                now = time.monotonic()
+                if force or now - last_saved[0] >= self.progress_interval:
+                    last_saved[0] = now
+                    self._save(job_id, progress=progress)
+
+            def on_page(pages_done, pages_total):
+                progress['pages_done'] = pages_done
+                progress['pages_total'] = pages_total
+                report()
+
+            file_results = []
+            for file_info in files:
+                progress.update(current_file=file_info['name'], pages_done=0, pages_total=None)
+                report(force=True)
+                if not os.path.exists(file_info['path']):
+                    result = {'success': False, 'error': '任务文件不存在'}
+                else:
+                    result = self.processor.process_pdf_with_duplicate_check(
+                        file_info['path'], job['company'], progress_callback=on_page
+                    )
+                file_results.append(dict(result, file=file_info['name']))
+                progress['files_done'] += 1
+
+            progress['current_file'] = None
+            succeeded = any(result.get('success') for result in file_results)
+            self._save(
+                job_id,
+                status=JOB_SUCCEEDED if succeeded else JOB_FAILED,
+                progress=progress,
+                result={'files': file_results},
+                error=None if succeeded else '所有文件处理失败',
+                finished=True
+            )
+            self._cleanup(job_id)
+        except Exception as e:
+            logger.exception("执行PDF导入任务 %s 时出错: %s", job_id, e)
+            try:
+                self._save(job_id, status=JOB_FAILED, error=str(e), finished=True)
+                self._cleanup(job_id)
+            except Exception as save_error:
+                logger.error("记录导入任务 %s 失败状态时出错: %s", job_id, save_error)
+        finally:
+            with self._lock:
+                self._pending.discard(job_id)
+                self._progress.pop(job_id, None)
+
+    def _cleanup(self, job_id):
+        """删除已完成任务的上传文件"""
+        shutil.rmtree(os.path.join(self.job_folder, job_id), ignore_errors=True)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# 全局任务管理器实例
+pdf_job_manager = None
+
+def get_pdf_job_manager(processor=None):
+    """获取PDF导入任务管理器实例"""
+    global pdf_job_manager
+    if pdf_job_manager is None:
+        if processor is None:
+            from backend.pdf_import_processor import PDFImportProcessor
+            processor = PDFImportProcessor()
+        pdf_job_manager = PDFJobManager(processor)
+    return pdf_job_manager
@@ -9,6 +9,17 @@ from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 from psycopg2 import sql
 
+from backend.models.schema_cache import schema_cache
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 报表同步检索的 closed 表（结果按此顺序合并）
+CLOSED_TABLES = ('wf_closed', 'non_wf_closed')
+
+INTEGER_PATTERN = re.compile(r'^[+-]?\d+$')
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+
 
 class ReportSyncProcessor:
     """处理 Excel 报表同步"""
@@ -41,8 +52,8 @@ class ReportSyncProcessor:
             headers = [cell.value for cell in ws[1]]
             col_indices = {header: idx + 1 for idx, header in enumerate(headers)}
             
-            print(f"[Report Sync] Excel 文件列: {headers}")
-            print(f"[Report Sync] 列索引: {col_indices}")
+            logger.debug("Excel 文件列: %s", headers)
+            logger.debug("列索引: %s", col_indices)
             
             # 验证必要列
             required_columns = ['Material', 'PurchaseOrder', 'Comments', 'Reply', 'Request']
@@ -53,6 +64,16 @@ class ReportSyncProcessor:
                         'error': f'缺少必要列: {col}'
                     }
             
+            # 先收集所有行的 (PO, Line, PN)，每个 closed 表只查询一次
+            keys = set()
+            for values in ws.iter_rows(min_row=2, values_only=True):
+                material = values[col_indices['Material'] - 1]
+                po_info = self._parse_po_line(values[col_indices['PurchaseOrder'] - 1])
+                if po_info and material:
+                    keys.add(self._closed_record_key(po_info[0], po_info[1], material))
+            
+            closed_records = self._find_closed_records(keys)
+            
             # 处理每一行
             updated_rows = []
             errors = []
@@ -79,12 +100,12 @@ class ReportSyncProcessor:
                     po, line = po_info
                     
                     # 在数据库中检索匹配的 closed 表记录
-                    matching_records = self._find_closed_records(po, line, material)
+                    matching_records = closed_records.get(self._closed_record_key(po, line, material), [])
                     
-                    print(f"[Report Sync] 行 {row_idx}: 找到 {len(matching_records)} 条匹配记录")
-                    if matching_records:
-                        for idx, rec in enumerate(matching_records):
-                            print(f"[Report Sync]   记录 {idx}: po_line={rec.get('po_line')}, tracking_no={rec.get('tracking_no')}, record_no={rec.get('record_no')}")
+                    logger.debug("行 %d: 找到 %d 条匹配记录", row_idx, len(matching_records))
+                    for idx, rec in enumerate(matching_records):
+                        logger.debug("  记录 %d: po_line=%s, tracking_no=%s, record_no=%s",
+                                     idx, rec.get('po_line'), rec.get('tracking_no'), rec.get('record_no'))
                     
                     if not matching_records:
                         errors.append(f'行 {row_idx}: 未找到匹配的 closed 表记录 (PO={po}, Line={line}, PN={material})')
@@ -123,13 +144,13 @@ class ReportSyncProcessor:
                             if eta_date:
                                 eta_source = 'record_no'
                     
-                    print(f"[Report Sync] 行 {row_idx}: ETA 来源={eta_source}, 提取的 ETA 日期={eta_date}")
+                    logger.debug("行 %d: ETA 来源=%s, 提取的 ETA 日期=%s", row_idx, eta_source, eta_date)
                     
                     if eta_date:
                         reply_cell.value = eta_date
-                        print(f"[Report Sync] 行 {row_idx}: 已更新 reply_cell = {eta_date}")
+                        logger.debug("行 %d: 已更新 reply_cell = %s", row_idx, eta_date)
                     else:
-                        print(f"[Report Sync] 行 {row_idx}: 无法从 tracking_no 或 record_no 提取 ETA 日期")
+                        logger.debug("行 %d: 无法从 tracking_no 或 record_no 提取 ETA 日期", row_idx)
                     
                     updated_rows.append({
                         'row': row_idx,
@@ -143,9 +164,9 @@ class ReportSyncProcessor:
                     errors.append(f'行 {row_idx}: {str(row_error)}')
             
             # 保存修改
-            print(f"[Report Sync] 即将保存文件: {excel_path}")
+            logger.info("即将保存文件: %s", excel_path)
             wb.save(excel_path)
-            print(f"[Report Sync] 文件保存成功")
+            logger.info("文件保存成功")
             
             return {
                 'success': True,
@@ -185,59 +206,69 @@ class ReportSyncProcessor:
         except:
             return None
     
-    def _find_closed_records(self, po, line, material):
+    def _closed_record_key(self, po, line, material):
+        """closed 表记录的查找键 (po, line, pn)，与表中的字符串列直接比较"""
+        return (po, line, str(material))
+    
+    def _find_closed_records(self, keys):
         """
-        在 closed 表中查找匹配的记录
+        批量查找 closed 表中匹配的记录
+        
+        每个 closed 表执行一次查询：查找键以数组参数传入，unnest 后与表按 (po, line, pn) 连接。
         
         Args:
-            po: 采购单号
-            line: 行号
-            material: 物料代码 (PN)
+            keys: _closed_record_key() 生成的 (po, line, pn) 集合
             
         Returns:
-            list: 匹配的记录列表
+            dict: (po, line, pn) -> 匹配的记录列表（先 wf_closed 后 non_wf_closed，各表内按 id 降序）
         """
+        results = {}
+        if not keys:
+            return results
+        
         conn = self.db_manager.get_connection()
         if not conn:
-            return []
+            raise Exception("数据库连接失败")
         
         try:
             cursor = conn.cursor()
             
-            # 在 wf_closed 和 non_wf_closed 表中查找
-            results = []
-            
-            for table_name in ['wf_closed', 'non_wf_closed']:
+            for table_name in CLOSED_TABLES:
+                table_keys = keys
+                line_type = sql.SQL('text')
+                if schema_cache.get_columns(table_name, cursor).get('line') == 'integer':
+                    # wf_closed.line 是整数列：无法转换为整数的 Line 不可能匹配，不传入查询
+                    table_keys = [key for key in keys if self._is_int4(key[1])]
+                    line_type = sql.SQL('integer')
+                if not table_keys:
+                    continue
+                
                 query = sql.SQL("""
-                    SELECT id, po_line, po, pn, tracking_no, record_no, qty
-                    FROM purchase_orders.{}
-                    WHERE po = %s AND line = %s AND pn = %s
-                    ORDER BY id DESC
-                """).format(sql.Identifier(table_name))
+                    SELECT k.po, k.line, k.pn, t.id, t.po_line, t.po, t.pn, t.tracking_no, t.record_no, t.qty
+                    FROM unnest(%s::text[], %s::text[], %s::text[]) AS k(po, line, pn)
+                    JOIN purchase_orders.{} t
+                      ON t.po = k.po AND t.line = k.line::{} AND t.pn = k.pn
+                    ORDER BY t.id DESC
+                """).format(sql.Identifier(table_name), line_type)
                 
-                cursor.execute(query, (po, line, material))
-                rows = cursor.fetchall()
+                pos, lines, pns = (list(column) for column in zip(*table_keys))
+                cursor.execute(query, (pos, lines, pns))
+                colnames = [desc[0] for desc in cursor.description[3:]]
                 
-                if rows:
-                    colnames = [desc[0] for desc in cursor.description]
-                    for row in rows:
-                        record = {colnames[i]: row[i] for i in range(len(colnames))}
-                        record['table'] = table_name
-                        results.append(record)
+                for row in cursor.fetchall():
+                    record = dict(zip(colnames, row[3:]))
+                    record['table'] = table_name
+                    results.setdefault(tuple(row[:3]), []).append(record)
             
             cursor.close()
-            conn.close()
             return results
-            
-        except Exception as e:
-            print(f"查询 closed 表失败: {e}")
-            if conn:
-                try:
-                    cursor.close()
-                    conn.close()
-                except:
-                    pass
-            return []
+        finally:
+            conn.close()
+    
+    def _is_int4(self, value):
+        """字符串能否作为 PostgreSQL integer 解析"""
+        value = value.strip()
+        return bool(INTEGER_PATTERN.match(value)) and INT4_MIN <= int(value) <= INT4_MAX
     
     def _extract_and_calculate_eta(self, record_no_str):
         """
@@ -285,7 +316,7 @@ class ReportSyncProcessor:
             return f"{month}/{day}/{year:02d}"
             
         except Exception as e:
-            print(f"[Report Sync] 提取 ETA 日期失败: {e}")
+            logger.warning("提取 ETA 日期失败: %s", e)
             return None
 
 
@@ -0,0 +1,92 @@
+"""
+PDF 异步导入任务路由
+提交任务后立即返回任务 id，客户端轮询或通过 SSE 获取进度和结果
+"""
+
+import json
+import os
+import time
+from flask import Blueprint, jsonify, request, Response, stream_with_context, g
+from backend.pdf_job_manager import get_pdf_job_manager, FINISHED_STATUSES
+
+# 创建蓝图
+pdf_job_bp = Blueprint('pdf_job', __name__, url_prefix='/api')
+
+# SSE 检查任务状态的间隔（秒）
+EVENT_POLL_INTERVAL = 0.5
+# SSE 无变化时发送保活注释的间隔（秒）
+EVENT_KEEPALIVE_INTERVAL = 15
+
+@pdf_job_bp.route('/pdf_jobs', methods=['POST'])
+def submit_pdf_job():
+    """提交PDF导入任务（表单字段 files 可包含多个PDF，或使用 file 上传单个PDF）"""
+    try:
+        files = request.files.getlist('files') or request.files.getlist('file')
+        company = request.form.get('company')
+        
+        # 从请求头获取用户邮箱
+        user_email = request.headers.get('X-User-Email') or getattr(g, 'current_user', {}).get('email')
+        
+        if not files or not company:
+            return jsonify({'success': False, 'error': '缺少文件或公司信息'}), 400
+        
+        manager = get_pdf_job_manager()
+        job_id, job_dir = manager.new_job_dir()
+        saved = []
+        for index, file in enumerate(files):
+            file_path = os.path.join(job_dir, f"{index}.pdf")
+            file.save(file_path)
+            saved.append((file.filename or f"{index}.pdf", file_path))
+        
+        success, result = manager.submit(job_id, company, saved, user_email)
+        if not success:
+            manager._cleanup(job_id)
+            return jsonify({'success': False, 'error': result}), 503
+        return jsonify({'success': True, 'job_id': job_id, 'job': result}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@pdf_job_bp.route('/pdf_jobs/<job_id>', methods=['GET'])
+def get_pdf_job(job_id):
+    """获取导入任务状态、进度和结果（完成后 result.files 中为每个文件的处理结果）"""
+    try:
+        job = get_pdf_job_manager().get_job(job_id)
+        if job is None:
+            return jsonify({'success': False, 'error': '导入任务不存在'}), 404
+        return jsonify({'success': True, 'job': json.loads(json.dumps(job, default=str))})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@pdf_job_bp.route('/pdf_jobs/<job_id>/events', methods=['GET'])
+def stream_pdf_job(job_id):
+    """以 Server-Sent Events 推送任务进度，任务完成后推送最终结果并结束"""
+    manager = get_pdf_job_manager()
+    try:
+        job = manager.get_job(job_id)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if job is None:
+        return jsonify({'success': False, 'error': '导入任务不存在'}), 404
+    
+    def generate(job):
+        last_sent = None
+        last_event_time = time.monotonic()
+        while True:
+            snapshot = (job['status'], json.dumps(job['progress'], sort_keys=True, default=str))
+            if snapshot != last_sent:
+                last_sent = snapshot
+                last_event_time = time.monotonic()
+                event = 'result' if job['status'] in FINISHED_STATUSES else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(job, default=str, ensure_ascii=False)}\n\n"
+            elif time.monotonic() - last_event_time >= EVENT_KEEPALIVE_INTERVAL:
+                last_event_time = time.monotonic()
+                yield ": keepalive\n\n"
+            if job['status'] in FINISHED_STATUSES:
+                return
+            time.sleep(EVENT_POLL_INTERVAL)
+            job = manager.get_job(job_id)
+            if job is None:
+                return
+    
+    return Response(stream_with_context(generate(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -42,6 +42,32 @@ def process_shipment():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@shipment_bp.route('/process_batch', methods=['POST'])
+def process_shipment_batch():
+    """
+    批量发货：整批在一个事务中处理
+    
+    请求体: {source_table, lines: [{po_line, shipment_qty}], tracking_no,
+             shipping_mode, shipping_cost, shipment_batch_no}
+    """
+    try:
+        data = request.json or {}
+        user_email = request.headers.get('X-User-Email', 'unknown@example.com')
+        
+        result = shipment_controller.process_shipment_batch(
+            source_table=data.get('source_table'),
+            lines=data.get('lines'),
+            user_email=user_email,
+            tracking_no=data.get('tracking_no'),
+            shipping_mode=data.get('shipping_mode'),
+            shipping_cost=data.get('shipping_cost'),
+            shipment_batch_no=data.get('shipment_batch_no')
+        )
+        
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @shipment_bp.route('/return', methods=['POST'])
 def return_shipment():
     """处理退货"""
@@ -61,3 +87,26 @@ def return_shipment():
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
+
+@shipment_bp.route('/return_batch', methods=['POST'])
+def return_shipment_batch():
+    """
+    批量退货：整批在一个事务中处理，运费只重新设置一次
+    
+    请求体: {closed_table, returns: [{record_id, return_qty}], new_shipping_cost, shipment_batch_no}
+    """
+    try:
+        data = request.json or {}
+        user_email = request.headers.get('X-User-Email', 'unknown@example.com')
+        
+        result = shipment_controller.return_shipment_batch(
+            closed_table=data.get('closed_table'),
+            returns=data.get('returns'),
+            user_email=user_email,
+            new_shipping_cost=data.get('new_shipping_cost'),
+            shipment_batch_no=data.get('shipment_batch_no')
+        )
+        
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
@@ -1,14 +1,20 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, send_file, Response, stream_with_context
 from backend.controllers.table_controller import TableController
 from backend.pdf_import_processor import PDFImportProcessor
 from backend.report_sync_processor import ReportSyncProcessor
+from backend.excel_sync_processor import ExcelSyncProcessor
 from backend.operation_logger import operation_logger
 from backend.models.database import get_db_manager
+from backend.models.table_export import EXPORT_FORMATS
 from backend.utils.jwt_utils import token_required
+from backend.utils.config import get_pdf_import_config, get_search_config
+from backend.utils.excel_utils import read_sheet_names
 import os
 import tempfile
 import io
 import json
+import shutil
+import zipfile
 
 # 创建蓝图
 table_bp = Blueprint('table', __name__, url_prefix='/api')
@@ -17,14 +23,148 @@ table_bp = Blueprint('table', __name__, url_prefix='/api')
 table_controller = TableController()
 pdf_processor = PDFImportProcessor()
 
+# 分页查询参数：出现任意一个时使用服务端分页
+PAGINATION_PARAMS = ('limit', 'cursor', 'sort', 'filters', 'search_column')
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+TRUE_VALUES = ('1', 'true', 'yes')
+
+def parse_table_query_args(args):
+    """
+    解析表查询参数
+
+    - filters: JSON 对象 {"列名": "值"}，多个条件 AND 组合（包含匹配，不区分大小写）
+    - search_column / search_value: 单列搜索（兼容旧参数，合并到 filters）
+    - sort: "列名:asc,列名:desc"，多列排序
+
+    Returns:
+        tuple: (filters, sort)
+
+    Raises:
+        ValueError: 参数格式无效
+    """
+    filters = {}
+    raw_filters = args.get('filters')
+    if raw_filters:
+        try:
+            filters = json.loads(raw_filters)
+        except ValueError:
+            raise ValueError('filters 参数必须是 JSON 对象')
+        if not isinstance(filters, dict):
+            raise ValueError('filters 参数必须是 JSON 对象')
+    if args.get('search_column') and args.get('search_value'):
+        filters[args.get('search_column')] = args.get('search_value')
+
+    sort = []
+    raw_sort = args.get('sort')
+    if raw_sort:
+        for part in raw_sort.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            column_name, _, direction = part.partition(':')
+            direction = (direction or 'asc').lower()
+            if direction not in ('asc', 'desc'):
+                raise ValueError(f'无效的排序方向: {direction}')
+            sort.append((column_name.strip(), direction))
+    return filters, sort
+
 @table_bp.route('/tables/<table_name>', methods=['GET'])
 def get_table_data(table_name):
-    """获取指定表的数据"""
-    result = table_controller.get_table_data(table_name)
+    """
+    获取指定表的数据
+
+    不带分页参数时返回整表（兼容旧前端）；带 limit/cursor/sort/filters 时使用
+    服务端 keyset 分页，返回 next_cursor 和总行数估算。
+    """
+    if not any(param in request.args for param in PAGINATION_PARAMS):
+        result = table_controller.get_table_data(table_name)
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 500
+
+    try:
+        filters, sort = parse_table_query_args(request.args)
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        if limit is None or limit <= 0:
+            raise ValueError('limit 必须是正整数')
+        limit = min(limit, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    result = table_controller.get_table_page(
+        table_name,
+        filters=filters,
+        sort=sort,
+        limit=limit,
+        cursor=request.args.get('cursor'),
+        exact_count=request.args.get('exact_count', 'false').strip().lower() in TRUE_VALUES
+    )
     if result['success']:
         return jsonify(result)
-    else:
-        return jsonify(result), 500
+    status = result.pop('status', 500)
+    return jsonify(result), status
+
+@table_bp.route('/tables/<table_name>/export', methods=['GET'])
+def export_table(table_name):
+    """
+    流式导出表数据
+
+    - format: ndjson（默认）、json、csv 或 xlsx
+    - filters / search_column / search_value / sort: 与表格分页查询相同
+    数据从服务端游标逐批读取并逐块写出（xlsx 先以只写模式写入临时文件），内存占用与表大小无关。
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f'不支持的导出格式: {export_format}'}), 400
+    try:
+        filters, sort = parse_table_query_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    result = table_controller.export_table(table_name, filters=filters, sort=sort)
+    if not result['success']:
+        status = result.pop('status', 500)
+        return jsonify(result), status
+
+    generate, mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(generate(result['columns'], result['rows'])),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{table_name}.{extension}"'}
+    )
+
+@table_bp.route('/search', methods=['GET'])
+def search_tables():
+    """
+    跨表搜索（wf_open、wf_closed、non_wf_open、non_wf_closed）
+
+    - q: 搜索词（至少 3 个字符），匹配 PO、PN、PO/Line、描述和 tracking_no
+    - tables: 逗号分隔的表名，默认全部四个表
+    - limit: 最多返回的结果数
+    结果按得分排序，每条包含表名、主键（open 表为 po_line，closed 表为 id）、匹配列和匹配类型。
+    """
+    config = get_search_config()
+    try:
+        limit = request.args.get('limit', config['default_limit'], type=int)
+        if limit is None or limit <= 0:
+            raise ValueError('limit 必须是正整数')
+        limit = min(limit, config['max_limit'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    tables = [t.strip() for t in request.args.get('tables', '').split(',') if t.strip()]
+    result = table_controller.search(
+        request.args.get('q', ''),
+        tables=tables,
+        limit=limit,
+        similarity_threshold=config['similarity_threshold']
+    )
+    if result['success']:
+        return jsonify(result)
+    status = result.pop('status', 500)
+    return jsonify(result), status
 
 @table_bp.route('/tables/<table_name>/check_duplicates', methods=['POST'])
 def check_duplicates(table_name):
@@ -96,6 +236,81 @@ def process_pdf():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def save_batch_uploads(files, target_dir):
+    """
+    保存批量上传的PDF文件，zip 压缩包中的PDF会被解压
+
+    Returns:
+        list: [(文件名, 保存路径)]
+    """
+    saved = []
+    for file in files:
+        filename = file.filename or ''
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                for member in archive.infolist():
+                    member_name = member.filename
+                    if member.is_dir() or not member_name.lower().endswith('.pdf'):
+                        continue
+                    if os.path.basename(member_name).startswith('._') or member_name.startswith('__MACOSX/'):
+                        continue
+                    # 不使用压缩包中的路径，避免写出目标目录
+                    file_path = os.path.join(target_dir, f"{len(saved)}.pdf")
+                    with archive.open(member) as src, open(file_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    saved.append((member_name, file_path))
+        else:
+            file_path = os.path.join(target_dir, f"{len(saved)}.pdf")
+            file.save(file_path)
+            saved.append((filename, file_path))
+    return saved
+
+@table_bp.route('/process_pdf_batch', methods=['POST'])
+def process_pdf_batch():
+    """
+    批量处理上传的PDF文件（多个PDF或zip压缩包）
+
+    以 NDJSON 流式返回：每个文件解析完成时返回一行 {"event": "file", ...}，
+    最后返回一行 {"event": "summary", ...}，包含合并后的数据、重复检查结果，
+    insert=true 时还包含批量插入结果。
+    """
+    files = request.files.getlist('files') or request.files.getlist('file')
+    company = request.form.get('company')
+    insert = request.form.get('insert', 'false').lower() == 'true'
+    
+    # 从请求头获取用户邮箱
+    user_email = request.headers.get('X-User-Email', 'pdf_importer@example.com')
+    
+    if not files or not company:
+        return jsonify({'success': False, 'error': '缺少文件或公司信息'}), 400
+    
+    tmp_dir = tempfile.mkdtemp(prefix='pdf_batch_')
+    try:
+        pdf_files = save_batch_uploads(files, tmp_dir)
+    except zipfile.BadZipFile as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return jsonify({'success': False, 'error': f'无效的压缩包: {e}'}), 400
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    max_files = get_pdf_import_config()['max_files']
+    if not pdf_files or len(pdf_files) > max_files:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return jsonify({'success': False, 'error': f'PDF文件数量必须在1到{max_files}之间'}), 400
+    
+    def generate():
+        try:
+            for event in pdf_processor.process_pdf_batch(pdf_files, company, insert=insert, user_email=user_email):
+                yield json.dumps(event, default=str, ensure_ascii=False) + '\n'
+        except Exception as e:
+            yield json.dumps({'event': 'summary', 'success': False, 'error': str(e)}, ensure_ascii=False) + '\n'
+        finally:
+            # 删除临时文件
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @table_bp.route('/insert_data/<table_name>', methods=['POST'])
 def insert_data(table_name):
     """插入数据到指定表"""
@@ -117,18 +332,49 @@ def update_row(table_name):
     """更新表中的数据"""
     try:
         # 从查询参数或请求体中获取主键值
-        pn = request.args.get('key') or request.json.get('key')
-        if not pn:
+        key = request.args.get('key') or request.json.get('key')
+        if not key:
             return jsonify({'success': False, 'error': '缺少key参数'}), 400
         
         # 获取请求数据，并移除key字段（因为key不是要更新的列）
         updates = request.json.copy() if request.json else {}
         updates.pop('key', None)  # 移除key参数，避免尝试更新key列
+        # key_field 指定key对应的列（默认为表的主键：open表po_line，closed表id）
+        key_field = request.args.get('key_field') or updates.get('key_field')
+        updates.pop('key_field', None)
+        # row_version 是读取时的版本号（乐观并发检查），不是要更新的列
+        expected_version = updates.pop('row_version', None)
         
         # 从请求头获取用户邮箱
         user_email = request.headers.get('X-User-Email', 'unknown@example.com')
-        result = table_controller.update_row(table_name, pn, updates, user_email)
-        return jsonify(result)
+        result = table_controller.update_row(
+            table_name, key, updates, user_email, expected_version, key_field
+        )
+        status = result.pop('status', 200)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@table_bp.route('/tables/<table_name>', methods=['PATCH'])
+def bulk_update_rows(table_name):
+    """
+    批量修改多行（一个事务）
+    
+    请求体: {rows: [{key, changes: {列: 值}, row_version}], atomic: false}
+    open 表的 key 为 po_line，closed 表为 id；atomic 为 true 时任一行失败则整批回滚。
+    返回每行的结果（成功时包含新的 row_version，版本冲突时 conflict 为 true）。
+    """
+    try:
+        data = request.json or {}
+        user_email = request.headers.get('X-User-Email', 'unknown@example.com')
+        result = table_controller.bulk_update_rows(
+            table_name,
+            data.get('rows'),
+            user_email,
+            atomic=bool(data.get('atomic', False))
+        )
+        status = result.pop('status', 200)
+        return jsonify(result), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -153,8 +399,10 @@ def delete_row(table_name, key):
         user_email = request.headers.get('X-User-Email', 'unknown@example.com')
         # 从查询参数获取关键字段名，如果没有则默认为 'pn'
         key_field = request.args.get('key_field', 'pn')
-        result = table_controller.delete_row(table_name, key, user_email, key_field)
-        return jsonify(result)
+        expected_version = request.args.get('row_version', type=int)
+        result = table_controller.delete_row(table_name, key, user_email, key_field, expected_version)
+        status = result.pop('status', 200)
+        return jsonify(result), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -172,8 +420,9 @@ def delete_row_by_body(table_name):
         if not key:
             return jsonify({'success': False, 'message': '缺少删除键值'}), 400
         
-        result = table_controller.delete_row(table_name, key, user_email, key_field)
-        return jsonify(result)
+        result = table_controller.delete_row(table_name, key, user_email, key_field, data.get('row_version'))
+        status = result.pop('status', 200)
+        return jsonify(result), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -302,10 +551,8 @@ def detect_excel_sheets():
             tmp_file_path = tmp_file.name
         
         try:
-            # 检测工作表
-            from openpyxl import load_workbook
-            wb = load_workbook(tmp_file_path)
-            sheet_names = wb.sheetnames
+            # 只读取工作簿清单中的工作表名称，不加载工作表内容
+            sheet_names = read_sheet_names(tmp_file_path)
             
             print(f"[Excel Detect] 检测到工作表: {sheet_names}")
             
@@ -315,6 +562,10 @@ def detect_excel_sheets():
                 'file_name': file.filename
             })
         
+        except ValueError as invalid_e:
+            print(f"[Excel Detect] 无效文件: {str(invalid_e)}")
+            return jsonify({'success': False, 'error': str(invalid_e)}), 400
+        
         except Exception as inner_e:
             print(f"[Excel Detect] 检测失败: {str(inner_e)}")
             import traceback
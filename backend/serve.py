@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生产模式启动入口
+先在主进程中执行一次 init_db.py 的迁移，再以 gunicorn 多进程（可多线程）运行 backend.web_app:app。
+每个工作进程使用自己的数据库连接池，并在启动后恢复未完成的 PDF 导入任务。
+
+用法:
+    python -m backend.serve [--no-init-db]
+
+配置见 backend/utils/config.py 的 get_server_config()（WEB_WORKERS、WEB_THREADS 等环境变量）。
+发送 HUP 信号可平滑重载工作进程，TERM 信号平滑停止。
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+# 添加项目根目录到Python路径，以便导入 init_db 和 backend 模块
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from gunicorn.app.base import BaseApplication
+
+from backend.utils.config import get_server_config
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger('backend.serve')
+
+# 是否在工作进程启动后恢复未完成的 PDF 导入任务（由 main() 根据 PDF_JOB_RECOVER 设置）
+_recover_pdf_jobs = False
+
+
+def post_fork(server, worker):
+    """工作进程 fork 后丢弃从主进程继承的连接池，在本进程内重新创建"""
+    from backend.utils.db_pool import reset_pool
+    reset_pool()
+
+
+def post_worker_init(worker):
+    """工作进程初始化完成后恢复未完成的 PDF 导入任务（任务领取是原子的，多个进程不会重复执行）"""
+    if _recover_pdf_jobs:
+        from backend.pdf_job_manager import get_pdf_job_manager
+        threading.Thread(target=lambda: get_pdf_job_manager().recover(), daemon=True).start()
+
+
+class WebApplication(BaseApplication):
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from backend.web_app import app
+        return app
+
+
+def build_options(config=None):
+    """将服务配置转换为 gunicorn 配置项"""
+    config = config or get_server_config()
+    return {
+        'bind': config['bind'],
+        'workers': config['workers'],
+        'threads': config['threads'],
+        'worker_class': 'gthread' if config['threads'] > 1 else 'sync',
+        'keepalive': config['keepalive'],
+        'timeout': config['timeout'],
+        'graceful_timeout': config['graceful_timeout'],
+        'max_requests': config['max_requests'],
+        'max_requests_jitter': config['max_requests_jitter'],
+        'preload_app': config['preload_app'],
+        'accesslog': None,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+    }
+
+
+def run_init_db():
+    """在 fork 工作进程之前执行一次数据库迁移"""
+    import init_db
+    return init_db.main()
+
+
+def main(argv=None):
+    global _recover_pdf_jobs
+    parser = argparse.ArgumentParser(description="以 gunicorn 运行 Proto-SAP 后端")
+    parser.add_argument('--no-init-db', action='store_true', help="跳过启动前的数据库迁移")
+    args = parser.parse_args(argv)
+
+    if not args.no_init_db and not run_init_db():
+        logger.error("数据库初始化失败，停止启动")
+        return 1
+
+    # 任务恢复改在每个工作进程初始化后执行，避免预加载应用时在主进程中执行任务
+    _recover_pdf_jobs = os.getenv('PDF_JOB_RECOVER', 'true').lower() == 'true'
+    os.environ['PDF_JOB_RECOVER'] = 'false'
+
+    options = build_options()
+    logger.info("启动 gunicorn: bind=%s, workers=%d, threads=%d",
+                options['bind'], options['workers'], options['threads'])
+    WebApplication(options).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,4 +20,98 @@ def get_app_config():
         'host': os.getenv('APP_HOST', '127.0.0.1'),
         'port': int(os.getenv('APP_PORT', '5000')),
         'debug': os.getenv('APP_DEBUG', 'True').lower() == 'true'
-    }
\ No newline at end of file
+    }
+
+def get_pool_config():
+    """获取数据库连接池配置"""
+    return {
+        'min_size': int(os.getenv('DB_POOL_MIN', '1')),
+        'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+        # 等待可用连接的最长时间（秒）
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        # 超出最小连接数的空闲连接在空闲多久后被回收（秒，0 表示不回收）
+        'idle_timeout': float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+        # 空闲超过该时间的连接在借出前执行一次 SELECT 1（秒）
+        'health_check_interval': float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30')),
+        # 连接的最长生命周期（秒，0 表示不限制）
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+        # 计算 p50/p95/p99 时保留的最近样本数
+        'metrics_window': int(os.getenv('DB_POOL_METRICS_WINDOW', '1000'))
+    }
+
+def get_pdf_import_config():
+    """获取PDF批量导入配置"""
+    return {
+        # 并行解析PDF的进程数（默认CPU核数）
+        'workers': int(os.getenv('PDF_IMPORT_WORKERS', str(os.cpu_count() or 1))),
+        # 单次批量导入最多接受的PDF文件数
+        'max_files': int(os.getenv('PDF_IMPORT_MAX_FILES', '500')),
+        # 异步导入任务的工作线程数
+        'job_workers': int(os.getenv('PDF_JOB_WORKERS', '2')),
+        # 本进程最多排队（含执行中）的任务数，超过时拒绝提交
+        'job_max_pending': int(os.getenv('PDF_JOB_MAX_PENDING', '50')),
+        # 执行中的任务超过该时间（秒）未更新进度，视为进程已退出，重新排队
+        'job_stale_seconds': int(os.getenv('PDF_JOB_STALE_SECONDS', '300')),
+        # 进度写入数据库的最小间隔（秒）
+        'job_progress_interval': float(os.getenv('PDF_JOB_PROGRESS_INTERVAL', '1')),
+        # PDF解析结果缓存目录（为空时禁用缓存）
+        'cache_dir': os.getenv('PDF_CACHE_DIR', os.path.join('uploads', 'pdf_cache')),
+        # PDF解析结果缓存总大小上限（MB，超过时淘汰最久未访问的条目）
+        'cache_max_bytes': int(float(os.getenv('PDF_CACHE_MAX_MB', '256')) * 1024 * 1024)
+    }
+
+def get_logging_config():
+    """获取日志配置"""
+    return {
+        # 默认日志级别
+        'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+        # 按模块设置级别，例如 "backend.db_pdf_processor=DEBUG,backend.web_app=WARNING"
+        'module_levels': os.getenv('LOG_LEVELS', ''),
+        # 输出格式：text 或 json（每行一个 JSON 对象）
+        'format': os.getenv('LOG_FORMAT', 'text').lower()
+    }
+
+def get_server_config():
+    """获取生产模式（gunicorn）服务配置"""
+    app_config = get_app_config()
+    return {
+        'bind': os.getenv('WEB_BIND', f"{app_config['host']}:{app_config['port']}"),
+        # 工作进程数（默认 2 * CPU核数 + 1）
+        'workers': int(os.getenv('WEB_WORKERS', str(2 * (os.cpu_count() or 1) + 1))),
+        # 每个工作进程的线程数（大于 1 时使用 gthread worker）
+        'threads': int(os.getenv('WEB_THREADS', '4')),
+        # HTTP keep-alive 等待时间（秒）
+        'keepalive': int(os.getenv('WEB_KEEPALIVE', '5')),
+        # 请求超时时间（秒），超时的工作进程会被重启
+        'timeout': int(os.getenv('WEB_TIMEOUT', '120')),
+        # 重载/停止时等待正在处理的请求完成的时间（秒）
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30')),
+        # 工作进程处理多少请求后平滑重启（0 表示不重启）
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', '0')),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS_JITTER', '0')),
+        # 是否在主进程中预加载应用（预加载后 HUP 重载不会重新加载代码）
+        'preload_app': os.getenv('WEB_PRELOAD', 'false').lower() == 'true'
+    }
+
+def get_operation_log_config():
+    """获取操作日志写入配置"""
+    return {
+        # 是否由后台线程批量写入操作日志（false 时每条日志同步写入）
+        'async': os.getenv('OPLOG_ASYNC', 'true').lower() == 'true',
+        # 每批最多写入的日志条数
+        'batch_size': int(os.getenv('OPLOG_BATCH_SIZE', '200')),
+        # 后台线程等待凑满一批的最长时间（秒）
+        'flush_interval': float(os.getenv('OPLOG_FLUSH_INTERVAL', '0.5')),
+        # 内存队列最多缓存的日志条数，队列满时改为同步写入
+        'queue_size': int(os.getenv('OPLOG_QUEUE_SIZE', '10000'))
+    }
+
+def get_search_config():
+    """获取跨表搜索配置"""
+    return {
+        # 模糊匹配阈值（pg_trgm word_similarity，0~1，越大越严格）
+        'similarity_threshold': float(os.getenv('SEARCH_SIMILARITY_THRESHOLD', '0.4')),
+        # 默认/最多返回的结果数
+        'default_limit': int(os.getenv('SEARCH_DEFAULT_LIMIT', '20')),
+        'max_limit': int(os.getenv('SEARCH_MAX_LIMIT', '100'))
+    }
@@ -0,0 +1,472 @@
+"""
+数据库连接池
+进程内共享的 PostgreSQL 连接池：
+1. 最小/最大连接数可配置
+2. 借出时健康检查（空闲较久的连接先执行 SELECT 1）
+3. 回收长时间空闲的多余连接
+4. 提供上下文管理器 API，以及等待时间/借出耗时指标
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from backend.utils.config import get_db_config, get_pool_config
+from backend.utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """等待可用连接超时"""
+
+
+class PooledConnection:
+    """
+    连接池借出的连接代理
+
+    除 close() 外的所有属性都委托给底层 psycopg2 连接；
+    close() 不会真正断开连接，而是把连接归还给连接池，
+    因此原有的 `conn.close()` 写法无需修改即可复用连接。
+    """
+
+    def __init__(self, pool, raw_connection):
+        self._pool = pool
+        self._raw = raw_connection
+        self._released = False
+
+    @property
+    def raw(self):
+        """底层 psycopg2 连接（用于需要原生连接对象的 API）"""
+        return self._raw
+
+    @property
+    def closed(self):
+        if self._released:
+            return 1
+        return self._raw.closed
+
+    def close(self):
+        """归还连接到连接池"""
+        if self._released:
+            return
+        self._released = True
+        self._pool.putconn(self._raw)
+
+    def __getattr__(self, name):
+        if self._released:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self._raw.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._raw.__exit__(exc_type, exc_value, traceback)
+
+    def __del__(self):
+        # 调用方忘记 close() 时，避免连接泄漏。
+        # 终结器可能在持有连接池锁的线程中运行，不能在这里调用 putconn()（锁不可重入），
+        # 只把连接放入待归还队列，由下一次借出时归还
+        if not self._released:
+            self._released = True
+            self._pool._orphaned.append(self._raw)
+
+
+class ConnectionPool:
+    """线程安全的 PostgreSQL 连接池"""
+
+    def __init__(self, db_config=None, min_size=None, max_size=None, timeout=None,
+                 idle_timeout=None, health_check_interval=None, max_lifetime=None):
+        pool_config = get_pool_config()
+        self.db_config = db_config or get_db_config()
+        self.min_size = pool_config['min_size'] if min_size is None else min_size
+        self.max_size = pool_config['max_size'] if max_size is None else max_size
+        self.timeout = pool_config['timeout'] if timeout is None else timeout
+        self.idle_timeout = pool_config['idle_timeout'] if idle_timeout is None else idle_timeout
+        self.health_check_interval = (pool_config['health_check_interval']
+                                      if health_check_interval is None else health_check_interval)
+        self.max_lifetime = pool_config['max_lifetime'] if max_lifetime is None else max_lifetime
+
+        if self.max_size < 1:
+            raise ValueError("max_size 必须大于 0")
+        if self.min_size > self.max_size:
+            self.min_size = self.max_size
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # 空闲连接: (connection, 归还时间)，后进先出以便多余连接自然变为空闲并被回收
+        self._idle = []
+        # 所有由本池创建的连接: id(conn) -> 创建时间
+        self._created_at = {}
+        self._pid = os.getpid()
+        self._closed = False
+        # 未 close() 就被回收的代理留下的连接（deque.append 无需加锁，可在终结器中调用）
+        self._orphaned = deque()
+
+        # 指标
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'health_check_failures': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'total_checkout_ms': 0.0,
+            'max_checkout_ms': 0.0,
+        }
+        self._checkout_samples = deque(maxlen=pool_config['metrics_window'])
+        self._wait_samples = deque(maxlen=pool_config['metrics_window'])
+
+    # ------------------------------------------------------------------
+    # 内部工具
+    # ------------------------------------------------------------------
+    def _discard(self, connection):
+        """关闭并移除一个连接（需持有锁）"""
+        self._created_at.pop(id(connection), None)
+        self._metrics['connections_closed'] += 1
+        try:
+            if not connection.closed:
+                connection.close()
+        except Exception:
+            pass
+
+    def _check_fork(self):
+        """
+        子进程（例如 WSGI worker fork 之后）不能复用父进程的连接：
+        直接丢弃引用，不调用 close()，避免断开父进程仍在使用的 socket
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._created_at = {}
+            self._orphaned = deque()
+
+    def _is_expired(self, connection, now):
+        created = self._created_at.get(id(connection))
+        return bool(self.max_lifetime) and created is not None and now - created > self.max_lifetime
+
+    def _is_healthy(self, connection, idle_since, now):
+        """
+        借出前的健康检查：已关闭的连接直接淘汰，空闲较久的连接执行 SELECT 1
+        （在锁外调用，网络往返不阻塞其他线程借出/归还）
+        """
+        if connection.closed:
+            return False
+        if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if now - idle_since < self.health_check_interval:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            connection.rollback()
+            return True
+        except Exception:
+            with self._lock:
+                self._metrics['health_check_failures'] += 1
+            return False
+
+    def _return_orphans(self):
+        """归还终结器放入待归还队列的连接（不持有锁时调用）"""
+        while True:
+            try:
+                connection = self._orphaned.popleft()
+            except IndexError:
+                return
+            self.putconn(connection)
+
+    def _reset_connection(self, connection):
+        """归还前回滚未完成的事务（锁外执行），返回连接是否可以复用"""
+        if connection.closed:
+            return False
+        try:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if connection.autocommit:
+                connection.autocommit = False
+            return True
+        except Exception:
+            return False
+
+    def _reap_idle_locked(self, now):
+        """回收超出 min_size 且空闲超过 idle_timeout 的连接（需持有锁）"""
+        if not self.idle_timeout:
+            return
+        kept = []
+        # self._idle 按归还时间递增排列，最旧的在前面
+        excess = len(self._created_at) - self.min_size
+        for connection, idle_since in self._idle:
+            if excess > 0 and now - idle_since > self.idle_timeout:
+                self._discard(connection)
+                excess -= 1
+            else:
+                kept.append((connection, idle_since))
+        self._idle = kept
+
+    def _record_checkout(self, wait_ms, checkout_ms, waited):
+        metrics = self._metrics
+        metrics['checkouts'] += 1
+        if waited:
+            metrics['waits'] += 1
+        metrics['total_wait_ms'] += wait_ms
+        metrics['max_wait_ms'] = max(metrics['max_wait_ms'], wait_ms)
+        metrics['total_checkout_ms'] += checkout_ms
+        metrics['max_checkout_ms'] = max(metrics['max_checkout_ms'], checkout_ms)
+        self._wait_samples.append(wait_ms)
+        self._checkout_samples.append(checkout_ms)
+
+    # ------------------------------------------------------------------
+    # 公共 API
+    # ------------------------------------------------------------------
+    def getconn(self):
+        """
+        借出一个原生连接，使用完毕后必须调用 putconn() 归还
+
+        Raises:
+            PoolTimeoutError: 在 timeout 秒内没有可用连接
+            psycopg2.OperationalError: 新建连接失败
+        """
+        self._return_orphans()
+        start = time.monotonic()
+        deadline = start + self.timeout if self.timeout else None
+        waited = False
+        wait_ms = 0.0
+
+        while True:
+            connection = None
+            with self._available:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                self._check_fork()
+
+                while True:
+                    now = time.monotonic()
+                    # 优先复用空闲连接（最近归还的连接最“热”）
+                    if self._idle:
+                        connection, idle_since = self._idle.pop()
+                        break
+
+                    if len(self._created_at) < self.max_size:
+                        # 先占位再在锁外建立连接，避免握手期间阻塞其他线程
+                        placeholder = object()
+                        self._created_at[id(placeholder)] = now
+                        break
+
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"等待数据库连接超时（{self.timeout}s，最大连接数 {self.max_size}）"
+                        )
+                    waited = True
+                    wait_start = time.monotonic()
+                    self._available.wait(remaining)
+                    wait_ms += (time.monotonic() - wait_start) * 1000
+
+            if connection is None:
+                break
+
+            # 取出的空闲连接仍计入 _created_at，健康检查在锁外执行
+            now = time.monotonic()
+            if not self._is_expired(connection, now) and self._is_healthy(connection, idle_since, now):
+                with self._available:
+                    checkout_ms = (time.monotonic() - start) * 1000
+                    self._record_checkout(wait_ms, checkout_ms, waited)
+                return connection
+            with self._available:
+                self._discard(connection)
+                self._available.notify()
+
+        try:
+            connection = psycopg2.connect(**self.db_config)
+        except Exception:
+            with self._available:
+                self._created_at.pop(id(placeholder), None)
+                self._available.notify()
+            raise
+
+        with self._available:
+            self._created_at.pop(id(placeholder), None)
+            self._created_at[id(connection)] = time.monotonic()
+            self._metrics['connections_created'] += 1
+            checkout_ms = (time.monotonic() - start) * 1000
+            self._record_checkout(wait_ms, checkout_ms, waited)
+        return connection
+
+    def putconn(self, connection):
+        """归还连接：回滚未完成的事务，损坏的连接直接丢弃"""
+        if self._pid != os.getpid():
+            # fork 之前借出的连接不归还给子进程的池
+            return
+        if id(connection) not in self._created_at:
+            return
+
+        # 回滚等网络操作在锁外执行
+        reusable = self._reset_connection(connection)
+
+        with self._available:
+            if self._pid != os.getpid() or id(connection) not in self._created_at:
+                return
+            now = time.monotonic()
+            if reusable and not self._closed and not self._is_expired(connection, now):
+                self._idle.append((connection, now))
+            else:
+                self._discard(connection)
+
+            self._reap_idle_locked(now)
+            self._available.notify()
+
+    def get_connection(self):
+        """借出一个连接代理，调用其 close() 即归还给连接池"""
+        return PooledConnection(self, self.getconn())
+
+    @contextmanager
+    def connection(self):
+        """
+        上下文管理器：借出连接，正常退出时提交，异常时回滚，最后归还
+
+        用法:
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                ...
+        """
+        connection = self.getconn()
+        try:
+            yield connection
+            if not connection.closed:
+                connection.commit()
+        except Exception:
+            if not connection.closed:
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+            raise
+        finally:
+            self.putconn(connection)
+
+    def reap_idle(self):
+        """手动触发一次空闲连接回收"""
+        self._return_orphans()
+        with self._available:
+            self._check_fork()
+            self._reap_idle_locked(time.monotonic())
+
+    def close_all(self):
+        """关闭连接池中的所有空闲连接，并拒绝后续借出"""
+        with self._available:
+            self._closed = True
+            for connection, _ in self._idle:
+                self._discard(connection)
+            self._idle = []
+            self._available.notify_all()
+
+    def get_metrics(self):
+        """返回连接池状态与等待/借出耗时指标（毫秒）"""
+        def percentile(samples, pct):
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+            return round(ordered[index], 3)
+
+        with self._lock:
+            metrics = dict(self._metrics)
+            checkout_samples = list(self._checkout_samples)
+            wait_samples = list(self._wait_samples)
+            size = len(self._created_at)
+            idle = len(self._idle)
+
+        checkouts = metrics['checkouts'] or 1
+        return {
+            'pid': self._pid,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'size': size,
+            'idle': idle,
+            'in_use': size - idle,
+            'checkouts': metrics['checkouts'],
+            'waits': metrics['waits'],
+            'timeouts': metrics['timeouts'],
+            'connections_created': metrics['connections_created'],
+            'connections_closed': metrics['connections_closed'],
+            'health_check_failures': metrics['health_check_failures'],
+            'wait_ms': {
+                'avg': round(metrics['total_wait_ms'] / checkouts, 3),
+                'max': round(metrics['max_wait_ms'], 3),
+                'p50': percentile(wait_samples, 50),
+                'p95': percentile(wait_samples, 95),
+                'p99': percentile(wait_samples, 99),
+            },
+            'checkout_ms': {
+                'avg': round(metrics['total_checkout_ms'] / checkouts, 3),
+                'max': round(metrics['max_checkout_ms'], 3),
+                'p50': percentile(checkout_samples, 50),
+                'p95': percentile(checkout_samples, 95),
+                'p99': percentile(checkout_samples, 99),
+            },
+        }
+
+
+# 进程级共享连接池
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取进程内共享的连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_connection():
+    """从共享连接池借出连接，close() 即归还；失败时返回 None（与各管理类原有约定一致）"""
+    try:
+        return get_pool().get_connection()
+    except psycopg2.OperationalError as error:
+        logger.error("数据库连接操作错误: %s", error)
+        return None
+    except psycopg2.DatabaseError as error:
+        logger.error("数据库错误: %s", error)
+        return None
+    except Exception as error:
+        logger.error("数据库连接失败: %s", error)
+        return None
+
+
+@contextmanager
+def pooled_connection():
+    """共享连接池的上下文管理器 API，见 ConnectionPool.connection()"""
+    with get_pool().connection() as connection:
+        yield connection
+
+
+def get_pool_metrics():
+    """共享连接池的指标"""
+    return get_pool().get_metrics()
+
+
+def reset_pool():
+    """丢弃当前进程的连接池（例如 fork 之后），下次使用时重新创建"""
+    global _pool
+    with _pool_lock:
+        old_pool, _pool = _pool, None
+    if old_pool is not None and old_pool._pid == os.getpid():
+        old_pool.close_all()
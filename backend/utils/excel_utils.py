@@ -0,0 +1,48 @@
+"""
+Excel 文件工具
+"""
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+OFFICE_DOCUMENT_REL = '/officeDocument'
+DEFAULT_WORKBOOK_PART = 'xl/workbook.xml'
+
+
+def _local_name(tag):
+    """去掉 ElementTree 标签中的命名空间（兼容 transitional 和 strict 两种 OOXML 命名空间）"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _workbook_part(archive):
+    """从 _rels/.rels 中找到工作簿清单的位置，找不到时使用默认路径"""
+    try:
+        root = ET.fromstring(archive.read('_rels/.rels'))
+    except KeyError:
+        return DEFAULT_WORKBOOK_PART
+    for rel in root:
+        if rel.get('Type', '').endswith(OFFICE_DOCUMENT_REL) and rel.get('Target'):
+            return posixpath.normpath(rel.get('Target').lstrip('/'))
+    return DEFAULT_WORKBOOK_PART
+
+
+def read_sheet_names(path):
+    """
+    读取 xlsx 文件中的工作表名称（按工作簿中的顺序）
+
+    只解析压缩包中的工作簿清单（xl/workbook.xml），不加载任何工作表内容。
+
+    Raises:
+        ValueError: 文件不是有效的 xlsx 文件
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            root = ET.fromstring(archive.read(_workbook_part(archive)))
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        raise ValueError(f"不是有效的 xlsx 文件: {e}")
+
+    for element in root:
+        if _local_name(element.tag) == 'sheets':
+            return [sheet.get('name') for sheet in element if _local_name(sheet.tag) == 'sheet']
+    return []
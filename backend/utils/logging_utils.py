@@ -0,0 +1,117 @@
+"""
+日志工具
+统一配置后端日志：默认级别与按模块级别（LOG_LEVEL / LOG_LEVELS）、文本或 JSON 行格式（LOG_FORMAT），
+每条日志附带当前请求的 request id。热点路径的调试输出使用 logger.debug 并以 % 参数延迟格式化，
+默认级别下不产生任何输出开销。
+"""
+
+import contextvars
+import json
+import logging
+import sys
+import threading
+from datetime import datetime, timezone
+
+from backend.utils.config import get_logging_config
+
+# 当前请求的 request id（非请求上下文中为 None）
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+# LogRecord 的标准属性，JSON 格式中其余属性（logger.info(..., extra={...})）作为附加字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def set_request_id(request_id):
+    """设置当前上下文的 request id"""
+    return _request_id.set(request_id)
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """为每条日志附加 request_id 属性"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', '-')
+        if request_id != '-':
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _parse_module_levels(spec):
+    """解析 "module=LEVEL,module2=LEVEL" 格式的按模块级别"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(force=False):
+    """
+    根据环境变量配置日志（只执行一次，force=True 时重新配置）
+
+    日志输出到 stderr，由 "backend" 根 logger 统一处理。
+    """
+    global _configured
+    with _configure_lock:
+        if _configured and not force:
+            return
+        config = get_logging_config()
+
+        handler = logging.StreamHandler(sys.stderr)
+        handler.addFilter(RequestIdFilter())
+        if config['format'] == 'json':
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s'
+            ))
+
+        root = logging.getLogger('backend')
+        for old_handler in list(root.handlers):
+            root.removeHandler(old_handler)
+        root.addHandler(handler)
+        root.setLevel(config['level'])
+        root.propagate = False
+
+        for name, level in _parse_module_levels(config['module_levels']).items():
+            logging.getLogger(name).setLevel(level)
+        _configured = True
+
+
+def get_logger(name):
+    """获取模块 logger（首次调用时按环境变量完成配置）"""
+    setup_logging()
+    return logging.getLogger(name)
@@ -2,16 +2,24 @@ from flask import Flask, render_template, jsonify, request, g
 import psycopg2
 from psycopg2 import sql
 from config.env_db_config import get_db_config
-import hashlib
 import json
+import multiprocessing
 import os
+import threading
+import uuid
 from functools import wraps
 from backend.utils.jwt_utils import verify_token
+from backend.utils.db_pool import get_connection as get_pooled_connection, get_pool_metrics
+from backend.utils.logging_utils import get_logger, set_request_id, reset_request_id
 
 # 导入路由蓝图
 from backend.routes.table_routes import table_bp
 from backend.routes.user_routes import user_bp
 from backend.routes.shipment_routes import shipment_bp
+from backend.routes.pdf_job_routes import pdf_job_bp
+from backend.pdf_job_manager import get_pdf_job_manager
+
+logger = get_logger('backend.web_app')
 
 # 获取项目根目录
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -24,6 +32,12 @@ app = Flask(__name__, template_folder=template_dir, static_folder=static_dir, st
 app.register_blueprint(table_bp)
 app.register_blueprint(user_bp)
 app.register_blueprint(shipment_bp)
+app.register_blueprint(pdf_job_bp)
+
+# 重新排队上次退出时未完成的PDF导入任务
+# （PDF 解析进程以 spawn 启动，直接运行本文件时子进程会重新导入本模块，子进程中不恢复）
+if os.getenv('PDF_JOB_RECOVER', 'true').lower() == 'true' and multiprocessing.parent_process() is None:
+    threading.Thread(target=lambda: get_pdf_job_manager().recover(), daemon=True).start()
 
 # 数据库连接配置
 db_config = get_db_config()
@@ -55,13 +69,29 @@ def token_required(f):
     
     return decorated
 
+# 为每个请求分配 request id（优先使用上游传入的 X-Request-ID），写入日志并在响应头中返回
+@app.before_request
+def assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_id_token = set_request_id(g.request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+@app.teardown_request
+def clear_request_id(exc=None):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        reset_request_id(token)
+
 # 在所有请求之前检查认证（除了特定的公开路由）
 @app.before_request
 def check_authentication():
-    # 添加调试信息
-    print(f"请求路径: {request.path}")
-    print(f"请求方法: {request.method}")
-    print(f"请求端点: {request.endpoint}")
+    logger.debug("请求: %s %s (endpoint=%s)", request.method, request.path, request.endpoint)
     
     # 公开路由不需要认证
     public_routes = [
@@ -88,7 +118,6 @@ def check_authentication():
     
     # 对于其他API路由，需要认证
     if request.path.startswith('/api/'):
-        print(f"API路由需要认证: {request.path}")
         token = None
         
         # 从请求头中获取token
@@ -98,36 +127,25 @@ def check_authentication():
                 # 期望格式: Bearer <token>
                 token = auth_header.split(" ")[1]
             except IndexError:
-                print("Token格式错误")
+                logger.info("Token格式错误: %s", request.path)
                 return jsonify({'success': False, 'error': 'Token格式错误'}), 401
         
         if not token:
-            print("缺少Token")
+            logger.info("缺少Token: %s", request.path)
             return jsonify({'success': False, 'error': '缺少Token'}), 401
         
         success, result = verify_token(token)
         if not success:
-            print(f"Token验证失败: {result}")
+            logger.info("Token验证失败: %s", result)
             return jsonify({'success': False, 'error': result}), 401
         
         # 将用户信息存储在全局变量中
         g.current_user = result
-        print(f"认证成功，用户: {result}")
+        logger.debug("认证成功，用户: %s", result.get('email') if isinstance(result, dict) else result)
 
 def get_db_connection():
-    """获取数据库连接"""
-    try:
-        connection = psycopg2.connect(**db_config)
-        return connection
-    except Exception as error:
-        print(f"数据库连接失败: {error}")
-        return None
-
-def generate_row_hash(row_data):
-    """为行数据生成哈希值用于版本控制"""
-    # 将行数据转换为字符串并生成哈希
-    row_str = str(sorted(row_data.items()))
-    return hashlib.md5(row_str.encode()).hexdigest()
+    """从共享连接池获取数据库连接（close() 即归还连接池）"""
+    return get_pooled_connection()
 
 @app.route('/')
 def index():
@@ -159,6 +177,14 @@ def change_password():
     """修改密码页面"""
     return render_template('change_password.html')
 
+@app.route('/api/metrics/db_pool')
+def db_pool_metrics():
+    """数据库连接池指标（连接数、等待时间、借出耗时）"""
+    try:
+        return jsonify({'success': True, 'data': get_pool_metrics()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # 所有 /api/tables 相关的路由由蓝图处理，不在此处定义
 # 避免路由冲突
 
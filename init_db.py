@@ -5,8 +5,10 @@
 用于创建采购订单管理系统所需的数据库表
 """
 
+import argparse
 import psycopg2
 import os
+import sys
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -398,6 +400,339 @@ def create_po_records_table(cursor):
     except Exception as e:
         print(f"✗ 创建操作记录表时出错: {e}")
 
+def add_wf_open_extra_columns(cursor):
+    """
+    为wf_open表添加chinese_name和unit列（早期版本的表没有这两列）
+    """
+    try:
+        cursor.execute("ALTER TABLE purchase_orders.wf_open ADD COLUMN IF NOT EXISTS chinese_name VARCHAR(100)")
+        cursor.execute("ALTER TABLE purchase_orders.wf_open ADD COLUMN IF NOT EXISTS unit VARCHAR(20)")
+        print("✓ wf_open表已经含有chinese_name和unit列")
+    except Exception as e:
+        print(f"✗ 添加chinese_name/unit列到wf_open表时出错: {e}")
+
+def create_pdf_import_jobs_table(cursor):
+    """创建PDF导入任务表（异步导入任务的状态、进度和结果）"""
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS purchase_orders.pdf_import_jobs (
+            id VARCHAR(36) PRIMARY KEY,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            company VARCHAR(100) NOT NULL,
+            user_email VARCHAR(255),
+            files JSONB NOT NULL,
+            progress JSONB,
+            result JSONB,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pdf_import_jobs_status ON purchase_orders.pdf_import_jobs(status)")
+        print("✓ 成功创建PDF导入任务表")
+    except Exception as e:
+        print(f"✗ 创建PDF导入任务表时出错: {e}")
+
+def widen_po_records_operation(cursor):
+    """
+    po_records.operation 扩展为 VARCHAR(50)
+    （发货日志的操作类型如 shipment_partial_shipment 超过 20 个字符）
+    """
+    try:
+        cursor.execute("ALTER TABLE purchase_orders.po_records ALTER COLUMN operation TYPE VARCHAR(50)")
+        print("✓ po_records.operation 已扩展为 VARCHAR(50)")
+    except Exception as e:
+        print(f"✗ 扩展po_records.operation列时出错: {e}")
+
+def create_closed_lookup_indexes(cursor):
+    """closed表添加 (po, line, pn) 复合索引（报表同步按这三列批量查找记录）"""
+    try:
+        for table_name in ('wf_closed', 'non_wf_closed'):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table_name}_po_line_pn "
+                f"ON purchase_orders.{table_name} (po, line, pn)"
+            )
+        print("✓ 成功创建closed表 (po, line, pn) 索引")
+    except Exception as e:
+        print(f"✗ 创建closed表 (po, line, pn) 索引时出错: {e}")
+
+def add_row_version_columns(cursor):
+    """
+    采购订单表添加 row_version 列和自增触发器（乐观并发控制）
+    每次 UPDATE 时触发器将 row_version 加 1，更新/删除时用 WHERE row_version = %s 检测冲突
+    """
+    try:
+        cursor.execute("""
+        CREATE OR REPLACE FUNCTION purchase_orders.bump_row_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.row_version = OLD.row_version + 1;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        for table_name in ('wf_open', 'wf_closed', 'non_wf_open', 'non_wf_closed'):
+            cursor.execute(
+                f"ALTER TABLE purchase_orders.{table_name} "
+                f"ADD COLUMN IF NOT EXISTS row_version INTEGER NOT NULL DEFAULT 1"
+            )
+            cursor.execute(f"DROP TRIGGER IF EXISTS bump_{table_name}_row_version ON purchase_orders.{table_name}")
+            cursor.execute(f"""
+            CREATE TRIGGER bump_{table_name}_row_version
+            BEFORE UPDATE ON purchase_orders.{table_name}
+            FOR EACH ROW
+            EXECUTE FUNCTION purchase_orders.bump_row_version()
+            """)
+        print("✓ 成功添加 row_version 列和触发器")
+    except Exception as e:
+        print(f"✗ 添加 row_version 列时出错: {e}")
+
+def create_base_tables(cursor):
+    """创建采购订单表、用户表和操作记录表"""
+    create_wf_open_table(cursor)
+    create_wf_closed_table(cursor)
+    create_non_wf_open_table(cursor)
+    create_non_wf_closed_table(cursor)
+    create_users_table(cursor)
+    create_po_records_table(cursor)
+
+# 数据库迁移注册表: (版本号, 描述, 迁移函数)
+# 每个迁移只执行一次，执行后记录到 purchase_orders.schema_migrations。
+# 新的表结构变更请在末尾追加新版本，不要修改已发布的迁移。
+# 迁移函数都是幂等的，所以对没有迁移记录的旧数据库全部重新执行也是安全的。
+MIGRATIONS = [
+    (1, "创建基础表", create_base_tables),
+    (2, "closed表添加id和shipment_batch_no列", add_shipment_batch_no_column),
+    (3, "添加created_at和update_at列", add_timestamp_columns),
+    (4, "创建update_at触发器", create_update_timestamp_triggers),
+    (5, "wf_open表添加chinese_name和unit列", add_wf_open_extra_columns),
+    (6, "创建PDF导入任务表", create_pdf_import_jobs_table),
+    (7, "po_records.operation扩展为VARCHAR(50)", widen_po_records_operation),
+    (8, "closed表添加(po, line, pn)复合索引", create_closed_lookup_indexes),
+    (9, "添加row_version列和触发器", add_row_version_columns),
+]
+
+# 迁移期间持有的 advisory lock，避免多个进程（如多个 worker）同时迁移
+MIGRATION_LOCK_ID = 7316001
+
+def create_schema_migrations_table(cursor):
+    """创建迁移记录表"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS purchase_orders.schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def get_applied_migrations(cursor):
+    """获取已执行的迁移版本号"""
+    cursor.execute("SELECT version FROM purchase_orders.schema_migrations")
+    return set(row[0] for row in cursor.fetchall())
+
+def run_migrations(connection):
+    """
+    按版本顺序执行尚未执行的迁移，每个迁移单独提交
+
+    Returns:
+        bool: 所有迁移是否都执行成功
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        create_purchase_orders_schema(cursor)
+        create_schema_migrations_table(cursor)
+        connection.commit()
+
+        applied = get_applied_migrations(cursor)
+        pending = [m for m in MIGRATIONS if m[0] not in applied]
+        if not pending:
+            print(f"✓ 数据库结构已是最新版本 (v{max(applied) if applied else 0})")
+            return True
+
+        for version, description, migrate in pending:
+            print(f"→ 执行迁移 v{version}: {description}")
+            migrate(cursor)
+            # 迁移函数内部会捕获并打印错误，这里根据事务状态判断是否失败
+            if connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                connection.rollback()
+                print(f"✗ 迁移 v{version} 失败，停止执行后续迁移")
+                return False
+            cursor.execute(
+                "INSERT INTO purchase_orders.schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            connection.commit()
+            print(f"✓ 迁移 v{version} 完成")
+        return True
+    finally:
+        if connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            connection.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        connection.commit()
+        cursor.close()
+
+OPEN_TABLES = ('wf_open', 'non_wf_open')
+CLOSED_TABLES = ('wf_closed', 'non_wf_closed')
+
+# 表格视图中常用于 ILIKE 包含搜索的文本列（pg_trgm GIN 索引）
+TRGM_SEARCH_COLUMNS = {
+    'wf_open': ('po', 'pn', 'po_line', 'description'),
+    'non_wf_open': ('po', 'pn', 'po_line', 'description'),
+    'wf_closed': ('po', 'pn', 'po_line', 'description', 'tracking_no'),
+    'non_wf_closed': ('po', 'pn', 'po_line', 'description', 'tracking_no'),
+}
+
+# 索引注册表: (索引名, 表名, 类型 btree|trgm, 列)
+# 与迁移不同，每次启动都由 ensure_indexes() 检查并创建缺失的索引（幂等）。
+# 新的查询路径需要索引时在这里追加，并在 HOT_QUERIES 中加入对应查询供 --verify-indexes 检查。
+INDEX_DEFINITIONS = (
+    # 发货按 (po, pn) 查找 open 记录；按 pn 删除记录（delete_row 默认 key_field）；表格默认排序
+    [(f"idx_{t}_po_pn", t, 'btree', "po, pn") for t in OPEN_TABLES]
+    + [(f"idx_{t}_pn", t, 'btree', "pn") for t in OPEN_TABLES]
+    + [(f"idx_{t}_update_at_po_line", t, 'btree', "update_at DESC, po_line DESC") for t in OPEN_TABLES]
+    # 报表同步按 (po, line, pn) 查找 closed 记录（迁移 v8 已创建）；退货按批次重算运费
+    + [(f"idx_{t}_po_line_pn", t, 'btree', "po, line, pn") for t in CLOSED_TABLES]
+    + [(f"idx_{t}_shipment_batch_no", t, 'btree', "shipment_batch_no") for t in CLOSED_TABLES]
+    # 表格搜索/列过滤（column::text ILIKE '%value%'）
+    + [(f"idx_{t}_{c}_trgm", t, 'trgm', c) for t, columns in TRGM_SEARCH_COLUMNS.items() for c in columns]
+)
+
+# 需要索引支持的热点查询: (说明, SQL, 参数, 是否依赖 pg_trgm)
+HOT_QUERIES = (
+    [(f"发货查找 {t} (po, pn)", f"SELECT * FROM purchase_orders.{t} WHERE po = %s AND pn = %s",
+      ('PO', 'PN'), False) for t in OPEN_TABLES]
+    + [(f"按 pn 删除 {t}", f"DELETE FROM purchase_orders.{t} WHERE pn = %s",
+        ('PN',), False) for t in OPEN_TABLES]
+    + [(f"默认排序分页 {t}", f"SELECT * FROM purchase_orders.{t} ORDER BY update_at DESC, po_line DESC LIMIT 200",
+        (), False) for t in OPEN_TABLES]
+    + [(f"报表同步 {t} (po, line, pn)", f"SELECT * FROM purchase_orders.{t} WHERE po = %s AND line = %s AND pn = %s",
+        ('PO', '1', 'PN'), False) for t in CLOSED_TABLES]
+    + [(f"批次运费 {t}", f"SELECT * FROM purchase_orders.{t} WHERE shipment_batch_no = %s",
+        ('BATCH',), False) for t in CLOSED_TABLES]
+    + [(f"表格搜索 {t}.{c}", f"SELECT * FROM purchase_orders.{t} WHERE {c}::text ILIKE %s",
+        ('%abc%',), True) for t, columns in TRGM_SEARCH_COLUMNS.items() for c in columns]
+)
+
+def _index_statement(name, table_name, method, columns):
+    if method == 'trgm':
+        return (f"CREATE INDEX IF NOT EXISTS {name} ON purchase_orders.{table_name} "
+                f"USING gin ({columns} gin_trgm_ops)")
+    return f"CREATE INDEX IF NOT EXISTS {name} ON purchase_orders.{table_name} ({columns})"
+
+def _pg_trgm_installed(cursor):
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    return cursor.fetchone() is not None
+
+def enable_pg_trgm(cursor):
+    """启用 pg_trgm 扩展；扩展未安装或没有权限时返回 False，不影响其他索引"""
+    cursor.execute("SAVEPOINT enable_pg_trgm")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("RELEASE SAVEPOINT enable_pg_trgm")
+        return True
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT enable_pg_trgm")
+        print(f"⚠ pg_trgm 扩展不可用，跳过 trgm 索引: {e.diag.message_primary or e}")
+        return False
+
+def ensure_indexes(connection):
+    """
+    按 INDEX_DEFINITIONS 创建缺失的索引（每次启动执行，幂等）
+
+    Returns:
+        bool: 是否没有出错（pg_trgm 不可用而跳过的 trgm 索引不算出错）
+    """
+    cursor = connection.cursor()
+    try:
+        # 与迁移共用 advisory lock，避免多个进程同时建索引
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'purchase_orders'")
+        existing = set(row[0] for row in cursor.fetchall())
+        missing = [d for d in INDEX_DEFINITIONS if d[0] not in existing]
+        if not missing:
+            print(f"✓ 索引已是最新（{len(INDEX_DEFINITIONS)} 个）")
+            return True
+
+        trgm_available = True
+        if any(method == 'trgm' for _, _, method, _ in missing):
+            trgm_available = enable_pg_trgm(cursor)
+
+        success = True
+        for name, table_name, method, columns in missing:
+            if method == 'trgm' and not trgm_available:
+                continue
+            cursor.execute("SAVEPOINT ensure_index")
+            try:
+                cursor.execute(_index_statement(name, table_name, method, columns))
+                cursor.execute("RELEASE SAVEPOINT ensure_index")
+                print(f"✓ 创建索引 {name}")
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT ensure_index")
+                print(f"✗ 创建索引 {name} 时出错: {e.diag.message_primary or e}")
+                success = False
+        return success
+    finally:
+        connection.commit()
+        cursor.close()
+
+def _seq_scans(plan):
+    """返回执行计划中所有顺序扫描的表名"""
+    tables = []
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        tables.extend(_seq_scans(child))
+    return tables
+
+def verify_indexes(connection):
+    """
+    对 HOT_QUERIES 逐个执行 EXPLAIN，检查是否都能使用索引
+
+    测试库的数据量通常很小，规划器会直接选择顺序扫描，所以检查时禁用顺序扫描：
+    禁用后仍出现顺序扫描，说明没有可用的索引。
+
+    Returns:
+        bool: 所有查询是否都能使用索引
+    """
+    cursor = connection.cursor()
+    failed = []
+    try:
+        trgm_installed = _pg_trgm_installed(cursor)
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        for description, query, params, needs_trgm in HOT_QUERIES:
+            if needs_trgm and not trgm_installed:
+                print(f"- 跳过 {description}（pg_trgm 扩展未安装）")
+                continue
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            seq_scans = _seq_scans(plan)
+            if seq_scans:
+                failed.append(description)
+                print(f"✗ {description}: 顺序扫描 {', '.join(seq_scans)}")
+            else:
+                print(f"✓ {description}: {plan['Node Type']}")
+    finally:
+        connection.rollback()
+        cursor.close()
+
+    if failed:
+        print(f"✗ {len(failed)} 个查询没有可用的索引")
+        return False
+    print("✓ 所有热点查询都能使用索引")
+    return True
+
+def run_verify_indexes():
+    """--verify-indexes 入口"""
+    connection = psycopg2.connect(**get_db_config())
+    try:
+        return verify_indexes(connection)
+    finally:
+        connection.close()
+
 def main():
     """主函数"""
     print("开始初始化数据库...")
@@ -418,19 +753,16 @@ def main():
             print("✓ 成功连接到数据库")
             print()
             
-            # 创建模式和表
-            create_purchase_orders_schema(cursor)
-            create_wf_open_table(cursor)
-            create_wf_closed_table(cursor)
-            create_non_wf_open_table(cursor)
-            create_non_wf_closed_table(cursor)
-            create_users_table(cursor)
-            create_po_records_table(cursor)
-            add_shipment_batch_no_column(cursor)
-            add_timestamp_columns(cursor)
-            create_update_timestamp_triggers(cursor)
+            # 执行尚未执行的迁移
+            if not run_migrations(connection):
+                return False
+            
+            # 每次启动都修复新记录的 created_at（幂等）
             fix_created_at_values(cursor)
             
+            # 每次启动都检查并创建缺失的索引（幂等）
+            ensure_indexes(connection)
+            
             # 提交更改
             connection.commit()
             print()
@@ -461,4 +793,10 @@ def main():
                 connection.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="初始化数据库（执行迁移并创建缺失的索引）")
+    parser.add_argument('--verify-indexes', action='store_true',
+                        help="只对热点查询执行 EXPLAIN，有查询无法使用索引时以非零状态退出")
+    args = parser.parse_args()
+    if args.verify_indexes:
+        sys.exit(0 if run_verify_indexes() else 1)
+    sys.exit(0 if main() else 1)
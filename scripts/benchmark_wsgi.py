@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WSGI 吞吐量对比测试
+分别以 Flask 开发服务器（flask run）和生产模式（python -m backend.serve）启动后端，
+用多个并发客户端请求同一个 API，输出每秒请求数和延迟分位数。
+
+用法:
+    python scripts/benchmark_wsgi.py [--mode dev|serve|both] [--concurrency 16] [--duration 10]
+                                     [--path /api/tables/wf_open?limit=50]
+
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）。
+"""
+
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.utils.jwt_utils import generate_token
+
+SERVER_COMMANDS = {
+    'dev': [sys.executable, '-m', 'flask', '--app', 'backend.web_app', 'run', '--host=127.0.0.1', '--port={port}'],
+    'serve': [sys.executable, '-m', 'backend.serve', '--no-init-db'],
+}
+
+
+def start_server(mode, port):
+    env = dict(os.environ, APP_HOST='127.0.0.1', APP_PORT=str(port), PDF_JOB_RECOVER='false', LOG_LEVEL='WARNING')
+    command = [part.format(port=port) for part in SERVER_COMMANDS[mode]]
+    process = subprocess.Popen(command, cwd=project_root, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/login.html')
+            conn.getresponse().read()
+            conn.close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} 服务器启动超时")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_load(port, path, headers, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        local_errors = 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 Flask 开发服务器与 gunicorn 生产模式的吞吐量")
+    parser.add_argument('--mode', choices=['dev', 'serve', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--path', default='/api/tables/wf_open?limit=50')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    headers = {'Authorization': f"Bearer {generate_token(1, 'benchmark@example.com')}"}
+    modes = ['dev', 'serve'] if args.mode == 'both' else [args.mode]
+    results = {}
+    for mode in modes:
+        process = start_server(mode, args.port)
+        try:
+            # 预热（建立连接池、加载表结构缓存）
+            run_load(args.port, args.path, headers, 2, 1)
+            results[mode] = run_load(args.port, args.path, headers, args.concurrency, args.duration)
+        finally:
+            stop_server(process)
+        r = results[mode]
+        print(f"{mode:>5}: {r['rps']:8.1f} req/s  p50={r['p50_ms']:.1f}ms  p95={r['p95_ms']:.1f}ms  "
+              f"p99={r['p99_ms']:.1f}ms  requests={r['requests']}  errors={r['errors']}")
+
+    if 'dev' in results and 'serve' in results and results['dev']['rps']:
+        print(f"吞吐量提升: {results['serve']['rps'] / results['dev']['rps']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
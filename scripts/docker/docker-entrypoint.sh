@@ -31,9 +31,9 @@ else
 fi
 
 echo ""
-echo "第4步: 启动Flask应用..."
+echo "第4步: 启动应用（gunicorn）..."
 echo "应用地址: http://0.0.0.0:5000"
 echo "========================================"
 echo ""
 
-python backend/app.py
+exec python -m backend.serve --no-init-db
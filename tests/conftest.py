@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共配置
+
+需要数据库的测试模块设置 pytestmark = pytest.mark.database，数据库不可用时整体跳过
+（使用 .env 中的 DB_* 配置，并已执行 init_db.py 迁移）。
+
+db_conn / module_db_conn 返回数据库连接，并在测试前后按模块中的常量清理测试数据：
+    TEST_PO    删除四张采购订单表中 po 等于该值的记录
+    TEST_USER  删除 po_records 中该用户的操作日志
+各模块只需在此连接上准备自己的测试数据。
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import pytest
+
+PO_TABLES = ('wf_open', 'wf_closed', 'non_wf_open', 'non_wf_closed')
+
+_database_available = None
+
+
+def database_available():
+    """数据库是否可连接（每次测试会话只检查一次）"""
+    global _database_available
+    if _database_available is None:
+        try:
+            import psycopg2
+            from backend.utils.config import get_db_config
+            psycopg2.connect(**get_db_config()).close()
+            _database_available = True
+        except Exception:
+            _database_available = False
+    return _database_available
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "database: 需要可用的 PostgreSQL，数据库不可用时跳过")
+
+
+def pytest_runtest_setup(item):
+    if item.get_closest_marker('database') and not database_available():
+        pytest.skip("数据库不可用，跳过数据库测试")
+
+
+@contextmanager
+def _test_connection(module):
+    import psycopg2
+    from backend.utils.config import get_db_config
+
+    test_po = getattr(module, 'TEST_PO', None)
+    test_user = getattr(module, 'TEST_USER', None)
+    conn = psycopg2.connect(**get_db_config())
+    cursor = conn.cursor()
+
+    def cleanup():
+        if test_po:
+            for table_name in PO_TABLES:
+                cursor.execute(f"DELETE FROM purchase_orders.{table_name} WHERE po = %s", (test_po,))
+        if test_user:
+            cursor.execute("DELETE FROM purchase_orders.po_records WHERE user_email = %s", (test_user,))
+        conn.commit()
+
+    try:
+        cleanup()
+        yield conn
+    finally:
+        # 准备数据失败时也回滚并清理，避免未提交的插入持有行锁阻塞后续测试
+        conn.rollback()
+        cleanup()
+        conn.close()
+
+
+@pytest.fixture
+def db_conn(request):
+    """每个测试一个连接，测试前后清理模块的测试数据"""
+    with _test_connection(request.module) as conn:
+        yield conn
+
+
+@pytest.fixture(scope="module")
+def module_db_conn(request):
+    """模块内共享的连接，供 scope="module" 的数据准备使用"""
+    with _test_connection(request.module) as conn:
+        yield conn
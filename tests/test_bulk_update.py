@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表格批量修改测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置，并已执行 init_db.py 迁移）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+os.environ.setdefault('PDF_JOB_RECOVER', 'false')
+
+import psycopg2
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.utils.jwt_utils import generate_token
+from backend.models.database import DatabaseManager
+from backend.models.schema_cache import schema_cache
+
+TEST_PO = 'BULKEDITTEST'
+TEST_USER = 'bulk-edit@test'
+
+pytestmark = pytest.mark.database
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """统计发送到数据库的 UPDATE 语句数"""
+    updates = 0
+
+    def execute(self, query, params=None):
+        text = query.decode() if isinstance(query, bytes) else str(query)
+        if text.lstrip().upper().startswith('UPDATE'):
+            CountingCursor.updates += 1
+        return super().execute(query, params)
+
+
+@pytest.fixture
+def conn(db_conn):
+    cursor = db_conn.cursor()
+    for i in range(1, 6):
+        cursor.execute(
+            "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, net_price) VALUES (%s, %s, %s, %s, 1, 1)",
+            (TEST_PO, f'PN{i}', i, f'{TEST_PO}/{i}')
+        )
+    db_conn.commit()
+    schema_cache.invalidate()
+    return db_conn
+
+
+def _rows(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT po_line, eta_wfsz::text, comment, qty, row_version FROM purchase_orders.wf_open "
+                   "WHERE po = %s ORDER BY po_line", (TEST_PO,))
+    rows = cursor.fetchall()
+    conn.commit()
+    return rows
+
+
+def test_bulk_update_groups_by_column_signature(conn, monkeypatch):
+    manager = DatabaseManager()
+    monkeypatch.setattr(manager, 'get_connection',
+                        lambda: psycopg2.connect(cursor_factory=CountingCursor, **get_db_config()))
+    CountingCursor.updates = 0
+
+    rows = [{'key': f'{TEST_PO}/{i}', 'changes': {'eta_wfsz': '2026-03-0%d' % i}} for i in range(1, 4)]
+    rows.append({'key': f'{TEST_PO}/4', 'changes': {'comment': 'note', 'qty': '7'}, 'row_version': 1})
+    rows.append({'key': f'{TEST_PO}/5', 'changes': {'eta_wfsz': ''}})
+    result = manager.bulk_update_rows('wf_open', rows, TEST_USER)
+
+    assert result['updated'] == 5 and result['failed'] == 0
+    assert [r['row_version'] for r in result['results']] == [2] * 5
+    # 两种列组合，两条 UPDATE
+    assert CountingCursor.updates == 2
+
+    assert _rows(conn) == [
+        (f'{TEST_PO}/1', '2026-03-01', None, 1, 2),
+        (f'{TEST_PO}/2', '2026-03-02', None, 1, 2),
+        (f'{TEST_PO}/3', '2026-03-03', None, 1, 2),
+        (f'{TEST_PO}/4', None, 'note', 7, 2),
+        (f'{TEST_PO}/5', None, None, 1, 2),
+    ]
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM purchase_orders.po_records WHERE user_email = %s AND operation = 'update'",
+                   (TEST_USER,))
+    assert cursor.fetchone()[0] == 5
+
+
+def test_bulk_update_reports_conflicts_per_row(conn):
+    manager = DatabaseManager()
+    rows = [
+        {'key': f'{TEST_PO}/1', 'changes': {'comment': 'ok'}, 'row_version': 1},
+        {'key': f'{TEST_PO}/2', 'changes': {'comment': 'stale'}, 'row_version': 9},
+        {'key': f'{TEST_PO}/404', 'changes': {'comment': 'missing'}},
+    ]
+    result = manager.bulk_update_rows('wf_open', rows)
+    assert [(r['success'], r.get('conflict', False)) for r in result['results']] == [
+        (True, False), (False, True), (False, False)
+    ]
+    assert [row[2] for row in _rows(conn)[:2]] == ['ok', None]
+
+    # atomic: 任一行失败时整批回滚
+    rows[0]['row_version'] = 2
+    result = manager.bulk_update_rows('wf_open', rows, atomic=True)
+    assert not result['committed'] and result['updated'] == 0
+    assert [row[4] for row in _rows(conn)[:2]] == [2, 1]
+
+
+def test_bulk_update_validation(conn):
+    manager = DatabaseManager()
+    for table_name, rows in (
+        ('users', [{'key': 'x', 'changes': {'comment': 'x'}}]),
+        ('wf_open', []),
+        ('wf_open', [{'key': f'{TEST_PO}/1', 'changes': {'no_such_column': 'x'}}]),
+        ('wf_open', [{'key': f'{TEST_PO}/1', 'changes': {'row_version': 5}}]),
+        ('wf_open', [{'key': f'{TEST_PO}/1', 'changes': {'comment': 'a'}}] * 2),
+        ('wf_closed', [{'key': 'abc', 'changes': {'comment': 'x'}}]),
+    ):
+        with pytest.raises(ValueError):
+            manager.bulk_update_rows(table_name, rows)
+
+
+def test_bulk_update_route(conn):
+    from backend.web_app import app
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {generate_token(1, 'a@b')}", 'X-User-Email': TEST_USER}
+
+    response = client.patch('/api/tables/wf_open', headers=headers, json={
+        'rows': [{'key': f'{TEST_PO}/1', 'changes': {'comment': 'via api'}, 'row_version': 1}]
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and body['data'][0]['row_version'] == 2
+
+    response = client.patch('/api/tables/wf_open', headers=headers, json={'rows': []})
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 导入批量 upsert 测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.models.bulk_upsert import bulk_upsert
+from backend.models.schema_cache import schema_cache
+from backend.pdf_import_processor import PDFImportProcessor
+
+TEST_PO = 'BULKTEST'
+
+pytestmark = pytest.mark.database
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """统计发送到数据库的语句数"""
+    statements = 0
+
+    def execute(self, query, params=None):
+        self.statements += 1
+        return super().execute(query, params)
+
+
+def _row(i, **extra):
+    row = {'po': TEST_PO, 'pn': f'PN{i}', 'line': i, 'po_line': f'{TEST_PO}/{i}',
+           'qty': i, 'req_date_wf': '2025-01-01', 'not_a_column': 'x'}
+    row.update(extra)
+    return row
+
+
+def test_300_rows_in_a_few_round_trips(db_conn):
+    """300 行、相同列组合时只需要少量语句"""
+    cursor = db_conn.cursor(cursor_factory=CountingCursor)
+    columns = schema_cache.get_column_names('wf_open')
+    success_count, errors = bulk_upsert(cursor, 'wf_open', [_row(i) for i in range(300)], columns)
+    db_conn.commit()
+    assert success_count == 300
+    assert errors == []
+    assert cursor.statements <= 3
+
+    cursor.execute("SELECT COUNT(*) FROM purchase_orders.wf_open WHERE po = %s", (TEST_PO,))
+    assert cursor.fetchone()[0] == 300
+
+
+def test_conflict_overwrites_only_pdf_columns(db_conn):
+    """主键冲突时只覆盖 PDF 可提取的列，同一批中后出现的行生效"""
+    cursor = db_conn.cursor()
+    columns = schema_cache.get_column_names('wf_open')
+    bulk_upsert(cursor, 'wf_open', [_row(1, comment='manual note')], columns)
+    db_conn.commit()
+
+    rows = [_row(1, qty=5, comment='from pdf'), _row(2), _row(1, qty=7, comment='from pdf')]
+    success_count, errors = bulk_upsert(cursor, 'wf_open', rows, columns)
+    db_conn.commit()
+    assert success_count == 3
+    assert errors == []
+
+    cursor.execute("SELECT qty, comment FROM purchase_orders.wf_open WHERE po_line = %s", (f'{TEST_PO}/1',))
+    qty, comment = cursor.fetchone()
+    assert qty == 7
+    assert comment == 'manual note'
+
+
+def test_errors_are_reported_per_row(db_conn):
+    """单行出错时其他行仍然写入，错误按行号报告"""
+    cursor = db_conn.cursor()
+    columns = schema_cache.get_column_names('wf_open')
+    rows = [_row(1), _row(2, req_date_wf='not a date'), {'not_a_column': 1}, _row(4)]
+    success_count, errors = bulk_upsert(cursor, 'wf_open', rows, columns)
+    db_conn.commit()
+    assert success_count == 2
+    assert [e.split(':')[0] for e in errors] == ['行2', '行3']
+
+    cursor.execute("SELECT COUNT(*) FROM purchase_orders.wf_open WHERE po = %s", (TEST_PO,))
+    assert cursor.fetchone()[0] == 2
+
+
+def test_insert_data_with_check(db_conn):
+    result = PDFImportProcessor().insert_data_with_check('wf_open', [_row(i) for i in range(10)])
+    assert result['success']
+    assert result['count'] == 10
+    assert result['errors'] is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
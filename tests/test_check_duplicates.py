@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复数据检查测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.models.database import DatabaseManager
+from backend.models.schema_cache import schema_cache
+
+TEST_PO = 'DUPTEST'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture(scope="module")
+def db_manager(module_db_conn):
+    cursor = module_db_conn.cursor()
+    for i in range(1, 4):
+        cursor.execute(
+            "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, net_price, req_date_wf, comment) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            (TEST_PO, f"PN{i}", i, f"{TEST_PO}/{i}", 10, '1.5000', '2025-01-01', 'manual note')
+        )
+    module_db_conn.commit()
+    return DatabaseManager()
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    executed = []
+
+    def execute(self, query, params=None):
+        CountingCursor.executed.append(query)
+        return super().execute(query, params)
+
+
+def test_duplicates_found_in_one_query(db_manager, monkeypatch):
+    """所有候选主键一次查询（表结构缓存已加载时）"""
+    schema_cache.get_columns('wf_open')
+    conn = psycopg2.connect(**get_db_config(), cursor_factory=CountingCursor)
+    monkeypatch.setattr(db_manager, 'get_connection', lambda: conn)
+    CountingCursor.executed = []
+    data_list = [{'po_line': f"{TEST_PO}/{i}", 'qty': 10} for i in range(1, 301)]
+    duplicates = db_manager.check_duplicates('wf_open', data_list)
+    assert conn.closed
+    assert [d['primary_key'] for d in duplicates] == [f"{TEST_PO}/{i}" for i in range(1, 4)]
+    assert len(CountingCursor.executed) == 1
+
+
+def test_diff_lists_only_overwritten_changes(db_manager):
+    """diff 只包含会被覆盖且有变化的 PDF 列"""
+    data_list = [
+        {'po_line': f"{TEST_PO}/1", 'qty': '10', 'net_price': 1.5, 'req_date_wf': '2025-01-01', 'comment': 'other'},
+        {'po_line': f"{TEST_PO}/2", 'qty': 12, 'req_date_wf': '2025-02-01'},
+        {'po_line': f"{TEST_PO}/9", 'qty': 1},
+    ]
+    duplicates = db_manager.check_duplicates('wf_open', data_list)
+    assert len(duplicates) == 2
+    first, second = duplicates
+    assert first['existing']['comment'] == 'manual note'
+    assert first['diff'] == {}
+    assert set(second['diff']) == {'qty', 'req_date_wf'}
+    assert second['diff']['qty']['new'] == 12
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
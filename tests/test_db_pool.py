@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库连接池测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+import threading
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.utils.db_pool import ConnectionPool, PoolTimeoutError
+
+pytestmark = pytest.mark.database
+
+
+def test_connections_are_reused():
+    """close() 归还连接后，下一次借出复用同一个连接"""
+    pool = ConnectionPool(min_size=1, max_size=2, health_check_interval=0)
+    conn = pool.get_connection()
+    raw = conn.raw
+    conn.close()
+
+    conn = pool.get_connection()
+    assert conn.raw is raw
+    conn.close()
+
+    metrics = pool.get_metrics()
+    assert metrics['connections_created'] == 1
+    assert metrics['checkouts'] == 2
+    pool.close_all()
+
+
+def test_uncommitted_transaction_is_rolled_back_on_release():
+    """归还时未提交的事务被回滚，不会泄漏到下一个使用者"""
+    pool = ConnectionPool(min_size=1, max_size=1)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("CREATE TEMP TABLE pool_probe (id INTEGER)")
+
+    conn = pool.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO pool_probe VALUES (1)")
+    conn.close()
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM pool_probe")
+        assert cursor.fetchone()[0] == 0
+    pool.close_all()
+
+
+def test_max_size_and_timeout():
+    """连接数达到上限时等待，超时抛出 PoolTimeoutError"""
+    pool = ConnectionPool(min_size=0, max_size=1, timeout=0.2)
+    held = pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    pool.putconn(held)
+    assert pool.get_metrics()['timeouts'] == 1
+    pool.close_all()
+
+
+def test_concurrent_checkouts_respect_max_size():
+    """多线程并发借出时连接数不超过 max_size"""
+    pool = ConnectionPool(min_size=1, max_size=3, timeout=10)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(20):
+                with pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT 1")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    metrics = pool.get_metrics()
+    assert not errors
+    assert metrics['checkouts'] == 160
+    assert metrics['connections_created'] <= 3
+    assert metrics['timeouts'] == 0
+    # 所有连接都已归还
+    assert metrics['in_use'] == 0
+    assert metrics['idle'] == metrics['size'] <= 3
+    pool.close_all()
+
+
+def test_idle_connections_are_reaped():
+    """超过 min_size 的空闲连接在 idle_timeout 后被回收"""
+    pool = ConnectionPool(min_size=1, max_size=3, idle_timeout=0.01)
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        pool.putconn(conn)
+
+    time.sleep(0.05)
+    pool.reap_idle()
+    assert pool.get_metrics()['size'] == 1
+    pool.close_all()
+
+
+def test_unclosed_proxy_is_returned_without_taking_the_lock():
+    """未 close() 的代理被回收时不获取连接池锁（终结器可能在持锁线程中运行），连接在下一次借出时归还"""
+    pool = ConnectionPool(min_size=1, max_size=1, timeout=1)
+    conn = pool.get_connection()
+    raw = conn.raw
+    with pool._lock:
+        conn.__del__()
+
+    again = pool.getconn()
+    assert again is raw
+    pool.putconn(again)
+    assert pool.get_metrics()['connections_created'] == 1
+    pool.close_all()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
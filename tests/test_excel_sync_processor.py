@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel 同步（order report + 源数据文件）匹配测试
+不需要数据库，工作簿在临时目录中生成
+"""
+
+import sys
+import os
+import random
+import re
+import zipfile
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+os.environ.setdefault('PDF_JOB_RECOVER', 'false')
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from backend.excel_sync_processor import ExcelSyncProcessor
+from backend.utils.excel_utils import read_sheet_names
+
+SOURCE_HEADERS = ['PO', 'PN/Line', 'PN ', 'Tracking No', 'ETA WFSZ', 'Record No']
+
+
+def _write_source(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'WF Closed'
+    ws.append(SOURCE_HEADERS)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def _write_order_report(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Order Report'
+    ws.append(['Material', 'PurchaseOrder', 'Reply'])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def _scan_by_po_line(source_data, po, line, material):
+    """原逐条扫描实现，作为索引查找的参照"""
+    for record in source_data:
+        source_po_line = record.get('PN/Line') or record.get('PO/Line')
+        if source_po_line:
+            parts = str(source_po_line).strip().split('/')
+            if len(parts) == 2:
+                source_pn = record.get('PN') or record.get('PN ')
+                if parts[0].strip() == po and parts[1].strip() == line and \
+                        str(source_pn).strip() == str(material).strip():
+                    return record
+    return None
+
+
+def test_sync_updates_matching_rows(tmp_path):
+    source_path = tmp_path / 'source.xlsx'
+    order_path = tmp_path / 'order.xlsx'
+    _write_source(source_path, [
+        ['4500000001', '4500000001/10', 'MAT-A', 'TRK-1', datetime(2025, 1, 1), None],
+        # 同一 (PO, Line, PN) 重复出现时使用第一条
+        ['4500000001', ' 4500000001 / 10 ', 'MAT-A ', 'TRK-DUP', datetime(2025, 2, 1), None],
+        ['4500000002', '4500000002/20', 'MAT-B', None, None, 'ETA SZ: 3/4/25'],
+    ])
+    _write_order_report(order_path, [
+        ['MAT-A', '4500000001/10', None],
+        [' MAT-B', '4500000002 / 20', None],
+        ['MAT-X', '4500000001/10', None],
+        ['MAT-A', 'not-a-po-line', None],
+    ])
+
+    result = ExcelSyncProcessor().process_excel_sync_two_files(str(order_path), str(source_path))
+
+    assert result['success']
+    assert [detail['row'] for detail in result['details']] == [2, 3]
+    assert len(result['errors']) == 1
+
+    ws = load_workbook(order_path)['Order Report']
+    assert ws.cell(2, 3).value == '01/08/25'
+    assert ws.cell(2, 4).value == 'TRK-1'
+    assert ws.cell(3, 3).value == '03/11/25'
+    assert ws.cell(4, 3).value is None
+
+
+def test_excel_sync_route(tmp_path):
+    """上传两个工作簿，路由返回同步后的 order report"""
+    import io
+    from backend.web_app import app
+    from backend.utils.jwt_utils import generate_token
+
+    source_path = tmp_path / 'source.xlsx'
+    order_path = tmp_path / 'order.xlsx'
+    _write_source(source_path, [['4500000001', '4500000001/10', 'MAT-A', 'TRK-1', datetime(2025, 1, 1), None]])
+    _write_order_report(order_path, [['MAT-A', '4500000001/10', None]])
+
+    response = app.test_client().post(
+        '/api/excel_sync',
+        headers={'Authorization': f"Bearer {generate_token(1, 'a@b')}"},
+        data={
+            'order_report_file': (io.BytesIO(order_path.read_bytes()), 'order.xlsx'),
+            'source_file': (io.BytesIO(source_path.read_bytes()), 'source.xlsx'),
+        },
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.headers['X-Excel-Sync-Success'] == 'true'
+    assert response.headers['X-Excel-Sync-Updated'] == '1'
+
+    ws = load_workbook(io.BytesIO(response.data))['Order Report']
+    assert ws.cell(2, 4).value == 'TRK-1'
+
+
+def test_index_lookup_matches_linear_scan():
+    rng = random.Random(7)
+    processor = ExcelSyncProcessor()
+    source_data = []
+    for _ in range(2000):
+        po = str(4500000000 + rng.randint(0, 50))
+        line = str(rng.randint(1, 20))
+        record = {
+            'PO': po,
+            'PN/Line': rng.choice([f"{po}/{line}", f" {po} / {line} ", f"{po}/{line}/x", None]),
+            'PN ': rng.choice(['MAT-1', 'MAT-2 ', None]),
+            'Tracking No': rng.random(),
+        }
+        record['PN'] = record['PN ']
+        source_data.append(record)
+
+    source_index = processor._build_source_index(source_data)
+    for _ in range(2000):
+        po = str(4500000000 + rng.randint(0, 55))
+        line = str(rng.randint(1, 22))
+        material = rng.choice(['MAT-1', ' MAT-2', 'MAT-3', 'None'])
+        expected = _scan_by_po_line(source_data, po, line, material)
+        assert processor._find_matching_record_by_po_line(source_index, po, line, material) is expected
+
+
+def test_source_sheet_with_wrong_dimension(tmp_path):
+    source_path = tmp_path / 'source.xlsx'
+    order_path = tmp_path / 'order.xlsx'
+    _write_source(source_path, [
+        ['4500000001', '4500000001/10', 'MAT-A', 'TRK-1', None, None],
+        ['4500000002', '4500000002/20', 'MAT-B', 'TRK-2', None, None],
+    ])
+    _write_order_report(order_path, [['MAT-B', '4500000002/20', None]])
+
+    # 部分工具生成的文件记录的表格范围不准确，只读模式下不能依赖它
+    patched_path = tmp_path / 'patched.xlsx'
+    with zipfile.ZipFile(source_path) as src, zipfile.ZipFile(patched_path, 'w') as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                data = re.sub(rb'<dimension ref="[^"]*"\s*/>', b'<dimension ref="A1"/>', data)
+            dst.writestr(item, data)
+
+    result = ExcelSyncProcessor().process_excel_sync_two_files(str(order_path), str(patched_path))
+    assert result['success']
+    assert result['updated_rows'] == 1
+    assert load_workbook(order_path)['Order Report'].cell(2, 4).value == 'TRK-2'
+
+
+def test_read_sheet_names(tmp_path):
+    path = tmp_path / 'sheets.xlsx'
+    wb = Workbook()
+    wb.active.title = 'Order Report'
+    wb.create_sheet('WF Closed')
+    wb.create_sheet('Non-WF Closed').sheet_state = 'hidden'
+    wb.save(path)
+    assert read_sheet_names(path) == load_workbook(path).sheetnames == ['Order Report', 'WF Closed', 'Non-WF Closed']
+
+    invalid_path = tmp_path / 'invalid.xlsx'
+    invalid_path.write_bytes(b'not an excel file')
+    with pytest.raises(ValueError):
+        read_sheet_names(invalid_path)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引管理（init_db.ensure_indexes / verify_indexes）测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pytest
+
+import init_db
+
+pytestmark = pytest.mark.database
+
+
+def test_ensure_indexes_creates_btree_indexes(db_conn):
+    assert init_db.ensure_indexes(db_conn)
+    # 第二次执行不做任何修改
+    assert init_db.ensure_indexes(db_conn)
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'purchase_orders'")
+    existing = set(row[0] for row in cursor.fetchall())
+    expected = set(name for name, _, method, _ in init_db.INDEX_DEFINITIONS
+                   if method == 'btree' or init_db._pg_trgm_installed(cursor))
+    assert expected <= existing
+
+
+def test_verify_indexes_detects_missing_index(db_conn, capsys):
+    init_db.ensure_indexes(db_conn)
+    assert init_db.verify_indexes(db_conn)
+
+    # 在未提交的事务中删除索引，verify_indexes 结束时会回滚
+    db_conn.cursor().execute("DROP INDEX purchase_orders.idx_wf_open_po_pn, purchase_orders.idx_wf_open_pn")
+    assert not init_db.verify_indexes(db_conn)
+    assert "发货查找 wf_open (po, pn): 顺序扫描 wf_open" in capsys.readouterr().out
+    assert init_db.verify_indexes(db_conn)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
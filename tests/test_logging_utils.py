@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志工具测试：JSON 行格式、request id 与按模块级别
+"""
+
+import sys
+import os
+import io
+import json
+import logging
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.utils import logging_utils
+
+
+@pytest.fixture
+def json_logging(monkeypatch):
+    monkeypatch.setenv('LOG_FORMAT', 'json')
+    monkeypatch.setenv('LOG_LEVEL', 'INFO')
+    monkeypatch.setenv('LOG_LEVELS', 'backend.test_verbose=DEBUG')
+    stream = io.StringIO()
+    monkeypatch.setattr(sys, 'stderr', stream)
+    logging_utils.setup_logging(force=True)
+    yield stream
+    monkeypatch.undo()
+    logging.getLogger('backend.test_verbose').setLevel(logging.NOTSET)
+    logging_utils.setup_logging(force=True)
+
+
+def test_json_lines_carry_request_id(json_logging):
+    logger = logging_utils.get_logger('backend.test_quiet')
+    token = logging_utils.set_request_id('req-123')
+    try:
+        logger.info("导入 %d 行", 5, extra={'table': 'wf_open'})
+    finally:
+        logging_utils.reset_request_id(token)
+    logger.info("请求外")
+
+    lines = [json.loads(line) for line in json_logging.getvalue().splitlines()]
+    assert lines[0]['message'] == "导入 5 行"
+    assert lines[0]['request_id'] == 'req-123'
+    assert lines[0]['table'] == 'wf_open'
+    assert lines[0]['level'] == 'INFO'
+    assert 'request_id' not in lines[1]
+
+
+def test_debug_disabled_by_default_and_enabled_per_module(json_logging):
+    logging_utils.get_logger('backend.test_quiet').debug("不输出")
+    logging_utils.get_logger('backend.test_verbose').debug("输出 %s", 'x')
+    messages = [json.loads(line)['message'] for line in json_logging.getvalue().splitlines()]
+    assert messages == ["输出 x"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+操作日志批量写入测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.operation_logger import OperationLogger
+
+TEST_TABLE = 'oplog_test'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def conn(db_conn):
+    def cleanup():
+        db_conn.cursor().execute("DELETE FROM purchase_orders.po_records WHERE table_name = %s", (TEST_TABLE,))
+        db_conn.commit()
+
+    cleanup()
+    yield db_conn
+    db_conn.rollback()
+    cleanup()
+
+
+def _count(conn, operation=None):
+    cursor = conn.cursor()
+    query = "SELECT count(*) FROM purchase_orders.po_records WHERE table_name = %s"
+    params = [TEST_TABLE]
+    if operation:
+        query += " AND operation = %s"
+        params.append(operation)
+    cursor.execute(query, params)
+    return cursor.fetchone()[0]
+
+
+def test_async_logs_are_written_in_batches(conn):
+    oplog = OperationLogger(async_enabled=True, batch_size=50, flush_interval=0.2)
+    batches = []
+    write_rows = oplog._write_rows
+    oplog._write_rows = lambda rows: batches.append(len(rows)) or write_rows(rows)
+
+    record = {'qty': 1}
+    for i in range(120):
+        assert oplog.log_operation('a@b', TEST_TABLE, 'update', record)
+        record['qty'] += 1  # 入队后修改原数据不影响日志内容
+    oplog.flush()
+
+    assert _count(conn) == 120
+    assert sum(batches) == 120
+    assert len(batches) < 120
+    assert oplog.get_operation_logs(table_name=TEST_TABLE, limit=1)
+    oplog.shutdown()
+
+
+def test_shutdown_flushes_pending_logs(conn):
+    oplog = OperationLogger(async_enabled=True, batch_size=1000, flush_interval=30)
+    for _ in range(10):
+        oplog.log_operation('a@b', TEST_TABLE, 'delete', {'id': 1})
+    oplog.shutdown()
+    assert _count(conn, 'delete') == 10
+
+
+def test_same_transaction_mode_follows_caller_transaction(conn):
+    oplog = OperationLogger(async_enabled=True)
+    cursor = conn.cursor()
+    oplog.log_operation('a@b', TEST_TABLE, 'shipment_partial_shipment', {'qty': 1}, cursor=cursor)
+    conn.rollback()
+    assert _count(conn) == 0
+
+    oplog.log_operation('a@b', TEST_TABLE, 'shipment_partial_shipment', {'qty': 1}, cursor=cursor)
+    conn.commit()
+    assert _count(conn, 'shipment_partial_shipment') == 1
+
+
+def test_same_transaction_mode_raises_on_error(conn):
+    oplog = OperationLogger(async_enabled=True)
+    with pytest.raises(psycopg2.Error):
+        oplog.log_operation(None, TEST_TABLE, 'insert', {}, cursor=conn.cursor())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
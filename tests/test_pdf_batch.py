@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 批量导入测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.pdf_import_processor import PDFImportProcessor
+
+TEST_PO = 'BATCHTEST'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def processor(db_conn):
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "INSERT INTO purchase_orders.wf_open (po, po_line, qty) VALUES (%s, %s, %s)",
+        (TEST_PO, f"{TEST_PO}/1", 1)
+    )
+    db_conn.commit()
+    return PDFImportProcessor()
+
+
+def _fake_extract(extracted):
+    """按相反顺序完成解析，模拟进程池乱序返回"""
+    def iter_extract_pdfs(pdf_files, company_name, max_workers=None):
+        for index in reversed(range(len(pdf_files))):
+            data = extracted[index]
+            if isinstance(data, Exception):
+                yield index, [], str(data)
+            else:
+                yield index, [dict(item, company=company_name) for item in data], None
+    return iter_extract_pdfs
+
+
+def test_batch_merges_in_upload_order(processor, monkeypatch):
+    """所有文件合并后一次重复检查、一次插入，同一 po_line 以后上传的文件为准"""
+    extracted = [
+        [{'po': TEST_PO, 'po_line': f"{TEST_PO}/1", 'qty': 5}, {'po': TEST_PO, 'po_line': f"{TEST_PO}/2", 'qty': 2}],
+        ValueError("broken pdf"),
+        [{'po': TEST_PO, 'po_line': f"{TEST_PO}/1", 'qty': 9}],
+    ]
+    monkeypatch.setattr(processor, 'iter_extract_pdfs', _fake_extract(extracted))
+    checks = []
+    original_check = processor.check_duplicates
+    monkeypatch.setattr(processor, 'check_duplicates',
+                        lambda table, data: checks.append(len(data)) or original_check(table, data))
+
+    files = [('a.pdf', 'a'), ('b.pdf', 'b'), ('c.pdf', 'c')]
+    events = list(processor.process_pdf_batch(files, 'wefabricate', insert=True))
+
+    file_events = [e for e in events if e['event'] == 'file']
+    assert [e['file'] for e in file_events] == ['c.pdf', 'b.pdf', 'a.pdf']
+    assert [e['success'] for e in file_events] == [True, False, True]
+
+    summary = events[-1]
+    assert summary['event'] == 'summary'
+    assert summary['success_count'] == 2
+    assert summary['error_count'] == 1
+    assert [item['qty'] for item in summary['data']] == [5, 2, 9]
+    assert checks == [3]
+    assert [d['primary_key'] for d in summary['duplicates']] == [f"{TEST_PO}/1", f"{TEST_PO}/1"]
+    assert summary['insert_result']['count'] == 3
+
+    conn = psycopg2.connect(**get_db_config())
+    cursor = conn.cursor()
+    cursor.execute("SELECT qty FROM purchase_orders.wf_open WHERE po_line = %s", (f"{TEST_PO}/1",))
+    assert cursor.fetchone()[0] == 9
+    conn.close()
+
+
+def test_extraction_reuses_one_spawned_process_pool(processor, tmp_path):
+    """多次批量解析共用一个以 spawn 启动的进程池，每个文件都返回结果"""
+    from backend import pdf_import_processor
+
+    files = [str(tmp_path / f"missing-{i}.pdf") for i in range(3)]
+    first = sorted(index for index, _, _ in processor.iter_extract_pdfs(files, 'wefabricate', max_workers=2))
+    executor = pdf_import_processor._extract_executor
+    second = sorted(index for index, _, _ in processor.iter_extract_pdfs(files, 'wefabricate', max_workers=2))
+
+    assert first == second == [0, 1, 2]
+    assert executor is not None and pdf_import_processor._extract_executor is executor
+    assert executor._mp_context.get_start_method() == 'spawn'
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 解析结果缓存测试脚本
+"""
+
+import sys
+import os
+import time
+from datetime import date
+from decimal import Decimal
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.pdf_extraction_cache import PDFExtractionCache
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / "po.pdf"
+    path.write_bytes(b"%PDF-1.4 fake purchase order")
+    return str(path)
+
+
+def test_repeat_extraction_hits_cache_with_types(tmp_path, pdf_file):
+    cache = PDFExtractionCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    rows = [{'po_line': '123/10', 'qty': Decimal('2.50'), 'req_date_wf': date(2025, 1, 31), 'pn': None}]
+    calls = []
+
+    def extract():
+        calls.append(1)
+        return rows
+
+    assert cache.get_or_extract(pdf_file, 'wefabricate', 'wefabricate-v1', extract) == rows
+    cached = cache.get_or_extract(pdf_file, 'wefabricate', 'wefabricate-v1', extract)
+    assert cached == rows
+    assert isinstance(cached[0]['qty'], Decimal)
+    assert isinstance(cached[0]['req_date_wf'], date)
+    assert len(calls) == 1
+    assert cache.hits == 1
+
+
+def test_company_and_version_are_part_of_the_key(tmp_path, pdf_file):
+    cache = PDFExtractionCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    calls = []
+    extract = lambda: calls.append(1) or []
+
+    cache.get_or_extract(pdf_file, 'wefabricate', 'wefabricate-v1', extract)
+    cache.get_or_extract(pdf_file, 'generic_wf', 'wefabricate-v1', extract)
+    cache.get_or_extract(pdf_file, 'wefabricate', 'wefabricate-v2', extract)
+    cache.get_or_extract(pdf_file, 'wefabricate', 'wefabricate-v2', extract)
+    assert len(calls) == 3
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache_dir = tmp_path / "cache"
+    row = [{'description': 'x' * 400}]
+    cache = PDFExtractionCache(cache_dir=str(cache_dir), max_bytes=1000)
+
+    cache.put('a', row)
+    cache.put('b', row)
+    # 访问 a，使 b 成为最久未访问的条目
+    past = time.time() - 60
+    os.utime(cache_dir / 'b.json', (past, past))
+    os.utime(cache_dir / 'a.json', (past, past))
+    assert cache.get('a') == row
+    cache.put('c', row)
+
+    assert cache.get('a') == row
+    assert cache.get('b') is None
+    assert cache.get('c') == row
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache = PDFExtractionCache(cache_dir=str(cache_dir), max_bytes=1024 * 1024)
+    # 无法序列化的值使写入失败
+    cache.put('broken', [{'value': object()}])
+    assert list(cache_dir.iterdir()) == []
+    assert cache.get('broken') is None
+
+
+def test_disabled_cache_always_extracts(pdf_file):
+    cache = PDFExtractionCache(cache_dir='', max_bytes=1024)
+    calls = []
+    cache.get_or_extract(pdf_file, 'wefabricate', 'v1', lambda: calls.append(1) or [])
+    cache.get_or_extract(pdf_file, 'wefabricate', 'v1', lambda: calls.append(1) or [])
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 异步导入任务测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import psycopg2.extras
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.pdf_job_manager import PDFJobManager, JOB_SUCCEEDED, JOB_QUEUED
+
+pytestmark = pytest.mark.database
+
+
+class FakeProcessor:
+    """按页报告进度的假处理器"""
+
+    def __init__(self, upload_folder, pages=3):
+        self.upload_folder = upload_folder
+        self.pages = pages
+
+    def process_pdf_with_duplicate_check(self, pdf_path, company_name, progress_callback=None):
+        for page in range(1, self.pages + 1):
+            if progress_callback:
+                progress_callback(page, self.pages)
+        return {'success': True, 'data': [{'po_line': 'X/1', 'qty': 1}], 'duplicates': [], 'table_name': 'wf_open'}
+
+
+def _wait_finished(manager, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get_job(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("任务未在预期时间内完成")
+
+
+def _save_files(job_dir, count):
+    files = []
+    for i in range(count):
+        path = os.path.join(job_dir, f"{i}.pdf")
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+        files.append((f"file{i}.pdf", path))
+    return files
+
+
+def test_job_runs_and_persists_result(tmp_path):
+    manager = PDFJobManager(FakeProcessor(str(tmp_path)), max_workers=1)
+    job_id, job_dir = manager.new_job_dir()
+    success, job = manager.submit(job_id, 'wefabricate', _save_files(job_dir, 2), 'a@b')
+    assert success, job
+    assert job['files'] == ['file0.pdf', 'file1.pdf']
+
+    job = _wait_finished(manager, job_id)
+    assert job['status'] == JOB_SUCCEEDED
+    assert job['progress']['files_done'] == 2
+    assert job['progress']['pages_done'] == 3
+    assert [f['file'] for f in job['result']['files']] == ['file0.pdf', 'file1.pdf']
+    assert job['result']['files'][0]['data'][0]['po_line'] == 'X/1'
+    # 完成后删除上传文件
+    assert not os.path.exists(job_dir)
+    manager.shutdown()
+
+
+def test_queue_is_bounded(tmp_path):
+    manager = PDFJobManager(FakeProcessor(str(tmp_path)), max_workers=1, max_pending=1)
+    manager._get_executor()
+    manager._pending.add('busy')
+    job_id, job_dir = manager.new_job_dir()
+    success, message = manager.submit(job_id, 'wefabricate', _save_files(job_dir, 1))
+    assert not success
+    manager.shutdown()
+
+
+def test_stale_running_job_is_requeued_on_recover(tmp_path):
+    manager = PDFJobManager(FakeProcessor(str(tmp_path)), max_workers=1)
+    job_id, job_dir = manager.new_job_dir()
+    files = _save_files(job_dir, 1)
+
+    # 模拟进程在执行任务时退出：任务停留在 running 状态
+    conn = psycopg2.connect(**get_db_config())
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO purchase_orders.pdf_import_jobs (id, status, company, files, attempts, updated_at)
+        VALUES (%s, 'running', 'wefabricate', %s, 1, CURRENT_TIMESTAMP - INTERVAL '1 hour')
+    """, (job_id, psycopg2.extras.Json([{'name': n, 'path': p} for n, p in files])))
+    conn.commit()
+
+    assert manager.recover() >= 1
+    job = _wait_finished(manager, job_id)
+    assert job['status'] == JOB_SUCCEEDED
+    assert job['attempts'] == 2
+
+    cursor.execute("DELETE FROM purchase_orders.pdf_import_jobs WHERE id = %s", (job_id,))
+    conn.commit()
+    conn.close()
+    manager.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报表同步（closed 表批量查找）测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from backend.utils.config import get_db_config
+from backend.models.database import DatabaseManager
+from backend.report_sync_processor import ReportSyncProcessor
+
+TEST_PO = 'RSYNCTEST'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def closed_rows(db_conn):
+    cursor = db_conn.cursor()
+    insert = "INSERT INTO purchase_orders.{} (po, line, pn, po_line, tracking_no, record_no) VALUES (%s, %s, %s, %s, %s, %s)"
+    cursor.execute(insert.format('wf_closed'), (TEST_PO, 1, 'MAT-A', f'{TEST_PO}/1', 'TRK-OLD', None))
+    cursor.execute(insert.format('wf_closed'), (TEST_PO, 1, 'MAT-A', f'{TEST_PO}/1', 'TRK-NEW', None))
+    cursor.execute(insert.format('non_wf_closed'), (TEST_PO, '1', 'MAT-A', f'{TEST_PO}/1', None, 'ETA Rotterdam: 1/10/26'))
+    cursor.execute(insert.format('non_wf_closed'), (TEST_PO, 'A2', 'MAT-B', f'{TEST_PO}/A2', 'TRK-B', None))
+    db_conn.commit()
+
+
+class CountingDatabaseManager(DatabaseManager):
+    def __init__(self):
+        super().__init__()
+        self.connections = 0
+
+    def get_connection(self):
+        self.connections += 1
+        return super().get_connection()
+
+
+def _write_report(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Material', 'PurchaseOrder', 'Comments', 'Reply', 'Request'])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def test_report_sync_resolves_all_rows_with_one_connection(tmp_path, closed_rows):
+    path = tmp_path / 'report.xlsx'
+    _write_report(path, [
+        ['MAT-A', f'{TEST_PO}/1', None, None, None],
+        # wf_closed.line 是整数列，non_wf_closed.line 是字符串列
+        ['MAT-A', f'{TEST_PO}/01', None, None, None],
+        ['MAT-B', f'{TEST_PO} / A2', 'existing', None, None],
+        ['MAT-C', f'{TEST_PO}/1', None, None, None],
+        ['MAT-A', 'invalid', None, None, None],
+    ] + [['MAT-X', f'{TEST_PO}/{i}', None, None, None] for i in range(100, 400)])
+
+    db_manager = CountingDatabaseManager()
+    result = ReportSyncProcessor(db_manager).process_excel_sync(str(path))
+
+    assert result['success']
+    assert db_manager.connections == 1
+    assert [(d['row'], d['records_count']) for d in result['details']] == [(2, 3), (3, 2), (4, 1)]
+
+    ws = load_workbook(path).active
+    # 记录顺序：先 wf_closed 后 non_wf_closed，各表内按 id 降序
+    assert ws.cell(2, 3).value == 'TRK-NEW; TRK-OLD'
+    assert ws.cell(2, 4).value == '1/17/26'
+    assert ws.cell(3, 3).value == 'TRK-NEW; TRK-OLD'
+    assert ws.cell(3, 4).value is None
+    assert ws.cell(4, 3).value == 'existing; TRK-B'
+    assert ws.cell(5, 3).value is None
+    assert any('未找到匹配' in error for error in result['errors'])
+    assert any('无效的 PurchaseOrder' in error for error in result['errors'])
+
+
+def test_closed_lookup_index_exists():
+    conn = psycopg2.connect(**get_db_config())
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT tablename FROM pg_indexes WHERE schemaname = 'purchase_orders' AND indexname LIKE %s",
+        ('%_po_line_pn',)
+    )
+    assert {row[0] for row in cursor.fetchall()} >= {'wf_closed', 'non_wf_closed'}
+    conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
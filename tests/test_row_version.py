@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+row_version 乐观并发控制测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置，并已执行 init_db.py 迁移）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+os.environ.setdefault('PDF_JOB_RECOVER', 'false')
+
+import pytest
+
+from backend.utils.jwt_utils import generate_token
+from backend.models.database import DatabaseManager, RowVersionConflict
+from backend.models.schema_cache import schema_cache
+
+TEST_PO = 'VERSIONTEST'
+PO_LINE = f'{TEST_PO}/1'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def row(db_conn):
+    cursor = db_conn.cursor()
+    cursor.execute("INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty) VALUES (%s, 'PN1', 1, %s, 5)",
+                   (TEST_PO, PO_LINE))
+    db_conn.commit()
+    schema_cache.invalidate()
+    return db_conn
+
+
+def _version(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT row_version FROM purchase_orders.wf_open WHERE po_line = %s", (PO_LINE,))
+    result = cursor.fetchone()
+    conn.commit()
+    return result[0] if result else None
+
+
+def test_trigger_bumps_version_and_conditional_update(row):
+    manager = DatabaseManager()
+    assert _version(row) == 1
+
+    success, _, version = manager.update_row('wf_open', PO_LINE, {'comment': 'first'}, expected_version=1)
+    assert success and version == 2 == _version(row)
+
+    # 使用过期的版本号更新时报告冲突，数据不变
+    with pytest.raises(RowVersionConflict):
+        manager.update_row('wf_open', PO_LINE, {'comment': 'stale'}, expected_version=1)
+    assert _version(row) == 2
+
+    # 不传版本号时保持原有行为（无条件更新），版本号仍然递增
+    success, _, version = manager.update_row('wf_open', PO_LINE, {'comment': 'forced'})
+    assert success and version == 3
+
+
+def test_conditional_delete(row):
+    manager = DatabaseManager()
+    with pytest.raises(RowVersionConflict):
+        manager.delete_row('wf_open', PO_LINE, key_field='po_line', expected_version=7)
+    assert _version(row) == 1
+
+    success, _ = manager.delete_row('wf_open', PO_LINE, key_field='po_line', expected_version=1)
+    assert success and _version(row) is None
+
+
+def test_missing_row_is_not_a_conflict(row):
+    """记录已被删除时返回未找到，而不是版本冲突"""
+    manager = DatabaseManager()
+    success, message = manager.delete_row('wf_open', PO_LINE, key_field='po_line', expected_version=1)
+    assert success
+
+    success, message, version = manager.update_row('wf_open', PO_LINE, {'comment': 'gone'}, expected_version=1)
+    assert not success and '未找到' in message and version is None
+    success, message = manager.delete_row('wf_open', PO_LINE, key_field='po_line', expected_version=1)
+    assert not success and '未找到' in message
+
+
+def test_routes_report_conflict(row):
+    from backend.web_app import app
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {generate_token(1, 'a@b')}"}
+
+    response = client.put('/api/tables/wf_open', json={'key': PO_LINE, 'comment': 'x', 'row_version': 1},
+                          headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['row_version'] == 2
+
+    response = client.put('/api/tables/wf_open', json={'key': PO_LINE, 'comment': 'y', 'row_version': 1},
+                          headers=headers)
+    assert response.status_code == 409
+    assert response.get_json()['conflict'] is True
+
+    response = client.delete('/api/tables/wf_open', json={'key': PO_LINE, 'key_field': 'po_line', 'row_version': 1},
+                             headers=headers)
+    assert response.status_code == 409
+    assert _version(row) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
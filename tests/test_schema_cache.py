@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表结构缓存与数据库迁移测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.models.schema_cache import SchemaCache
+
+pytestmark = pytest.mark.database
+
+
+def test_migrations_are_recorded_and_not_rerun():
+    """迁移执行后记录版本，再次执行时不重复执行"""
+    import init_db
+
+    conn = psycopg2.connect(**get_db_config())
+    assert init_db.run_migrations(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM purchase_orders.schema_migrations ORDER BY version")
+    assert [row[0] for row in cursor.fetchall()] == [m[0] for m in init_db.MIGRATIONS]
+
+    calls = []
+    original = init_db.MIGRATIONS
+    init_db.MIGRATIONS = [(version, description, lambda c: calls.append(version))
+                          for version, description, _ in original]
+    try:
+        assert init_db.run_migrations(conn)
+    finally:
+        init_db.MIGRATIONS = original
+    assert calls == []
+    conn.close()
+
+
+def test_columns_are_cached():
+    """首次访问加载全部表结构，之后不再查询数据库"""
+    cache = SchemaCache()
+    columns = cache.get_columns('wf_open')
+    assert 'po_line' in columns
+    assert columns['line'] == 'integer'
+    assert cache.has_column('wf_closed', 'shipment_batch_no')
+    assert cache.has_column('wf_open', 'update_at')
+    assert not cache.table_exists('no_such_table')
+
+    class NoQueryCursor:
+        def execute(self, *args):
+            raise AssertionError("缓存命中时不应查询数据库")
+
+    assert 'id' in cache.get_column_names('wf_closed', NoQueryCursor())
+    assert 'wf_open' in cache.get_tables(NoQueryCursor())
+    # 不存在的表名也被缓存，再次请求不重新加载
+    assert not cache.table_exists('no_such_table', NoQueryCursor())
+
+
+def test_add_dynamic_columns_invalidates_cache():
+    """动态添加列后全局缓存刷新"""
+    from backend.models.database import DatabaseManager
+    from backend.models.schema_cache import schema_cache
+
+    conn = psycopg2.connect(**get_db_config())
+    cursor = conn.cursor()
+    cursor.execute("ALTER TABLE purchase_orders.non_wf_open DROP COLUMN IF EXISTS cache_probe")
+    conn.commit()
+    schema_cache.invalidate()
+    assert not schema_cache.has_column('non_wf_open', 'cache_probe')
+
+    success, message = DatabaseManager().add_dynamic_columns('non_wf_open', {'cache_probe': 'TEXT'})
+    assert success, message
+    assert schema_cache.has_column('non_wf_open', 'cache_probe')
+
+    cursor.execute("ALTER TABLE purchase_orders.non_wf_open DROP COLUMN cache_probe")
+    conn.commit()
+    conn.close()
+    schema_cache.invalidate()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
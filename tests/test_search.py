@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨表搜索测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）；模糊匹配测试需要 pg_trgm 扩展
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+os.environ.setdefault('PDF_JOB_RECOVER', 'false')
+
+import pytest
+
+from backend.utils.jwt_utils import generate_token
+from backend.models.database import DatabaseManager
+from backend.models.schema_cache import schema_cache
+
+TEST_PO = 'SEARCHTEST'
+TERM = 'ZQX-77881'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture(scope="module")
+def search_rows(module_db_conn):
+    cursor = module_db_conn.cursor()
+    cursor.execute("INSERT INTO purchase_orders.wf_open (po, pn, line, po_line) VALUES (%s, %s, 1, %s)",
+                   (TEST_PO, 'zqx-77881', f'{TEST_PO}/1'))
+    cursor.execute("INSERT INTO purchase_orders.non_wf_open (po, pn, line, po_line, description) VALUES (%s, %s, '2', %s, %s)",
+                   (TEST_PO, 'OTHER-1', f'{TEST_PO}/2', f'Bracket A{TERM} steel'))
+    cursor.execute("INSERT INTO purchase_orders.wf_closed (po, pn, line, po_line) VALUES (%s, %s, 3, %s) RETURNING id",
+                   (TEST_PO, f'{TERM}-B', f'{TEST_PO}/3'))
+    closed_id = cursor.fetchone()[0]
+    cursor.execute("INSERT INTO purchase_orders.non_wf_closed (po, pn, line, po_line, tracking_no) VALUES (%s, %s, '4', %s, %s)",
+                   (TEST_PO, 'OTHER-2', f'{TEST_PO}/4', 'ZQX-77818'))
+    # 通配符按字面匹配
+    cursor.execute("INSERT INTO purchase_orders.wf_open (po, pn, line, po_line) VALUES (%s, %s, 5, %s)",
+                   (TEST_PO, 'PCT_100%', f'{TEST_PO}/5'))
+    module_db_conn.commit()
+    schema_cache.invalidate()
+    return closed_id
+
+
+def test_search_ranks_exact_prefix_and_contains(search_rows):
+    result = DatabaseManager().search_tables(TERM)
+    hits = [(hit['table'], hit['key'], hit['matched_column'], hit['match_type'])
+            for hit in result['results'] if hit['record']['po'] == TEST_PO]
+    assert hits[:3] == [
+        ('wf_open', f'{TEST_PO}/1', 'pn', 'exact'),
+        ('wf_closed', search_rows, 'pn', 'prefix'),
+        ('non_wf_open', f'{TEST_PO}/2', 'description', 'contains'),
+    ]
+
+
+def test_search_escapes_wildcards_and_filters_tables(search_rows):
+    manager = DatabaseManager()
+    hits = manager.search_tables('T_100%', tables=['wf_open'])['results']
+    assert [hit['key'] for hit in hits] == [f'{TEST_PO}/5']
+    assert not [hit for hit in manager.search_tables(TERM, tables=['wf_closed'])['results']
+                if hit['table'] != 'wf_closed']
+
+
+def test_fuzzy_match(search_rows):
+    if not schema_cache.has_extension('pg_trgm'):
+        pytest.skip("pg_trgm 未安装，只支持包含匹配")
+    result = DatabaseManager().search_tables(TERM)
+    assert result['mode'] == 'fuzzy'
+    fuzzy = [hit for hit in result['results'] if hit['table'] == 'non_wf_closed' and hit['record']['po'] == TEST_PO]
+    assert fuzzy and fuzzy[0]['matched_column'] == 'tracking_no' and fuzzy[0]['match_type'] == 'fuzzy'
+
+
+def test_search_route(search_rows):
+    from backend.web_app import app
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {generate_token(1, 'a@b')}"}
+
+    response = client.get(f'/api/search?q={TERM}&limit=2', headers=headers)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']) == 2
+
+    assert client.get('/api/search?q=ab', headers=headers).status_code == 400
+    assert client.get(f'/api/search?q={TERM}&tables=users', headers=headers).status_code == 400
+    assert client.get(f'/api/search?q={TERM}&limit=0', headers=headers).status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
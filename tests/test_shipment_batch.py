@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量发货测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.controllers.shipment_controller import ShipmentController
+
+TEST_PO = 'SHIPBATCHTEST'
+TEST_USER = 'shipment-batch@test'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def conn(db_conn):
+    cursor = db_conn.cursor()
+    for i in range(1, 4):
+        cursor.execute(
+            "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, net_price, total_price) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (TEST_PO, f"PN{i}", i, f"{TEST_PO}/{i}", 10, '2.0000', '20.00')
+        )
+    db_conn.commit()
+    return db_conn
+
+
+def _open_rows(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT po_line, qty, total_price FROM purchase_orders.wf_open WHERE po = %s ORDER BY po_line",
+                   (TEST_PO,))
+    return [(po_line, float(qty), float(total_price)) for po_line, qty, total_price in cursor.fetchall()]
+
+
+def test_batch_full_and_partial_shipment(conn):
+    result = ShipmentController().process_shipment_batch(
+        'wf_open',
+        [
+            {'po_line': f'{TEST_PO}/1', 'shipment_qty': 10, 'max_qty': 10},
+            {'po_line': f'{TEST_PO}/2', 'shipment_qty': 4, 'max_qty': 10},
+        ],
+        TEST_USER,
+        tracking_no='TRK-1',
+        shipping_mode='Air',
+        shipping_cost=12.5,
+        shipment_batch_no='SHIP-TEST-0001'
+    )
+    assert result['success'], result['message']
+    assert [r['remaining_qty'] for r in result['results']] == [0, 6]
+
+    assert _open_rows(conn) == [(f'{TEST_PO}/2', 6.0, 12.0), (f'{TEST_PO}/3', 10.0, 20.0)]
+
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT po_line, qty, total_price, tracking_no, wfsz_shipping_mode, shipment_batch_no "
+        "FROM purchase_orders.wf_closed WHERE po = %s ORDER BY po_line", (TEST_PO,)
+    )
+    assert [(r[0], float(r[1]), float(r[2]), r[3], r[4], r[5]) for r in cursor.fetchall()] == [
+        (f'{TEST_PO}/1', 10.0, 20.0, 'TRK-1', 'Air', 'SHIP-TEST-0001'),
+        (f'{TEST_PO}/2', 4.0, 8.0, 'TRK-1', 'Air', 'SHIP-TEST-0001'),
+    ]
+
+    cursor.execute("SELECT operation FROM purchase_orders.po_records WHERE user_email = %s ORDER BY id",
+                   (TEST_USER,))
+    assert [r[0] for r in cursor.fetchall()] == ['shipment_full_shipment', 'shipment_partial_shipment']
+
+
+def test_batch_rolls_back_when_a_line_is_missing(conn):
+    result = ShipmentController().process_shipment_batch(
+        'wf_open',
+        [
+            {'po_line': f'{TEST_PO}/1', 'shipment_qty': 10, 'max_qty': 10},
+            {'po_line': f'{TEST_PO}/404', 'shipment_qty': 1, 'max_qty': 1},
+        ],
+        TEST_USER
+    )
+    assert not result['success']
+    assert f'{TEST_PO}/404' in result['message']
+    assert len(_open_rows(conn)) == 3
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM purchase_orders.wf_closed WHERE po = %s", (TEST_PO,))
+    assert cursor.fetchone()[0] == 0
+
+
+def test_batch_checks_locked_quantity_not_client_max_qty(conn):
+    # 客户端传来的 max_qty 已过期（大于当前数量）时以数据库中的数量为准
+    result = ShipmentController().process_shipment_batch(
+        'wf_open',
+        [{'po_line': f'{TEST_PO}/1', 'shipment_qty': 11, 'max_qty': 20}],
+        TEST_USER
+    )
+    assert not result['success']
+    assert '1到10' in result['message']
+    assert _open_rows(conn)[0] == (f'{TEST_PO}/1', 10.0, 20.0)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM purchase_orders.wf_closed WHERE po = %s", (TEST_PO,))
+    assert cursor.fetchone()[0] == 0
+
+
+def test_batch_validation():
+    controller = ShipmentController()
+    assert not controller.process_shipment_batch('wf_closed', [{'po_line': 'A', 'shipment_qty': 1, 'max_qty': 1}], TEST_USER)['success']
+    assert not controller.process_shipment_batch('wf_open', [], TEST_USER)['success']
+    assert not controller.process_shipment_batch('wf_open', [{'po_line': 'A', 'shipment_qty': 0}], TEST_USER)['success']
+    duplicate = [{'po_line': 'A', 'shipment_qty': 1, 'max_qty': 1}] * 2
+    assert not controller.process_shipment_batch('wf_open', duplicate, TEST_USER)['success']
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
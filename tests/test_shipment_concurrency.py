@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发发货压力测试：多个线程同时对同一行发货，不能超发
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.controllers.shipment_controller import ShipmentController
+
+TEST_PO = 'SHIPRACETEST'
+TEST_USER = 'shipment-race@test'
+PO_LINE = f'{TEST_PO}/1'
+OPEN_QTY = 10
+THREADS = 40
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def conn(db_conn):
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, net_price) VALUES (%s, 'PN1', 1, %s, %s, 1)",
+        (TEST_PO, PO_LINE, OPEN_QTY)
+    )
+    db_conn.commit()
+    return db_conn
+
+
+def _closed_total(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(SUM(qty), 0), COUNT(*) FROM purchase_orders.wf_closed WHERE po = %s", (TEST_PO,))
+    total, count = cursor.fetchone()
+    conn.commit()
+    return float(total), count
+
+
+def test_concurrent_single_shipments_never_over_ship(conn):
+    controller = ShipmentController()
+
+    def ship(_):
+        # 所有线程都使用过期的 max_qty，服务端必须以锁定的当前数量为准
+        return controller.process_shipment('wf_open', TEST_PO, 'PN1', 1, OPEN_QTY, TEST_USER, po_line=PO_LINE)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(ship, range(THREADS)))
+
+    assert sum(1 for r in results if r['success']) == OPEN_QTY
+    assert sum(1 for r in results if r.get('shipment_type') == '全部发货') == 1
+    assert _closed_total(conn) == (float(OPEN_QTY), OPEN_QTY)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM purchase_orders.wf_open WHERE po_line = %s", (PO_LINE,))
+    assert cursor.fetchone()[0] == 0
+
+
+def test_concurrent_batch_and_single_shipments_never_over_ship(conn):
+    controller = ShipmentController()
+
+    def ship(i):
+        if i % 2:
+            return controller.process_shipment_batch('wf_open', [{'po_line': PO_LINE, 'shipment_qty': 3}], TEST_USER)
+        return controller.process_shipment('wf_open', TEST_PO, 'PN1', 3, OPEN_QTY, TEST_USER, po_line=PO_LINE)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(ship, range(THREADS)))
+
+    # 10 = 3 + 3 + 3 + 1，只有 3 次发货能成功，剩余 1 个不能再发 3 个
+    assert sum(1 for r in results if r['success']) == 3
+    assert _closed_total(conn) == (9.0, 3)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT qty FROM purchase_orders.wf_open WHERE po_line = %s", (PO_LINE,))
+    assert float(cursor.fetchone()[0]) == 1.0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量退货测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.controllers.shipment_controller import ShipmentController
+
+TEST_PO = 'RETBATCHTEST'
+TEST_USER = 'return-batch@test'
+BATCH_NO = 'SHIP-RETTEST-0001'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture
+def closed_ids(db_conn):
+    cursor = db_conn.cursor()
+    # 第 1 行已全部发货（open表中没有记录），第 2 行部分发货
+    cursor.execute(
+        "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, net_price) VALUES (%s, 'PN2', 2, %s, 6, 2)",
+        (TEST_PO, f'{TEST_PO}/2')
+    )
+    ids = []
+    for line, qty in ((1, 10), (2, 4), (3, 5)):
+        cursor.execute(
+            "INSERT INTO purchase_orders.wf_closed (po, pn, line, po_line, qty, net_price, total_price, "
+            "shipping_cost, shipment_batch_no) VALUES (%s, %s, %s, %s, %s, 2, %s, 30, %s) RETURNING id",
+            (TEST_PO, f'PN{line}', line, f'{TEST_PO}/{line}', qty, qty * 2, BATCH_NO)
+        )
+        ids.append(cursor.fetchone()[0])
+    db_conn.commit()
+    return ids
+
+
+def _rows(query):
+    conn = psycopg2.connect(**get_db_config())
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, (TEST_PO,))
+        return [tuple(float(v) if v is not None and not isinstance(v, str) else v for v in row)
+                for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def test_batch_return_merges_quantities_and_recomputes_cost_once(closed_ids):
+    result = ShipmentController().return_shipment_batch(
+        'wf_closed',
+        [
+            {'record_id': closed_ids[0], 'return_qty': 10},
+            {'record_id': closed_ids[1], 'return_qty': 1},
+        ],
+        TEST_USER,
+        new_shipping_cost=20
+    )
+    assert result['success'], result['message']
+    assert [r['remaining_qty'] for r in result['results']] == [0, 3]
+
+    # 第 1 行从closed表恢复到open表，第 2 行数量加回
+    assert _rows("SELECT po_line, qty, total_price FROM purchase_orders.wf_open WHERE po = %s ORDER BY po_line") == [
+        (f'{TEST_PO}/1', 10.0, 20.0),
+        (f'{TEST_PO}/2', 7.0, 14.0),
+    ]
+    # 第 1 条已删除，批次中保留的记录运费都更新为新值
+    assert _rows("SELECT po_line, qty, total_price, shipping_cost FROM purchase_orders.wf_closed "
+                 "WHERE po = %s ORDER BY po_line") == [
+        (f'{TEST_PO}/2', 3.0, 6.0, 20.0),
+        (f'{TEST_PO}/3', 5.0, 10.0, 20.0),
+    ]
+
+
+def test_batch_return_rejects_over_return(closed_ids):
+    result = ShipmentController().return_shipment_batch(
+        'wf_closed',
+        [
+            {'record_id': closed_ids[0], 'return_qty': 10},
+            {'record_id': closed_ids[2], 'return_qty': 6},
+        ],
+        TEST_USER
+    )
+    assert not result['success']
+    assert len(_rows("SELECT id FROM purchase_orders.wf_closed WHERE po = %s")) == 3
+    assert _rows("SELECT po_line FROM purchase_orders.wf_open WHERE po = %s") == [(f'{TEST_PO}/2',)]
+
+
+def test_batch_return_validation():
+    controller = ShipmentController()
+    assert not controller.return_shipment_batch('wf_open', [{'record_id': 1, 'return_qty': 1}], TEST_USER)['success']
+    assert not controller.return_shipment_batch('wf_closed', [], TEST_USER)['success']
+    assert not controller.return_shipment_batch('wf_closed', [{'record_id': 'x', 'return_qty': 1}], TEST_USER)['success']
+    duplicate = [{'record_id': 1, 'return_qty': 1}] * 2
+    assert not controller.return_shipment_batch('wf_closed', duplicate, TEST_USER)['success']
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表数据流式导出测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+import io
+import csv
+import json
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+os.environ.setdefault('PDF_JOB_RECOVER', 'false')
+
+import pytest
+
+from backend.utils.jwt_utils import generate_token
+from backend.models.database import DatabaseManager
+
+TEST_PO = 'EXPORTTEST'
+ROW_COUNT = 25
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture(scope="module")
+def closed_rows(module_db_conn):
+    cursor = module_db_conn.cursor()
+    for i in range(1, ROW_COUNT + 1):
+        cursor.execute(
+            "INSERT INTO purchase_orders.wf_closed (po, pn, line, po_line, qty, net_price, req_date_wf) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (TEST_PO, f"PN{i % 2}", i, f"{TEST_PO}/{i}", i, '1.2345', '2025-10-07')
+        )
+    module_db_conn.commit()
+
+
+@pytest.fixture(scope="module")
+def client():
+    from backend.web_app import app
+    return app.test_client()
+
+
+def _get(client, **params):
+    headers = {'Authorization': f"Bearer {generate_token(1, 'a@b')}"}
+    query = '&'.join(f"{key}={value}" for key, value in params.items())
+    return client.get(f"/api/tables/wf_closed/export?{query}", headers=headers)
+
+
+def test_named_cursor_streams_all_rows(closed_rows):
+    columns, rows = DatabaseManager().open_table_export(
+        'wf_closed', filters={'po': TEST_PO}, sort=[('line', 'asc')], itersize=7
+    )
+    lines = [row[columns.index('line')] for row in rows]
+    assert lines == list(range(1, ROW_COUNT + 1))
+
+
+def test_ndjson_export_honors_filters(client, closed_rows):
+    response = _get(client, format='ndjson', filters=json.dumps({'po': TEST_PO, 'pn': 'PN1'}), sort='line:asc')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['line'] for row in rows] == list(range(1, ROW_COUNT + 1, 2))
+    assert rows[0]['net_price'] == '1.2345'
+    assert rows[0]['req_date_wf'] == '2025-10-07'
+
+
+def test_json_array_export(client, closed_rows):
+    response = _get(client, format='json', filters=json.dumps({'po': TEST_PO}))
+    rows = json.loads(response.get_data(as_text=True))
+    assert len(rows) == ROW_COUNT
+    # 默认排序与表格视图一致（closed表按 id 降序）
+    assert [row['line'] for row in rows] == list(range(ROW_COUNT, 0, -1))
+
+
+def test_csv_export(client, closed_rows):
+    response = _get(client, format='csv', filters=json.dumps({'po': TEST_PO, 'pn': 'PN0'}), sort='line:asc')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert text.startswith('\ufeff')
+    rows = list(csv.DictReader(io.StringIO(text.lstrip('\ufeff'))))
+    assert [int(row['line']) for row in rows] == list(range(2, ROW_COUNT + 1, 2))
+    assert rows[0]['net_price'] == '1.2345'
+    assert rows[0]['req_date_wf'] == '2025-10-07'
+    assert rows[0]['comment'] == ''
+
+
+def test_xlsx_export(client, closed_rows):
+    from openpyxl import load_workbook
+    response = _get(client, format='xlsx', filters=json.dumps({'po': TEST_PO}), sort='line:asc')
+    assert response.status_code == 200
+    assert 'wf_closed.xlsx' in response.headers['Content-Disposition']
+    workbook = load_workbook(io.BytesIO(response.get_data()), read_only=True)
+    rows = list(workbook.active.iter_rows(values_only=True))
+    header, data = rows[0], rows[1:]
+    assert len(data) == ROW_COUNT
+    assert [row[header.index('line')] for row in data] == list(range(1, ROW_COUNT + 1))
+    assert float(data[0][header.index('net_price')]) == pytest.approx(1.2345)
+
+
+def test_invalid_export_requests(client, closed_rows):
+    assert _get(client, format='pdf').status_code == 400
+    assert _get(client, sort='no_such_column:asc').status_code == 400
+    assert _get(client, format='json', filters=json.dumps({'po': 'NO-SUCH-PO'})).get_json() == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
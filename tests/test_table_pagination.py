@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表格服务端分页测试脚本
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置）
+"""
+
+import sys
+import os
+import json
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+os.environ.setdefault('PDF_JOB_RECOVER', 'false')
+
+import pytest
+
+from backend.models.database import DatabaseManager, encode_page_cursor, decode_page_cursor
+
+TEST_PO = 'PAGETEST'
+
+pytestmark = pytest.mark.database
+
+
+@pytest.fixture(scope="module")
+def db_manager(module_db_conn):
+    cursor = module_db_conn.cursor()
+    for i in range(1, 51):
+        # 部分描述为 NULL，用于验证 NULLS LAST 的游标翻页
+        description = None if i % 4 == 0 else f"desc-{i % 5}"
+        cursor.execute(
+            "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, description) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (TEST_PO, f"PN{i % 3}", i, f"{TEST_PO}/{i}", i, description)
+        )
+    module_db_conn.commit()
+    return DatabaseManager()
+
+
+def _walk(manager, **kwargs):
+    seen = []
+    cursor_token = None
+    while True:
+        page = manager.query_table_page('wf_open', limit=7, cursor_token=cursor_token, **kwargs)
+        seen.extend(row['po_line'] for row in page['rows'])
+        cursor_token = page['next_cursor']
+        if not cursor_token:
+            assert not page['has_more']
+            return seen
+
+
+def test_cursor_round_trip():
+    token = encode_page_cursor(['a', 1, None])
+    assert decode_page_cursor(token) == ['a', 1, None]
+    with pytest.raises(ValueError):
+        decode_page_cursor('not-a-cursor')
+
+
+def test_walks_every_row_exactly_once(db_manager):
+    """默认排序下逐页翻完，每行恰好出现一次"""
+    seen = _walk(db_manager, filters={'po': TEST_PO})
+    assert len(seen) == 50
+    assert len(set(seen)) == 50
+
+
+def test_multi_column_sort_with_nulls(db_manager):
+    """多列排序（含 NULL 值）翻页结果与一次性排序一致"""
+    seen = _walk(db_manager, filters={'po': TEST_PO}, sort=[('description', 'asc'), ('qty', 'desc')])
+    full = db_manager.query_table_page(
+        'wf_open', filters={'po': TEST_PO}, sort=[('description', 'asc'), ('qty', 'desc')], limit=100
+    )
+    assert seen == [row['po_line'] for row in full['rows']]
+    assert full['total'] == 50
+    assert not full['total_is_estimate']
+
+
+def test_filters_are_combined(db_manager):
+    """多个列过滤条件按 AND 组合"""
+    page = db_manager.query_table_page('wf_open', filters={'po': TEST_PO, 'pn': 'PN1'}, limit=100, exact_count=True)
+    assert page['total'] == len(page['rows']) == 17
+    assert all(row['pn'] == 'PN1' for row in page['rows'])
+
+
+def test_invalid_input_is_rejected(db_manager):
+    with pytest.raises(ValueError):
+        db_manager.query_table_page('wf_open', sort=[('no_such_column', 'asc')])
+    with pytest.raises(ValueError):
+        db_manager.query_table_page('wf_open', filters={'no_such_column': 'x'})
+
+
+
+class ScriptedCursor:
+    """按顺序返回预设结果的游标，记录执行的语句"""
+    def __init__(self, results):
+        self.results = list(results)
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(str(query))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+
+def test_estimate_count_treats_zero_reltuples_as_unknown():
+    from psycopg2 import sql
+    manager = DatabaseManager()
+    plan = [{'Plan': {'Plan Rows': 350}}]
+
+    # 从未 ANALYZE（reltuples = 0）时使用查询计划估算
+    cursor = ScriptedCursor([(0,), (plan,)])
+    assert manager._estimate_count(cursor, 'wf_open', sql.SQL(''), [], min_count=201) == (350, True)
+    assert 'EXPLAIN' in cursor.queries[1]
+
+    # 统计信息过期时不小于已返回的行数
+    cursor = ScriptedCursor([(100,)])
+    assert manager._estimate_count(cursor, 'wf_open', sql.SQL(''), [], min_count=201) == (201, True)
+
+    # 查询计划也没有估算时精确计数
+    cursor = ScriptedCursor([(-1,), ([{'Plan': {'Plan Rows': 0}}],), (42,)])
+    assert manager._estimate_count(cursor, 'wf_open', sql.SQL(''), []) == (42, False)
+
+
+def test_page_route_exact_count_and_errors(db_manager):
+    from backend.web_app import app
+    from backend.utils.jwt_utils import generate_token
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {generate_token(1, 'a@b')}"}
+    filters = json.dumps({'po': TEST_PO})
+
+    for value in ('1', 'true', 'yes'):
+        response = client.get('/api/tables/wf_open', headers=headers,
+                              query_string={'limit': 5, 'filters': filters, 'exact_count': value})
+        body = response.get_json()
+        assert body['total'] == 50 and body['total_is_estimate'] is False
+
+    response = client.get('/api/tables/wf_open', headers=headers,
+                          query_string={'limit': 5, 'sort': 'no_such_column:asc'})
+    assert response.status_code == 400
+    assert 'status' not in response.get_json()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
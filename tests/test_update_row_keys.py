@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单行更新的键列定位测试
+需要可用的 PostgreSQL（使用 .env 中的 DB_* 配置，并已执行 init_db.py 迁移）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import psycopg2
+import pytest
+
+from backend.utils.config import get_db_config
+from backend.models.database import DatabaseManager
+from backend.models.schema_cache import schema_cache
+from backend.operation_logger import operation_logger
+
+TEST_PO = 'UPDATEKEYTEST'
+TEST_USER = 'update-key@test'
+TEST_PN = 'UPDATEKEYTEST-PN1'
+
+pytestmark = pytest.mark.database
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """统计发送到数据库的语句数"""
+    statements = 0
+
+    def execute(self, query, params=None):
+        CountingCursor.statements += 1
+        return super().execute(query, params)
+
+
+@pytest.fixture
+def conn(db_conn):
+    """返回 (连接, closed表测试记录的id)"""
+    cursor = db_conn.cursor()
+    cursor.execute(
+        "INSERT INTO purchase_orders.wf_open (po, pn, line, po_line, qty, net_price) VALUES (%s, %s, 1, %s, 1, 1)",
+        (TEST_PO, TEST_PN, f'{TEST_PO}/1')
+    )
+    cursor.execute(
+        "INSERT INTO purchase_orders.wf_closed (po, pn, line, po_line, qty, net_price) "
+        "VALUES (%s, %s, 1, %s, 1, 1) RETURNING id",
+        (TEST_PO, TEST_PN, f'{TEST_PO}/1')
+    )
+    closed_id = cursor.fetchone()[0]
+    db_conn.commit()
+    schema_cache.invalidate()
+    return db_conn, closed_id
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = DatabaseManager()
+    monkeypatch.setattr(manager, 'get_connection',
+                        lambda: psycopg2.connect(cursor_factory=CountingCursor, **get_db_config()))
+    return manager
+
+
+def _comment(conn, table_name, key_field, key):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT comment FROM purchase_orders.{table_name} WHERE {key_field} = %s", (key,))
+    row = cursor.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+
+def test_primary_keys_are_cached():
+    assert schema_cache.get_primary_key('wf_open') == 'po_line'
+    assert schema_cache.get_primary_key('wf_closed') == 'id'
+    assert DatabaseManager().get_key_field('non_wf_open') == 'po_line'
+
+
+def test_update_by_table_key_is_one_statement(conn, manager):
+    conn, _ = conn
+    # 预热表结构缓存，之后的更新只应发送一条 UPDATE
+    schema_cache.get_columns('wf_open')
+    CountingCursor.statements = 0
+
+    success, _, version = manager.update_row('wf_open', f'{TEST_PO}/1', {'comment': 'one'}, TEST_USER)
+    assert success
+    assert version == 2
+    assert CountingCursor.statements == 1
+    assert _comment(conn, 'wf_open', 'po_line', f'{TEST_PO}/1') == 'one'
+
+    # 操作日志使用 RETURNING * 返回的更新后记录
+    operation_logger.flush()
+    cursor = conn.cursor()
+    cursor.execute("SELECT record_data->>'comment' FROM purchase_orders.po_records "
+                   "WHERE user_email = %s AND operation = 'update'", (TEST_USER,))
+    assert [r[0] for r in cursor.fetchall()] == ['one']
+
+
+def test_closed_table_key_is_converted_to_id(conn, manager):
+    conn, closed_id = conn
+    success, _, _ = manager.update_row('wf_closed', str(closed_id), {'comment': 'closed'})
+    assert success
+    assert _comment(conn, 'wf_closed', 'id', closed_id) == 'closed'
+
+
+def test_explicit_key_field(conn, manager):
+    conn, _ = conn
+    success, _, _ = manager.update_row('wf_open', TEST_PN, {'comment': 'by pn'}, key_field='pn')
+    assert success
+    assert _comment(conn, 'wf_open', 'po_line', f'{TEST_PO}/1') == 'by pn'
+
+
+def test_no_fallback_to_other_columns(conn, manager):
+    conn, _ = conn
+    # 不再用 pn 试探 po_line：键值不是 po_line 时不会更新任何记录
+    success, _, _ = manager.update_row('wf_open', TEST_PN, {'comment': 'guessed'})
+    assert not success
+    assert _comment(conn, 'wf_open', 'po_line', f'{TEST_PO}/1') is None
+
+
+def test_clearing_numeric_cell_sets_null(conn, manager):
+    """非文本列的空字符串按列类型转为 NULL（与批量修改一致）"""
+    conn, _ = conn
+    success, message, _ = manager.update_row('wf_open', f'{TEST_PO}/1', {'qty': '', 'net_price': ''})
+    assert success, message
+    cursor = conn.cursor()
+    cursor.execute("SELECT qty, net_price FROM purchase_orders.wf_open WHERE po_line = %s", (f'{TEST_PO}/1',))
+    assert cursor.fetchone() == (None, None)
+    conn.commit()
+
+
+def test_invalid_key(conn, manager):
+    with pytest.raises(ValueError):
+        manager.update_row('wf_closed', TEST_PN, {'comment': 'x'})
+    with pytest.raises(ValueError):
+        manager.update_row('wf_open', f'{TEST_PO}/1', {'comment': 'x'}, key_field='no_such_column')
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
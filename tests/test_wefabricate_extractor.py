@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Wefaricate 解析器 Schedule Lines 关联测试
+使用内存中的假 PDF 页面，不需要数据库和 PDF 文件
+"""
+
+import sys
+import os
+from datetime import date
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import pdfplumber
+import pytest
+
+from backend.db_pdf_processor import ScheduleLineMatcher, extract_wefaricate_data
+
+HEADER = ['Item', 'ID', 'Description', 'Quantity', 'Net Price', 'Net Value']
+
+
+class FakePage:
+    def __init__(self, tables, text=""):
+        self.tables = tables
+        self.text = text
+        self.text_calls = 0
+
+    def extract_text(self):
+        self.text_calls += 1
+        return self.text
+
+    def extract_tables(self):
+        return [[list(row) for row in table] for table in self.tables]
+
+    def flush_cache(self):
+        pass
+
+
+class FakePDF:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def data_row(item):
+    return [item, '1234-5678-9012', 'Part', '1,000 PC', 'EUR 12.50 per 10', '1,250.00 EUR']
+
+
+def schedule_row(day):
+    return ['', '', '', '10', f'Oct {day}, 2025', '']
+
+
+@pytest.fixture
+def fake_pdf(monkeypatch):
+    def install(pages):
+        pdf = FakePDF(pages)
+        monkeypatch.setattr(pdfplumber, 'open', lambda path: pdf)
+        return pdf
+    return install
+
+
+def test_schedule_lines_within_table_take_earliest_date(fake_pdf):
+    fake_pdf([FakePage([[HEADER, data_row('00010'), schedule_row(9), schedule_row(7),
+                         data_row('00020'), schedule_row(8)]],
+                       text="Purchase Order 4500012345\nCreated on: Oct 1, 2025\nContact Person: Jane")])
+    rows = extract_wefaricate_data('x.pdf')
+    assert [row['po_line'] for row in rows] == ['4500012345/10', '4500012345/20']
+    assert [row['req_date_wf'] for row in rows] == [date(2025, 10, 7), date(2025, 10, 8)]
+    assert rows[0]['po_placed_date'] == date(2025, 10, 1)
+    assert rows[0]['purchaser'] == 'Jane'
+
+
+def test_schedule_lines_continue_on_next_page(fake_pdf):
+    """页末的数据行收集下一页开头的 Schedule Lines，直到下一页出现数据行"""
+    pages = [
+        FakePage([[HEADER, data_row('00010')]], text="Purchase Order 4500012345"),
+        FakePage([[schedule_row(5)], [schedule_row(3), data_row('00020'), schedule_row(9)]]),
+        FakePage([[schedule_row(1)]]),
+    ]
+    fake_pdf(pages)
+    rows = extract_wefaricate_data('x.pdf')
+    assert [row['req_date_wf'] for row in rows] == [date(2025, 10, 3), date(2025, 10, 1)]
+    # 只在第一页提取文本
+    assert [page.text_calls for page in pages] == [1, 0, 0]
+
+
+def test_other_tables_on_same_page_are_ignored():
+    """同一页其他表格中的 Schedule Lines 不计入，数据行等待下一页"""
+    matcher = ScheduleLineMatcher()
+    first, second = {}, {}
+    matcher.add_data_row(first, 0, 0)
+    matcher.add_schedule(date(2025, 1, 9), 0, 0)
+    matcher.add_schedule(date(2025, 1, 1), 0, 1)
+    matcher.add_data_row(second, 0, 1)
+    matcher.add_schedule(date(2025, 1, 5), 1, 0)
+    matcher.finish()
+    assert first['req_date_wf'] == date(2025, 1, 5)
+    assert second['req_date_wf'] == date(2025, 1, 5)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))